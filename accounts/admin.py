@@ -1,6 +1,6 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
-from .models import User
+from .models import FollowSuggestion, User
 
 @admin.register(User)
 class CustomUserAdmin(UserAdmin):
@@ -17,3 +17,10 @@ class CustomUserAdmin(UserAdmin):
             'fields': ('followers',)
         }),
     )
+
+@admin.register(FollowSuggestion)
+class FollowSuggestionAdmin(admin.ModelAdmin):
+    list_display = ('user', 'suggested', 'score', 'mutual_count', 'computed_at')
+    search_fields = ('user__username', 'suggested__username')
+    raw_id_fields = ('user', 'suggested')
+    ordering = ('user', '-score')
@@ -11,3 +11,6 @@ class AccountsConfig(AppConfig):
             from . import templatetags
         except ImportError:
             pass
+
+        # Connect the follow-graph cache signal handlers
+        from . import signals
@@ -0,0 +1,175 @@
+"""
+Cached follow graph.
+
+Each user's following and follower ids are cached as sorted 64-bit integer
+arrays (``array('q')`` bytes, 8 bytes per edge), so follow checks, mutual
+follows, "followed by people you follow" intersections and counts are
+answered in memory instead of querying ``accounts_user_followers``.
+
+Cache keys carry a per-user version.  Whenever a follow edge changes (see
+``accounts.signals``) the version of both affected sets is bumped and the
+new set is written straight back from the database (write-through); a
+concurrent writer that loses the race only writes under a version nobody
+reads any more.
+
+The cached sets are for reads only: ``toggle`` decides a follow/unfollow
+from the edge row itself.
+"""
+import bisect
+import time
+from array import array
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.db.models.signals import m2m_changed
+
+FOLLOWING = 'following'
+FOLLOWERS = 'followers'
+
+
+def _cache():
+    return caches[getattr(settings, 'FOLLOW_GRAPH_CACHE', 'default')]
+
+
+def _timeout():
+    return getattr(settings, 'FOLLOW_GRAPH_CACHE_SECONDS', 24 * 60 * 60)
+
+
+def _through():
+    return get_user_model().followers.through
+
+
+def _version_key(kind, user_id):
+    return f'graph:{kind}:{user_id}:version'
+
+
+def _set_key(kind, user_id, version):
+    return f'graph:{kind}:{user_id}:{version}'
+
+
+def _query(kind, user_id):
+    # A row (from_user=A, to_user=B) means B follows A
+    if kind == FOLLOWERS:
+        rows = _through().objects.filter(from_user_id=user_id).values_list('to_user_id', flat=True)
+    else:
+        rows = _through().objects.filter(to_user_id=user_id).values_list('from_user_id', flat=True)
+    return array('q', sorted(rows))
+
+
+def _version(kind, user_id):
+    cache = _cache()
+    version = cache.get(_version_key(kind, user_id))
+    if version is None:
+        # Start from the clock rather than 1 so a version key that was evicted
+        # can never be reissued and match a stale set
+        cache.add(_version_key(kind, user_id), time.time_ns(), None)
+        version = cache.get(_version_key(kind, user_id))
+    return version
+
+
+def _ids(kind, user_id):
+    cache = _cache()
+    key = _set_key(kind, user_id, _version(kind, user_id))
+    data = cache.get(key)
+    if data is not None:
+        ids = array('q')
+        ids.frombytes(data)
+        return ids
+    ids = _query(kind, user_id)
+    cache.set(key, ids.tobytes(), _timeout())
+    return ids
+
+
+def following(user_id):
+    """Sorted ids of the users ``user_id`` follows"""
+    return _ids(FOLLOWING, user_id)
+
+
+def followers(user_id):
+    """Sorted ids of the users following ``user_id``"""
+    return _ids(FOLLOWERS, user_id)
+
+
+def _contains(ids, value):
+    index = bisect.bisect_left(ids, value)
+    return index < len(ids) and ids[index] == value
+
+
+def is_following(user_id, other_id):
+    return _contains(following(user_id), other_id)
+
+
+def is_mutual(user_id, other_id):
+    return is_following(user_id, other_id) and is_following(other_id, user_id)
+
+
+def follow_states(user_id, other_ids):
+    """Return the subset of ``other_ids`` that ``user_id`` follows"""
+    ids = following(user_id)
+    return {other_id for other_id in other_ids if _contains(ids, other_id)}
+
+
+def followed_by_following(viewer_id, user_id):
+    """Ids of people ``viewer_id`` follows who also follow ``user_id``, ascending"""
+    mine, theirs = following(viewer_id), followers(user_id)
+    if len(mine) > len(theirs):
+        mine, theirs = theirs, mine
+    return [other_id for other_id in mine if _contains(theirs, other_id)]
+
+
+def counts(user_id):
+    """``(followers, following)`` counts from the cached sets"""
+    return len(followers(user_id)), len(following(user_id))
+
+
+def refresh(kind, user_ids):
+    """Write-through after a change: bump each set's version and store it freshly loaded"""
+    cache = _cache()
+    for user_id in user_ids:
+        try:
+            version = cache.incr(_version_key(kind, user_id))
+        except ValueError:
+            # Never loaded; the next read populates it
+            continue
+        cache.set(_set_key(kind, user_id, version), _query(kind, user_id).tobytes(), _timeout())
+
+
+def edges_changed(follower_ids, followee_ids):
+    """Refresh the sets touched by adding/removing follow edges between the two groups"""
+    refresh(FOLLOWING, follower_ids)
+    refresh(FOLLOWERS, followee_ids)
+
+
+def toggle(follower, followee):
+    """
+    Flip whether ``follower`` follows ``followee`` and move both users'
+    counters with it.  Return ``(following, changed)``; ``changed`` is
+    ``False`` when a concurrent request already inserted the same edge.
+    """
+    User = get_user_model()
+    through = _through()
+    # A row (from_user=A, to_user=B) means B follows A
+    edge = {'from_user_id': followee.pk, 'to_user_id': follower.pk}
+    with transaction.atomic():
+        deleted, _ = through.objects.filter(**edge).delete()
+        if deleted:
+            following, delta, action = False, -1, 'post_remove'
+        else:
+            try:
+                with transaction.atomic():
+                    through.objects.create(**edge)
+            except IntegrityError:
+                # Lost the race to an identical request; it already counted the edge
+                return True, False
+            following, delta, action = True, 1, 'post_add'
+        User.objects.filter(pk=followee.pk).update(followers_count=F('followers_count') + delta)
+        User.objects.filter(pk=follower.pk).update(following_count=F('following_count') + delta)
+    # Plain row writes skip m2m_changed; send it so accounts.signals refresh
+    # the cached sets, summaries and suggestions as for following.add()
+    m2m_changed.send(
+        sender=through, instance=follower, action=action, reverse=True,
+        model=User, pk_set={followee.pk}, using=through.objects.db,
+    )
+    return following, True
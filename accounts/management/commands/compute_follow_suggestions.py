@@ -0,0 +1,35 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from accounts import recommendations
+
+
+class Command(BaseCommand):
+    help = 'Precompute "who to follow" suggestions for users whose suggestions are missing or stale'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--max-age', type=float, default=getattr(settings, 'FOLLOW_SUGGESTIONS_MAX_AGE_HOURS', 24),
+            help='Recompute suggestions older than this many hours',
+        )
+        parser.add_argument('--all', action='store_true', help='Recompute every user, however fresh')
+
+    def handle(self, *args, **options):
+        max_age = None if options['all'] else timedelta(hours=options['max_age'])
+        users = recommendations.stale_users(max_age)
+        batch_size = options['batch_size']
+
+        processed = written = 0
+        last_pk = 0
+        while True:
+            # Keyset batches, so users refreshed along the way don't shift the window
+            batch = list(users.filter(pk__gt=last_pk).values_list('pk', flat=True)[:batch_size])
+            if not batch:
+                break
+            written += recommendations.refresh(batch)
+            processed += len(batch)
+            last_pk = batch[-1]
+            self.stdout.write(f'Processed {processed} users...')
+
+        self.stdout.write(self.style.SUCCESS(f'Stored {written} suggestions for {processed} users'))
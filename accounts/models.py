@@ -1,52 +1,43 @@
 from django.db import models
 from django.contrib.auth.models import AbstractUser
-from PIL import Image
+from django.utils import timezone
+from xclone import images
+from . import graph
 
-class User(AbstractUser):
+DEFAULT_AVATAR = 'avatars/default.png'
+
+class User(images.ImageRenditionsMixin, AbstractUser):
     bio = models.TextField(max_length=500, blank=True)
     location = models.CharField(max_length=100, blank=True)
     website = models.URLField(blank=True)
     birth_date = models.DateField(null=True, blank=True)
-    avatar = models.ImageField(upload_to='avatars/', default='avatars/default.png', blank=True)
+    avatar = models.ImageField(upload_to='avatars/', default=DEFAULT_AVATAR, blank=True)
     cover_photo = models.ImageField(upload_to='covers/', blank=True)
+    # Resized JPEG/WebP copies, written by the background image pipeline
+    avatar_renditions = models.JSONField(default=dict, blank=True, editable=False)
+    cover_photo_renditions = models.JSONField(default=dict, blank=True, editable=False)
     followers = models.ManyToManyField('self', symmetrical=False, related_name='following', blank=True)
+    # Denormalized follow counters, kept current with F() updates in graph.toggle
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    rendition_fields = ('avatar', 'cover_photo')
+    rendition_skip = (DEFAULT_AVATAR,)
+
     def __str__(self):
         return self.username
 
-    def save(self, *args, **kwargs):
-        super().save(*args, **kwargs)
-
-        # Resize avatar if it exists
-        if self.avatar and hasattr(self.avatar, 'path'):
-            try:
-                img = Image.open(self.avatar.path)
-                if img.height > 300 or img.width > 300:
-                    output_size = (300, 300)
-                    img.thumbnail(output_size)
-                    img.save(self.avatar.path)
-            except:
-                pass
-
-    @property
-    def followers_count(self):
-        return self.followers.count()
-
-    @property
-    def following_count(self):
-        return self.following.count()
-
     def is_following(self, user):
-        return self.following.filter(id=user.id).exists()
+        return graph.is_following(self.pk, user.pk)
 
     def get_avatar_url(self):
         """Return user avatar URL or default avatar URL if file doesn't exist"""
         if self.avatar and hasattr(self.avatar, 'url'):
             try:
                 # Try to access the URL - if file exists, this will work
-                return self.avatar.url
+                return images.rendition_url(self.avatar, self.avatar_renditions, 'thumb')
             except:
                 pass
 
@@ -58,7 +49,29 @@ class User(AbstractUser):
         """Return user cover photo URL or None if file doesn't exist"""
         if self.cover_photo and hasattr(self.cover_photo, 'url'):
             try:
-                return self.cover_photo.url
+                return images.rendition_url(self.cover_photo, self.cover_photo_renditions, 'full')
             except:
                 pass
         return None
+
+
+class FollowSuggestion(models.Model):
+    """A precomputed "who to follow" entry, written by ``manage.py compute_follow_suggestions``"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='follow_suggestions')
+    suggested = models.ForeignKey(User, on_delete=models.CASCADE, related_name='+')
+    score = models.FloatField()
+    # How many of the people ``user`` follows already follow ``suggested``
+    mutual_count = models.PositiveIntegerField(default=0)
+    computed_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        ordering = ['-score']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'suggested'], name='unique_follow_suggestion'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-score'], name='follow_suggestion_rank_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.suggested.username} for {self.user.username}"
@@ -0,0 +1,140 @@
+"""
+"Who to follow" suggestions.
+
+Candidates are friends of friends: accounts followed by the people a user
+follows, scored by how many of them follow the candidate plus a bonus for
+recent posting::
+
+    score = mutual_count + FOLLOW_SUGGESTIONS_ACTIVITY_WEIGHT * log(1 + recent posts)
+
+Users who follow nobody yet get the most-followed accounts instead.  The
+top ``FOLLOW_SUGGESTIONS_SIZE`` per user are stored in ``FollowSuggestion``
+by ``manage.py compute_follow_suggestions``, which works through users in
+batches with a fixed number of queries per batch; the sidebar then reads
+them back with a single ``(user, -score)`` index scan.
+"""
+import heapq
+import math
+from collections import Counter, defaultdict
+from datetime import timedelta
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+from posts.models import Post
+from .models import FollowSuggestion
+
+User = get_user_model()
+Follow = User.followers.through
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def size():
+    return _setting('FOLLOW_SUGGESTIONS_SIZE', 20)
+
+
+def _following(user_ids):
+    """``{user_id: {ids they follow}}`` in one query"""
+    # A row (from_user=A, to_user=B) means B follows A
+    following = defaultdict(set)
+    rows = Follow.objects.filter(to_user_id__in=user_ids).values_list('to_user_id', 'from_user_id')
+    for user_id, followed_id in rows.iterator():
+        following[user_id].add(followed_id)
+    return following
+
+
+def _recent_posts(user_ids, now):
+    since = now - timedelta(days=_setting('FOLLOW_SUGGESTIONS_ACTIVITY_DAYS', 14))
+    return dict(
+        Post.objects.filter(author_id__in=user_ids, created_at__gte=since)
+        .values('author_id').annotate(n=Count('id')).values_list('author_id', 'n')
+    )
+
+
+def compute(user_ids, now=None):
+    """Return ``{user_id: [(suggested_id, mutual_count, score), ...]}``, best first"""
+    now = now or timezone.now()
+    user_ids = list(user_ids)
+    following = _following(user_ids)
+    second_degree = _following({followed for ids in following.values() for followed in ids})
+
+    mutuals = {}
+    for user_id in user_ids:
+        counts = Counter()
+        for followed_id in following[user_id]:
+            counts.update(second_degree[followed_id])
+        for excluded in (user_id, *following[user_id]):
+            counts.pop(excluded, None)
+        mutuals[user_id] = counts
+
+    # Cold start: the most-followed accounts for people without second-degree
+    # candidates, fetched deep enough to fill a list after dropping their follows
+    popular = []
+    cold = [user_id for user_id, counts in mutuals.items() if not counts]
+    if cold:
+        depth = size() + 1 + max(len(following[user_id]) for user_id in cold)
+        popular = list(
+            User.objects.filter(followers_count__gt=0).order_by('-followers_count', 'pk')
+            .values_list('pk', flat=True)[:depth]
+        )
+
+    candidates = {candidate for counts in mutuals.values() for candidate in counts} | set(popular)
+    recent = _recent_posts(candidates, now)
+    weight = _setting('FOLLOW_SUGGESTIONS_ACTIVITY_WEIGHT', 0.5)
+
+    suggestions = {}
+    for user_id, counts in mutuals.items():
+        if not counts:
+            excluded = {user_id, *following[user_id]}
+            counts = Counter({pk: 0 for pk in popular if pk not in excluded})
+        scored = (
+            (candidate, mutual_count, mutual_count + weight * math.log1p(recent.get(candidate, 0)))
+            for candidate, mutual_count in counts.items()
+        )
+        suggestions[user_id] = heapq.nlargest(size(), scored, key=lambda item: (item[2], -item[0]))
+    return suggestions
+
+
+def refresh(user_ids, now=None):
+    """Recompute and store suggestions for ``user_ids``; return the number of rows written"""
+    now = now or timezone.now()
+    suggestions = compute(user_ids, now)
+    rows = [
+        FollowSuggestion(user_id=user_id, suggested_id=suggested_id, mutual_count=mutual_count,
+                         score=score, computed_at=now)
+        for user_id, entries in suggestions.items()
+        for suggested_id, mutual_count, score in entries
+    ]
+    with transaction.atomic():
+        FollowSuggestion.objects.filter(user_id__in=user_ids).delete()
+        FollowSuggestion.objects.bulk_create(rows)
+    return len(rows)
+
+
+def stale_users(max_age=None, now=None):
+    """Users whose suggestions are missing or older than ``max_age`` (all users if ``max_age`` is None)"""
+    users = User.objects.filter(is_active=True)
+    if max_age is not None:
+        cutoff = (now or timezone.now()) - max_age
+        users = users.annotate(computed_at=Max('follow_suggestions__computed_at')).filter(
+            Q(computed_at__isnull=True) | Q(computed_at__lt=cutoff)
+        )
+    return users.order_by('pk')
+
+
+def suggestions_for(user, limit=5):
+    """Stored suggestions for ``user``, best first"""
+    return (
+        FollowSuggestion.objects.filter(user=user)
+        .select_related('suggested')
+        .order_by('-score')[:limit]
+    )
+
+
+def forget(user_ids, suggested_ids):
+    """Drop suggestions that became follows, so the sidebar never offers them"""
+    FollowSuggestion.objects.filter(user_id__in=user_ids, suggested_id__in=suggested_ids).delete()
@@ -0,0 +1,52 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+from posts.models import Post
+from . import graph, recommendations, summary
+
+User = get_user_model()
+
+
+@receiver(m2m_changed, sender=User.followers.through)
+def follow_graph_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """Keep the cached follow graph current however the followers relation is edited"""
+    if action == 'pre_clear':
+        # Remember who was on the other side; post_clear no longer knows
+        if reverse:
+            instance._graph_cleared = set(sender.objects.filter(to_user=instance).values_list('from_user_id', flat=True))
+        else:
+            instance._graph_cleared = set(sender.objects.filter(from_user=instance).values_list('to_user_id', flat=True))
+        return
+    if action == 'post_clear':
+        pk_set = getattr(instance, '_graph_cleared', set())
+    elif action not in ('post_add', 'post_remove'):
+        return
+
+    if reverse:
+        # instance.following was edited: instance follows/unfollows pk_set
+        follower_ids, followee_ids = [instance.pk], pk_set
+    else:
+        # instance.followers was edited: pk_set follow/unfollow instance
+        follower_ids, followee_ids = pk_set, [instance.pk]
+    graph.edges_changed(follower_ids, followee_ids)
+    summary.invalidate([*follower_ids, *followee_ids])
+    if action == 'post_add':
+        recommendations.forget(follower_ids, followee_ids)
+
+
+@receiver(post_save, sender=User)
+def profile_changed(sender, instance, update_fields=None, **kwargs):
+    # Logins save last_login only, which no profile shows
+    if update_fields is None or set(update_fields) - {'last_login'}:
+        summary.invalidate([instance.pk])
+
+
+@receiver(post_save, sender=Post)
+def post_created(sender, instance, created, **kwargs):
+    if created:
+        summary.invalidate([instance.author_id])
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    summary.invalidate([instance.author_id])
@@ -0,0 +1,92 @@
+"""
+Cached profile summaries.
+
+Everything the profile header needs -- the user fields it shows
+(``PROFILE_FIELDS``, never the password hash or email), the follow
+counters, avatar and cover URLs, the number of posts -- plus the ids of the
+user's latest top-level posts is cached as one entry in the
+``PROFILE_SUMMARY_CACHE`` alias.  A profile's first page is then a cache
+read and one primary-key lookup of those posts.  ``summary['user']`` is an
+unsaved ``User`` rebuilt from the cached fields, for the templates.
+
+Entries are keyed by user id and looked up through a username -> id entry;
+an entry whose user has since been renamed is treated as a miss.  They are
+dropped (see ``accounts.signals``) when:
+
+* the user edits their profile;
+* the user gains or loses a follower or a followee;
+* the user creates or deletes a post (including retention archiving).
+
+``PROFILE_SUMMARY_SECONDS`` bounds staleness from anything missed, e.g.
+queryset ``update()`` calls -- and, with a per-process cache, from every
+invalidation made in another process, so keep it to seconds unless the
+alias is shared.
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from posts.models import Post
+
+User = get_user_model()
+
+LATEST_POSTS = 10
+# What the profile header shows; nothing else of the user row is cached
+PROFILE_FIELDS = (
+    'id', 'username', 'first_name', 'last_name', 'bio', 'location', 'website', 'date_joined',
+    'cover_photo', 'cover_photo_renditions', 'followers_count', 'following_count',
+)
+
+
+def _cache():
+    return caches[getattr(settings, 'PROFILE_SUMMARY_CACHE', 'default')]
+
+
+def _timeout():
+    return getattr(settings, 'PROFILE_SUMMARY_SECONDS', 30)
+
+
+def user_id_key(username):
+    return f'profile:user-id:{username}'
+
+
+def summary_key(user_id):
+    return f'profile:summary:{user_id}'
+
+
+def build(user):
+    # One more id than shown, so the first page knows whether there is a next one
+    latest = Post.objects.filter(author=user, reply_to__isnull=True).order_by('-created_at', '-id')
+    fields = {name: getattr(user, name) for name in PROFILE_FIELDS}
+    # File fields are cached by name
+    fields['cover_photo'] = user.cover_photo.name
+    return {
+        'fields': fields,
+        'avatar_url': user.get_avatar_url(),
+        'cover_url': user.get_cover_url(),
+        'followers_count': user.followers_count,
+        'following_count': user.following_count,
+        'posts_count': Post.objects.filter(author=user).count(),
+        'latest_post_ids': list(latest.values_list('pk', flat=True)[:LATEST_POSTS + 1]),
+    }
+
+
+def get_summary(username, user=None):
+    """
+    The summary of ``username``'s profile, or ``None`` if there is no such
+    user.  Pass the ``user`` when it's already loaded to save a query on a miss.
+    """
+    cache = _cache()
+    user_id = cache.get(user_id_key(username))
+    summary = cache.get(summary_key(user_id)) if user_id is not None else None
+    if summary is None or summary['fields']['username'] != username:
+        if user is None or user.username != username:
+            user = User.objects.filter(username=username).first()
+        if user is None:
+            return None
+        summary = build(user)
+        cache.set_many({user_id_key(username): user.pk, summary_key(user.pk): summary}, _timeout())
+    return {**summary, 'user': User(**summary['fields'])}
+
+
+def invalidate(user_ids):
+    _cache().delete_many([summary_key(user_id) for user_id in user_ids])
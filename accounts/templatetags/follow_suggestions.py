@@ -0,0 +1,13 @@
+from django import template
+from accounts import recommendations
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def who_to_follow(context, limit=3):
+    """Usage: {% who_to_follow as suggestions %}"""
+    user = context.get('user')
+    if user is None or not user.is_authenticated:
+        return []
+    return recommendations.suggestions_for(user, limit)
@@ -0,0 +1,10 @@
+from django import template
+from accounts import summary
+
+register = template.Library()
+
+
+@register.simple_tag
+def profile_summary(user):
+    """Usage: {% profile_summary user as summary %}"""
+    return summary.get_summary(user.username, user=user)
@@ -1,3 +1,234 @@
+from io import StringIO
+from unittest import mock
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
 from django.test import TestCase
+from django.urls import reverse
+from posts.models import Post
+from .models import FollowSuggestion
+from . import graph, recommendations, summary
 
-# Create your tests here.
+User = get_user_model()
+
+
+class FollowGraphTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice, self.bob, self.carol, self.dave = [
+            User.objects.create_user(username=name, password='testpass123')
+            for name in ('alice', 'bob', 'carol', 'dave')
+        ]
+
+    def follow(self, user, username):
+        self.client.force_login(user)
+        return self.client.post(reverse('follow_user', args=[username])).json()
+
+    def test_queries_are_answered_from_cache(self):
+        self.follow(self.alice, 'bob')
+        self.follow(self.alice, 'carol')
+        self.follow(self.bob, 'alice')
+        self.follow(self.bob, 'dave')
+        self.follow(self.carol, 'dave')
+
+        for user in (self.alice, self.bob, self.carol, self.dave):
+            graph.counts(user.pk)
+        with self.assertNumQueries(0):
+            self.assertTrue(self.alice.is_following(self.bob))
+            self.assertFalse(graph.is_following(self.bob.pk, self.carol.pk))
+            self.assertTrue(graph.is_mutual(self.alice.pk, self.bob.pk))
+            self.assertEqual(graph.followed_by_following(self.alice.pk, self.dave.pk), [self.bob.pk, self.carol.pk])
+            self.assertEqual(graph.follow_states(self.alice.pk, [self.bob.pk, self.dave.pk]), {self.bob.pk})
+            self.assertEqual(graph.counts(self.dave.pk), (2, 0))
+
+    def test_follow_and_unfollow_write_through(self):
+        self.assertFalse(graph.is_following(self.alice.pk, self.bob.pk))
+        self.assertEqual(graph.followers(self.bob.pk).tolist(), [])
+
+        self.assertTrue(self.follow(self.alice, 'bob')['is_following'])
+        with self.assertNumQueries(0):
+            self.assertTrue(graph.is_following(self.alice.pk, self.bob.pk))
+            self.assertEqual(graph.followers(self.bob.pk).tolist(), [self.alice.pk])
+
+        self.assertFalse(self.follow(self.alice, 'bob')['is_following'])
+        self.assertFalse(graph.is_following(self.alice.pk, self.bob.pk))
+
+        # Edits that bypass the view are picked up too
+        self.bob.followers.add(self.carol)
+        self.assertEqual(graph.following(self.carol.pk).tolist(), [self.bob.pk])
+        self.carol.following.clear()
+        self.assertEqual(graph.followers(self.bob.pk).tolist(), [])
+
+    def test_follow_toggle_ignores_a_stale_cached_graph(self):
+        # Another process may have cached the opposite state; the edge row decides
+        with mock.patch.object(graph, 'is_following', return_value=True):
+            self.assertTrue(self.follow(self.alice, 'bob')['is_following'])
+        with mock.patch.object(graph, 'is_following', return_value=False):
+            data = self.follow(self.alice, 'bob')
+        self.assertEqual(data, {'is_following': False, 'followers_count': 0})
+        self.assertFalse(self.bob.followers.exists())
+        self.alice.refresh_from_db()
+        self.assertEqual(self.alice.following_count, 0)
+
+    def test_follow_toggle_losing_the_insert_race_counts_once(self):
+        # A concurrent click inserted the edge after our delete found nothing
+        self.follow(self.alice, 'bob')
+        with mock.patch('django.db.models.query.QuerySet.delete', return_value=(0, {})):
+            self.assertEqual(graph.toggle(self.alice, self.bob), (True, False))
+        self.bob.refresh_from_db()
+        self.alice.refresh_from_db()
+        self.assertEqual((self.bob.followers_count, self.alice.following_count), (1, 1))
+        self.assertEqual(list(self.bob.followers.all()), [self.alice])
+
+    def test_profile_shows_followed_by_and_follows_you(self):
+        self.follow(self.alice, 'carol')
+        self.follow(self.carol, 'bob')
+        self.follow(self.bob, 'alice')
+
+        self.client.force_login(self.alice)
+        response = self.client.get(reverse('profile', args=['bob']))
+        self.assertContains(response, 'Follows you')
+        self.assertContains(response, 'Followed by')
+        self.assertContains(response, '>carol</a>')
+
+
+class FollowSuggestionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.users = {
+            name: User.objects.create_user(username=name, password='testpass123')
+            for name in ('alice', 'bob', 'carol', 'dave', 'erin', 'frank')
+        }
+
+    def follows(self, name, *others):
+        self.client.force_login(self.users[name])
+        for other in others:
+            self.client.post(reverse('follow_user', args=[other]))
+
+    def test_friends_of_friends_ranked_by_overlap_and_activity(self):
+        self.follows('alice', 'bob', 'carol')
+        self.follows('bob', 'dave', 'erin', 'carol')
+        self.follows('carol', 'dave', 'frank')
+        Post.objects.create(author=self.users['frank'], content='still here')
+
+        suggestions = recommendations.compute([self.users['alice'].pk])[self.users['alice'].pk]
+        ranked = [(User.objects.get(pk=pk).username, mutual_count) for pk, mutual_count, _ in suggestions]
+        # carol is already followed; frank's recent post outranks erin
+        self.assertEqual(ranked, [('dave', 2), ('frank', 1), ('erin', 1)])
+
+    def test_command_stores_suggestions_and_endpoint_serves_them(self):
+        self.follows('alice', 'bob')
+        self.follows('bob', 'carol')
+        self.follows('carol', 'bob')
+        self.follows('erin', 'alice')
+
+        call_command('compute_follow_suggestions', batch_size=2, stdout=StringIO())
+        self.assertEqual(
+            list(FollowSuggestion.objects.filter(user=self.users['alice']).values_list('suggested__username', flat=True)),
+            ['carol'],
+        )
+        # dave follows nobody and gets the most-followed accounts
+        self.assertEqual(
+            list(FollowSuggestion.objects.filter(user=self.users['dave']).values_list('suggested__username', flat=True)),
+            ['alice', 'bob', 'carol'],
+        )
+
+        # Fresh suggestions are skipped on the next incremental run
+        out = StringIO()
+        call_command('compute_follow_suggestions', stdout=out)
+        self.assertIn('for 0 users', out.getvalue())
+
+        self.client.force_login(self.users['alice'])
+        with self.assertNumQueries(3):  # session, user, then the suggestions
+            data = self.client.get(reverse('who_to_follow')).json()
+        self.assertEqual([s['username'] for s in data['suggestions']], ['carol'])
+
+        # Following a suggestion removes it straight away
+        self.client.post(reverse('follow_user', args=['carol']))
+        self.assertEqual(self.client.get(reverse('who_to_follow')).json(), {'suggestions': []})
+
+    def test_cold_start_skips_accounts_already_followed(self):
+        self.follows('alice', 'bob')
+        self.follows('carol', 'bob')
+        self.follows('dave', 'bob')
+        self.follows('erin', 'carol')
+        # bob follows nobody, so dave has no second-degree candidates
+        suggestions = recommendations.compute([self.users['dave'].pk])[self.users['dave'].pk]
+        self.assertEqual([User.objects.get(pk=pk).username for pk, _, _ in suggestions], ['carol'])
+
+    def test_limit_is_clamped(self):
+        self.client.force_login(self.users['alice'])
+        self.assertEqual(self.client.get(reverse('who_to_follow'), {'limit': '-3'}).status_code, 200)
+
+
+class ProfileSummaryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create_user(username='alice', password='testpass123')
+        self.bob = User.objects.create_user(username='bob', password='testpass123')
+        self.client.force_login(self.bob)
+
+    def test_summary_is_cached_and_invalidated(self):
+        Post.objects.create(author=self.alice, content='first')
+        self.assertEqual(summary.get_summary('alice')['posts_count'], 1)
+        with self.assertNumQueries(0):
+            summary.get_summary('alice')
+
+        post = Post.objects.create(author=self.alice, content='second')
+        self.assertEqual(summary.get_summary('alice')['latest_post_ids'][0], post.pk)
+
+        self.client.post(reverse('follow_user', args=['alice']))
+        self.assertEqual(summary.get_summary('alice')['followers_count'], 1)
+        self.assertEqual(summary.get_summary('bob')['following_count'], 1)
+
+        self.alice.username = 'alicia'
+        self.alice.save()
+        self.assertIsNone(summary.get_summary('alice'))
+        self.assertEqual(summary.get_summary('alicia')['user'].pk, self.alice.pk)
+
+    def test_only_displayed_fields_are_cached(self):
+        self.alice.bio = 'hello'
+        self.alice.save()
+        profile = summary.get_summary('alice')
+        self.assertEqual((profile['user'].bio, profile['user'].get_full_name()), ('hello', ''))
+        self.assertEqual(profile['user'], self.alice)
+
+        cached = cache.get(summary.summary_key(self.alice.pk))
+        self.assertNotIn('user', cached)
+        self.assertEqual(set(cached['fields']), set(summary.PROFILE_FIELDS))
+        self.assertNotIn(self.alice.password, repr(cached))
+
+    def test_large_profile_loads_in_constant_queries(self):
+        Post.objects.bulk_create([Post(author=self.alice, content=f'post {i}') for i in range(50)])
+        url = reverse('profile', args=['alice'])
+        self.client.get(url)
+        # Session, viewer, the page's posts, the viewer's likes/retweets, suggestions
+        with self.assertNumQueries(5):
+            response = self.client.get(url)
+        self.assertEqual(len(response.context['page_obj']), 10)
+        self.assertContains(response, '50 posts')
+
+        older = self.client.get(url, {'cursor': response.context['page_obj'].next_cursor})
+        self.assertEqual(len(older.context['page_obj']), 10)
+        self.assertTrue(older.context['page_obj'].has_previous())
+
+    def test_tabs_page_over_replies_likes_and_retweets(self):
+        root = Post.objects.create(author=self.bob, content='root')
+        replies = [Post.objects.create(author=self.alice, content=f'reply {i}', reply_to=root) for i in range(12)]
+        for reply in replies:
+            reply.likes.add(self.alice)
+        root.retweets.add(self.alice)
+
+        response = self.client.get(reverse('profile_tab', args=['alice', 'replies']))
+        self.assertEqual([post.pk for post in response.context['page_obj']], [p.pk for p in replies[::-1][:10]])
+        self.assertEqual(list(self.client.get(reverse('profile', args=['alice'])).context['page_obj']), [])
+
+        likes = self.client.get(reverse('profile_tab', args=['alice', 'likes']))
+        page = likes.context['page_obj']
+        self.assertEqual(page.object_list[0], replies[-1])
+        rest = self.client.get(reverse('profile_tab', args=['alice', 'likes']), {'cursor': page.next_cursor})
+        self.assertEqual(rest.context['page_obj'].object_list, replies[1::-1])
+
+        retweets = self.client.get(reverse('profile_tab', args=['alice', 'retweets']))
+        self.assertEqual(retweets.context['page_obj'].object_list, [root])
+        self.assertEqual(self.client.get(reverse('profile_tab', args=['alice', 'bogus'])).status_code, 404)
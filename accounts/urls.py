@@ -7,6 +7,8 @@ urlpatterns = [
     path('login/', views.login_view, name='login'),
     path('logout/', views.logout_view, name='logout'),
     path('profile/<str:username>/', views.profile_view, name='profile'),
+    path('profile/<str:username>/<str:tab>/', views.profile_view, name='profile_tab'),
     path('edit-profile/', views.edit_profile_view, name='edit_profile'),
     path('follow/<str:username>/', views.follow_user, name='follow_user'),
+    path('who-to-follow/', views.who_to_follow, name='who_to_follow'),
 ]
@@ -3,8 +3,16 @@ from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.contrib.auth import get_user_model
-from django.http import JsonResponse
+from django.http import Http404, JsonResponse
 from django.views.decorators.http import require_POST
+from functools import partial
+from xclone.profiling import query_budget
+from asgiref.sync import sync_to_async
+from posts import feed, timeline
+from posts.models import Post
+from posts.pagination import CursorPage, CursorPaginator
+from xclone import concurrency
+from . import graph, recommendations, summary
 from .forms import CustomUserCreationForm, CustomUserChangeForm, LoginForm
 
 User = get_user_model()
@@ -44,17 +52,79 @@ def logout_view(request):
     messages.success(request, 'You have been logged out successfully.')
     return redirect('home')
 
+PROFILE_TABS = ('posts', 'replies', 'likes', 'retweets')
+PROFILE_PAGE_SIZE = summary.LATEST_POSTS
+
+def _profile_page(profile, tab, cursor, viewer):
+    # Each tab is a keyset page over its own index, newest first
+    user_id = profile['user'].pk
+    if tab in ('posts', 'replies'):
+        posts = Post.objects.filter(author_id=user_id, reply_to__isnull=tab == 'posts').select_related('author')
+        paginator = CursorPaginator(posts, PROFILE_PAGE_SIZE)
+        if tab == 'posts' and not cursor:
+            # The first page comes from the ids cached in the summary
+            ids = profile['latest_post_ids']
+            by_id = posts.in_bulk(ids[:PROFILE_PAGE_SIZE])
+            shown = [by_id[pk] for pk in ids[:PROFILE_PAGE_SIZE] if pk in by_id]
+            next_cursor = None
+            if len(ids) > PROFILE_PAGE_SIZE and shown:
+                next_cursor = paginator.cursor_for(shown[-1])
+            page_obj = CursorPage(shown, next_cursor=next_cursor)
+        else:
+            page_obj = paginator.get_page(cursor)
+    else:
+        # Like/retweet rows have no timestamp; their ids are in the order they were made
+        links = getattr(Post, tab).through.objects.filter(user_id=user_id).select_related('post__author')
+        page_obj = CursorPaginator(links, PROFILE_PAGE_SIZE, keys=('pk',)).get_page(cursor)
+        page_obj.object_list = [link.post for link in page_obj]
+    return feed.decorate_page(page_obj, viewer)
+
+def _followed_by(viewer, user):
+    # Follow state and "followed by" from the cached follow graph
+    followed_by_ids = graph.followed_by_following(viewer.pk, user.pk)
+    followed_by = list(User.objects.filter(pk__in=followed_by_ids[:3]).only('username', 'first_name', 'last_name'))
+    return {
+        'is_following': graph.is_following(viewer.pk, user.pk),
+        'follows_you': graph.is_following(user.pk, viewer.pk),
+        'followed_by': followed_by,
+        'followed_by_others': max(len(followed_by_ids) - 3, 0),
+    }
+
+# All caches cold; with the summary, follow graph and sidebar cached a page takes about 5
+@query_budget(18)
 @login_required
-def profile_view(request, username):
-    user = get_object_or_404(User, username=username)
-    posts = user.posts.all()[:10]  # Latest 10 posts
+async def profile_view(request, username, tab='posts'):
+    if tab not in PROFILE_TABS:
+        raise Http404('No such profile tab.')
+    viewer = await request.auser()
+    # The template's request.user would load the same user again
+    request.user = viewer
+    profile = await sync_to_async(summary.get_summary)(username)
+    if profile is None:
+        raise Http404('No user matches the given query.')
+    user = profile['user']
+    is_own_profile = viewer == user
+
+    work = [partial(_profile_page, profile, tab, request.GET.get('cursor'), viewer)]
+    if not is_own_profile:
+        work.append(partial(_followed_by, viewer, user))
+    page_obj, *social = await concurrency.gather(*work)
+
     context = {
         'profile_user': user,
-        'posts': posts,
-        'is_own_profile': request.user == user,
-        'is_following': request.user.is_following(user) if request.user.is_authenticated and request.user != user else False,
+        'summary': profile,
+        'tab': tab,
+        'tabs': PROFILE_TABS,
+        'page_obj': page_obj,
+        'is_own_profile': is_own_profile,
+        'is_following': False,
+        'follows_you': False,
+        'followed_by': [],
+        'followed_by_others': 0,
     }
-    return render(request, 'accounts/profile.html', context)
+    if social:
+        context.update(social[0])
+    return await sync_to_async(render)(request, 'accounts/profile.html', context)
 
 @login_required
 def edit_profile_view(request):
@@ -68,20 +138,43 @@ def edit_profile_view(request):
         form = CustomUserChangeForm(instance=request.user)
     return render(request, 'accounts/edit_profile.html', {'form': form})
 
+@query_budget(18)
 @login_required
 @require_POST
 def follow_user(request, username):
     user_to_follow = get_object_or_404(User, username=username)
     if request.user != user_to_follow:
-        if request.user.is_following(user_to_follow):
-            request.user.following.remove(user_to_follow)
-            is_following = False
-        else:
-            request.user.following.add(user_to_follow)
-            is_following = True
+        # Decided from the edge row; the cached graph is never consulted for writes
+        is_following, changed = graph.toggle(request.user, user_to_follow)
+        if changed and is_following:
+            timeline.backfill_author(request.user, user_to_follow)
+        elif changed:
+            timeline.remove_author(request.user, user_to_follow)
+        user_to_follow.refresh_from_db(fields=['followers_count'])
 
         return JsonResponse({
             'is_following': is_following,
             'followers_count': user_to_follow.followers_count
         })
     return JsonResponse({'error': 'Cannot follow yourself'}, status=400)
+
+@query_budget(5)
+@login_required
+def who_to_follow(request):
+    # Precomputed by manage.py compute_follow_suggestions; one indexed lookup
+    try:
+        limit = max(1, min(int(request.GET.get('limit', 5)), 20))
+    except ValueError:
+        limit = 5
+    suggestions = recommendations.suggestions_for(request.user, limit)
+    return JsonResponse({
+        'suggestions': [
+            {
+                'username': suggestion.suggested.username,
+                'name': suggestion.suggested.get_full_name() or suggestion.suggested.username,
+                'avatar_url': suggestion.suggested.get_avatar_url(),
+                'mutual_count': suggestion.mutual_count,
+            }
+            for suggestion in suggestions
+        ]
+    })
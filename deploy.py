@@ -12,7 +12,9 @@ def deploy():
     os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'xclone.production_settings')
     
     try:
-        # Collect static files
+        # Bundle CSS/JS, then collect static files
+        print("Building static assets...")
+        execute_from_command_line(['manage.py', 'build_assets', '--fetch'])
         print("Collecting static files...")
         execute_from_command_line(['manage.py', 'collectstatic', '--noinput'])
         
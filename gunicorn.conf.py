@@ -0,0 +1,23 @@
+"""
+Gunicorn configuration (used by the Procfile).
+
+WEB_SERVER_MODE=asgi (the default) runs Django's ASGI application on uvicorn
+workers: each worker serves many requests at once, so requests waiting on
+the database, the SSE stream (/events/) and async views don't tie up a whole
+process.  WEB_SERVER_MODE=wsgi falls back to classic synchronous workers.
+"""
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '8000')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+timeout = int(os.environ.get('WEB_TIMEOUT', 30))
+graceful_timeout = 30
+keepalive = 5
+
+if os.environ.get('WEB_SERVER_MODE', 'asgi') == 'asgi':
+    wsgi_app = 'xclone.asgi:application'
+    worker_class = 'uvicorn_worker.UvicornWorker'
+else:
+    wsgi_app = 'xclone.wsgi:application'
+    worker_class = 'gthread'
+    threads = int(os.environ.get('WEB_THREADS', 4))
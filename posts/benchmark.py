@@ -0,0 +1,178 @@
+"""
+Request benchmarks for the hot paths.
+
+``run`` drives the views through the Django test client against whatever
+data is in the database (see ``synthetic.generate``) and reports, per
+scenario, latency percentiles and the number of queries per request::
+
+    {"home": {"requests": 200, "p50_ms": 8.1, "p99_ms": 21.4, "mean_ms": 9.0,
+              "queries_mean": 7.0, "queries_max": 7, "errors": 0}, ...}
+
+Viewers, hashtags, search terms and posts are drawn from the data with a
+seeded generator, so two runs over the same dataset make the same requests
+and their reports can be compared across commits.  Rate limits are lifted
+and query budgets only logged while a run is in progress.
+
+``engagement_throughput`` compares the two like paths: direct writes, and
+appending to the engagement log plus the batch aggregator's cost per event.
+"""
+import random
+import statistics
+import subprocess
+import time
+from django.contrib.auth import get_user_model
+from django.db import connections, reset_queries
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from . import engagement
+from .models import EngagementEvent, Hashtag, Post
+
+User = get_user_model()
+
+SCENARIOS = ('home', 'hashtag', 'search', 'profile', 'like_post', 'create_post')
+
+
+def percentile(values, fraction):
+    """Nearest-rank percentile of a non-empty list"""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(fraction * len(ordered)) - 1))]
+
+
+class Benchmark:
+    def __init__(self, seed=0, users=None):
+        self.random = random.Random(seed)
+        self.client = Client()
+        users = users if users is not None else User.objects.filter(is_active=True)
+        self.users = list(users.order_by('pk')[:1000])
+        self.hashtags = list(Hashtag.objects.order_by('pk').values_list('name', flat=True)[:200])
+        self.post_ids = list(Post.objects.order_by('-pk').values_list('pk', flat=True)[:1000])
+        words = ' '.join(Post.objects.order_by('-pk').values_list('content', flat=True)[:50]).split()
+        self.terms = [word for word in words if word.isalpha()] or ['post']
+        if not self.users:
+            raise ValueError('No users to benchmark with; run generate_social_graph first')
+
+    def viewer(self):
+        user = self.random.choice(self.users)
+        self.client.force_login(user)
+        return user
+
+    # Each scenario logs a viewer in (untimed) and returns the request to time
+
+    def home(self):
+        self.viewer()
+        return lambda: self.client.get(reverse('home'))
+
+    def hashtag(self):
+        url = reverse('hashtag', args=[self.random.choice(self.hashtags or ['none'])])
+        return lambda: self.client.get(url)
+
+    def search(self):
+        query = {'q': self.random.choice(self.terms)}
+        return lambda: self.client.get(reverse('search'), query)
+
+    def profile(self):
+        self.viewer()
+        url = reverse('profile', args=[self.random.choice(self.users).username])
+        return lambda: self.client.get(url)
+
+    def like_post(self):
+        self.viewer()
+        url = reverse('like_post', args=[self.random.choice(self.post_ids)])
+        return lambda: self.client.post(url, headers={'x-requested-with': 'XMLHttpRequest'})
+
+    def create_post(self):
+        self.viewer()
+        words = self.random.choices(self.terms, k=8) + [f"#{self.random.choice(self.hashtags or ['bench'])}"]
+        return lambda: self.client.post(reverse('create_post'), {'content': ' '.join(words)})
+
+    def measure(self, scenario, requests, warmup):
+        prepare = getattr(self, scenario)
+        for _ in range(warmup):
+            prepare()()
+
+        timings, queries, errors = [], [], 0
+        for _ in range(requests):
+            send = prepare()
+            # The query log is capped; a full one would make the captured slice empty
+            reset_queries()
+            with CaptureQueriesContext(connections['default']) as captured:
+                started = time.perf_counter()
+                response = send()
+                timings.append((time.perf_counter() - started) * 1000)
+            queries.append(len(captured))
+            errors += response.status_code >= 400
+        return {
+            'requests': requests,
+            'p50_ms': round(percentile(timings, 0.5), 2),
+            'p90_ms': round(percentile(timings, 0.9), 2),
+            'p99_ms': round(percentile(timings, 0.99), 2),
+            'mean_ms': round(statistics.fmean(timings), 2),
+            'queries_mean': round(statistics.fmean(queries), 2),
+            'queries_max': max(queries),
+            'errors': errors,
+        }
+
+
+def run(scenarios=SCENARIOS, requests=100, warmup=10, seed=0, users=None):
+    """Benchmark ``scenarios``; return ``{scenario: report}``"""
+    with override_settings(RATE_LIMITS={}, QUERY_BUDGET_RAISE=False, ALLOWED_HOSTS=['testserver']):
+        benchmark = Benchmark(seed=seed, users=users)
+        if not benchmark.post_ids:
+            scenarios = [scenario for scenario in scenarios if scenario != 'like_post']
+        return {scenario: benchmark.measure(scenario, requests, warmup) for scenario in scenarios}
+
+
+def engagement_throughput(operations=500, batch_size=1000, seed=0, users=None):
+    """
+    Like requests per second and queries per like with ``ENGAGEMENT_LOG``
+    off (``direct``) and on (``log``), and what ``aggregate`` then spends
+    applying the logged events.  Both modes make the same requests.
+    """
+    report = {}
+    with override_settings(RATE_LIMITS={}, QUERY_BUDGET_RAISE=False, ALLOWED_HOSTS=['testserver']):
+        for mode, enabled in (('direct', False), ('log', True)):
+            with override_settings(ENGAGEMENT_LOG=enabled):
+                result = Benchmark(seed=seed, users=users).measure('like_post', operations, warmup=0)
+            result['ops_per_s'] = round(1000 / result['mean_ms'], 1)
+            report[mode] = result
+
+    events = EngagementEvent.objects.count()
+    batches = 0
+    reset_queries()
+    with CaptureQueriesContext(connections['default']) as captured:
+        started = time.perf_counter()
+        while engagement.aggregate(batch_size):
+            batches += 1
+        elapsed = time.perf_counter() - started
+    report['aggregate'] = {
+        'events': events,
+        'batches': batches,
+        'events_per_s': round(events / elapsed, 1) if elapsed else None,
+        'queries_per_event': round(len(captured) / events, 3) if events else None,
+    }
+    return report
+
+
+def current_commit():
+    """Short hash of the checked-out commit, or ``None`` outside a git checkout"""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(current, baseline):
+    """Relative change per scenario against an earlier report (positive means slower / more queries)"""
+    changes = {}
+    for scenario, report in current.items():
+        before = baseline.get(scenario)
+        if not before:
+            continue
+        changes[scenario] = {
+            key: round(report[key] / before[key] - 1, 3) if before[key] else None
+            for key in ('p50_ms', 'p99_ms', 'queries_mean')
+        }
+    return changes
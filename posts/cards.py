@@ -0,0 +1,65 @@
+"""
+Cached fragments of the shared post card (``posts/_post_card.html``).
+
+The parts of a card that only change when the post or its author is edited
+-- avatar, display name, rendered content and image -- are cached in the
+``POST_CARD_CACHE`` alias, keyed by primary key and ``updated_at``, so an
+edit produces a new key and the stale entry simply ages out of the LRU.
+The relative timestamp, counters and per-viewer like/retweet state are
+rendered fresh on every request.
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.template.loader import render_to_string
+from django.utils.html import format_html
+from django.utils.safestring import mark_safe
+
+
+def fragment_cache():
+    return caches[getattr(settings, 'POST_CARD_CACHE', 'default')]
+
+
+def author_key(author):
+    return f'post-card:author:{author.pk}:{author.updated_at.timestamp()}'
+
+
+def body_key(post):
+    return f'post-card:body:{post.pk}:{post.updated_at.timestamp()}'
+
+
+def render_author(author):
+    return {
+        'avatar': format_html('<img src="{}" alt="Avatar" class="user-avatar me-3">', author.get_avatar_url()),
+        'name': format_html(
+            '<strong>{}</strong>\n<span class="text-muted ms-2">@{}</span>',
+            author.get_full_name() or author.username,
+            author.username,
+        ),
+    }
+
+
+def render_body(post):
+    return render_to_string('posts/_post_card_body.html', {'post': post})
+
+
+def card_fragments(post):
+    """Return the cached ``avatar``, ``name`` and ``body`` HTML for a post card"""
+    cache = fragment_cache()
+    keys = {'author': author_key(post.author), 'body': body_key(post)}
+    cached = cache.get_many(keys.values())
+
+    author = cached.get(keys['author'])
+    body = cached.get(keys['body'])
+    missing = {}
+    if author is None:
+        author = missing[keys['author']] = render_author(post.author)
+    if body is None:
+        body = missing[keys['body']] = render_body(post)
+    if missing:
+        cache.set_many(missing)
+
+    return {
+        'avatar': mark_safe(author['avatar']),
+        'name': mark_safe(author['name']),
+        'body': mark_safe(body),
+    }
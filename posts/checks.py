@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.checks import Error, Warning, register
+
+
+@register()
+def engagement_log_check(app_configs, **kwargs):
+    """The engagement worker shares notification state and live events with the web processes"""
+    if not getattr(settings, 'ENGAGEMENT_LOG', False):
+        return []
+    errors = []
+    alias = getattr(settings, 'NOTIFICATION_CACHE', 'default')
+    backend = settings.CACHES.get(alias, {}).get('BACKEND')
+    if backend is None or backend.endswith('LocMemCache'):
+        errors.append(Error(
+            f'ENGAGEMENT_LOG needs NOTIFICATION_CACHE ({alias!r}) to be a cache shared between processes.',
+            hint='Point NOTIFICATION_CACHE at a Redis or Memcached alias; a local-memory cache '
+                 'leaves unread counts and notification coalescing per process.',
+            id='posts.E001',
+        ))
+    if getattr(settings, 'EVENTS_BROKER', '').endswith('InProcessBroker'):
+        errors.append(Warning(
+            'ENGAGEMENT_LOG with the in-process events broker: counter and notification '
+            'updates published by the worker never reach browsers.',
+            hint='Use xclone.events.RedisBroker.',
+            id='posts.W001',
+        ))
+    return errors
@@ -0,0 +1,73 @@
+"""
+Recomputation of the denormalized counter columns on Post and User.
+
+The views keep the counters current with ``F()`` updates; this module is
+the slow path used to repair drift from writes that bypassed them (admin,
+shell, bulk imports).
+"""
+from functools import reduce
+from operator import or_
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from .models import Post
+
+User = get_user_model()
+
+# counter column -> (table holding the rows, foreign key back to the counted object)
+POST_COUNTERS = {
+    'likes_count': (Post.likes.through, 'post'),
+    'retweets_count': (Post.retweets.through, 'post'),
+    'replies_count': (Post, 'reply_to'),
+}
+USER_COUNTERS = {
+    'followers_count': (User.followers.through, 'from_user'),
+    'following_count': (User.followers.through, 'to_user'),
+}
+
+
+def count_expression(model, field):
+    """Correlated ``COUNT(*)`` of ``model`` rows pointing at the outer row"""
+    rows = (
+        model.objects.filter(**{field: OuterRef('pk')})
+        .order_by()
+        .values(field)
+        .annotate(n=Count('*'))
+        .values('n')
+    )
+    return Coalesce(Subquery(rows), 0)
+
+
+def repair(model, counters, batch_size=1000, dry_run=False):
+    """Fix drifted counters in primary-key batches and return how many rows drifted"""
+    actual = {name: count_expression(*source) for name, source in counters.items()}
+    drift = reduce(or_, [~Q(**{name: F(f'actual_{name}')}) for name in counters])
+
+    drifted = 0
+    last_pk = 0
+    while True:
+        pks = list(
+            model.objects.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size]
+        )
+        if not pks:
+            break
+        last_pk = pks[-1]
+
+        stale = list(
+            model.objects.filter(pk__gte=pks[0], pk__lte=last_pk)
+            .annotate(**{f'actual_{name}': expression for name, expression in actual.items()})
+            .filter(drift)
+            .values_list('pk', flat=True)
+        )
+        drifted += len(stale)
+        if stale and not dry_run:
+            model.objects.filter(pk__in=stale).update(**actual)
+    return drifted
+
+
+def repair_post_counters(**kwargs):
+    return repair(Post, POST_COUNTERS, **kwargs)
+
+
+def repair_user_counters(**kwargs):
+    return repair(User, USER_COUNTERS, **kwargs)
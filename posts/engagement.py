@@ -0,0 +1,160 @@
+"""
+Like and retweet toggles.
+
+``toggle`` flips a user's like (or retweet) on a post without loading the
+post's likers into Python: it first deletes the user's row from the M2M
+table, and only if there was none inserts one.  The membership check is the
+``DELETE``'s row count and the table's unique ``(post, user)`` constraint,
+so two concurrent clicks can never both insert, and the counter column is
+only touched when a row actually changed.
+
+With ``ENGAGEMENT_LOG`` on, requests don't touch the M2M tables or the
+post's counter row at all: ``record`` appends the desired end state to the
+``EngagementEvent`` log, and ``aggregate`` (``manage.py
+aggregate_engagement``, looping or from cron) applies the log in batches --
+one ``bulk_create``/``DELETE`` per relation, one counter ``UPDATE`` per post,
+and coalesced notifications and live counter events.  A popular post no
+longer serialises every liker on its counter row; in exchange the stored
+state lags the log by up to the aggregator's interval, which ``record``
+hides from the clicking user by reading their own pending events.  The
+worker is a separate process, so the log needs a shared
+``NOTIFICATION_CACHE`` (see ``posts.checks``).
+"""
+from collections import Counter, defaultdict
+from functools import partial
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from xclone import events
+from . import notifications
+from .models import EngagementEvent, Notification, Post
+
+COUNTERS = {
+    'likes': 'likes_count',
+    'retweets': 'retweets_count',
+}
+NOTIFICATION_TYPES = {
+    'likes': 'like',
+    'retweets': 'retweet',
+}
+RELATION_CODES = {relation: code for code, relation in EngagementEvent.RELATIONS}
+
+
+def log_enabled():
+    return getattr(settings, 'ENGAGEMENT_LOG', False)
+
+
+def publish_counter(post_id, field, delta, value=None):
+    data = {'post_id': post_id, 'field': field, 'delta': delta}
+    if value is not None:
+        data['value'] = value
+    events.publish([events.post_channel(post_id)], 'counter', data)
+
+
+def toggle(post, user, relation):
+    """
+    Flip ``user``'s ``relation`` ('likes' or 'retweets') on ``post``.
+
+    Return ``(active, changed)``: whether the user now likes/retweets the
+    post, and whether this call changed anything (``False`` when a
+    concurrent request already inserted the same row).
+    """
+    through = getattr(Post, relation).through
+    counter = COUNTERS[relation]
+    with transaction.atomic():
+        deleted, _ = through.objects.filter(post_id=post.pk, user_id=user.pk).delete()
+        if deleted:
+            Post.objects.filter(pk=post.pk).update(**{counter: F(counter) - 1})
+            return False, True
+        try:
+            with transaction.atomic():
+                through.objects.create(post_id=post.pk, user_id=user.pk)
+        except IntegrityError:
+            # Lost the race to an identical request; it already counted the row
+            return True, False
+        Post.objects.filter(pk=post.pk).update(**{counter: F(counter) + 1})
+        return True, True
+
+
+def record(post, user, relation):
+    """
+    Append a flip of ``user``'s ``relation`` on ``post`` to the event log.
+
+    The current state is the user's latest pending event, or the M2M row
+    when nothing is pending.  Return ``(active, count)``: the new state and
+    the post's counter as it will be once the log is applied (as far as
+    this user's engagement goes).
+    """
+    code = RELATION_CODES[relation]
+    pending = (EngagementEvent.objects.filter(user_id=user.pk, post_id=post.pk, relation=code)
+               .order_by('-pk').values_list('active', flat=True).first())
+    applied = getattr(Post, relation).through.objects.filter(post_id=post.pk, user_id=user.pk).exists()
+    active = not (applied if pending is None else pending)
+    EngagementEvent.objects.create(post_id=post.pk, user_id=user.pk, relation=code, active=active)
+    return active, max(getattr(post, COUNTERS[relation]) + active - applied, 0)
+
+
+def aggregate(batch_size=1000):
+    """
+    Apply (and delete) up to ``batch_size`` of the oldest logged events; return how many were read.
+
+    Only the latest event per (user, post, relation) counts, and it is
+    compared with the stored rows, so replaying a batch changes nothing.
+    Events for deleted posts are dropped.
+    """
+    with transaction.atomic():
+        batch = list(EngagementEvent.objects.order_by('pk')
+                     .values_list('pk', 'relation', 'post_id', 'user_id', 'active')[:batch_size])
+        if not batch:
+            return 0
+        latest = {(code, post_id, user_id): active for _, code, post_id, user_id, active in batch}
+        authors = dict(Post.objects.filter(pk__in={post_id for _, post_id, _ in latest})
+                       .values_list('pk', 'author_id'))
+
+        deltas = defaultdict(Counter)
+        pending_notifications = []
+        for code, relation in EngagementEvent.RELATIONS:
+            wanted = {(post_id, user_id): active for (event_code, post_id, user_id), active in latest.items()
+                      if event_code == code and post_id in authors}
+            if not wanted:
+                continue
+            through = getattr(Post, relation).through
+            stored = set(through.objects.filter(post_id__in={post_id for post_id, _ in wanted},
+                                                user_id__in={user_id for _, user_id in wanted})
+                         .values_list('post_id', 'user_id'))
+            added = [key for key, active in wanted.items() if active and key not in stored]
+            removed = defaultdict(list)
+            for (post_id, user_id), active in wanted.items():
+                if not active and (post_id, user_id) in stored:
+                    removed[post_id].append(user_id)
+
+            through.objects.bulk_create([through(post_id=post_id, user_id=user_id) for post_id, user_id in added],
+                                        ignore_conflicts=True)
+            for post_id, user_ids in removed.items():
+                through.objects.filter(post_id=post_id, user_id__in=user_ids).delete()
+
+            counter = COUNTERS[relation]
+            for post_id, user_id in added:
+                deltas[post_id][counter] += 1
+                if authors[post_id] != user_id:
+                    pending_notifications.append(Notification(
+                        recipient_id=authors[post_id], sender_id=user_id,
+                        notification_type=NOTIFICATION_TYPES[relation], post_id=post_id,
+                    ))
+            for post_id, user_ids in removed.items():
+                deltas[post_id][counter] -= len(user_ids)
+
+        for post_id, changes in deltas.items():
+            updates = {counter: F(counter) + delta for counter, delta in changes.items() if delta}
+            if updates:
+                Post.objects.filter(pk=post_id).update(**updates)
+        # By primary key, not a range: events appended meanwhile may commit with lower ids
+        EngagementEvent.objects.filter(pk__in=[pk for pk, *_ in batch]).delete()
+        # Coalescing and unread counts touch the cache, so only once the batch is in
+        transaction.on_commit(partial(notifications.bulk_notify_once, pending_notifications))
+
+        for post_id, *values in Post.objects.filter(pk__in=deltas).values_list('pk', *COUNTERS.values()):
+            for counter, value in zip(COUNTERS.values(), values):
+                if deltas[post_id][counter]:
+                    publish_counter(post_id, counter, deltas[post_id][counter], value)
+    return len(batch)
@@ -0,0 +1,38 @@
+"""
+Per-viewer decoration of feed pages.
+
+Templates used to test ``user in post.likes.all`` for every card, which
+loads every liker of every post on the page.  ``decorate`` instead looks up
+the viewer's likes and retweets for the whole page in one query and sets
+``viewer_liked`` / ``viewer_retweeted`` on each post.
+"""
+from django.db.models import Value
+from .models import Post
+
+
+def decorate(posts, viewer):
+    """Set ``viewer_liked``/``viewer_retweeted`` on each post and return them as a list"""
+    posts = list(posts)
+    liked, retweeted = set(), set()
+
+    post_ids = [post.pk for post in posts]
+    if post_ids and viewer.is_authenticated:
+        likes = Post.likes.through.objects.filter(user=viewer, post_id__in=post_ids).values_list(
+            'post_id', Value('like')
+        )
+        retweets = Post.retweets.through.objects.filter(user=viewer, post_id__in=post_ids).values_list(
+            'post_id', Value('retweet')
+        )
+        for post_id, kind in likes.union(retweets, all=True):
+            (liked if kind == 'like' else retweeted).add(post_id)
+
+    for post in posts:
+        post.viewer_liked = post.pk in liked
+        post.viewer_retweeted = post.pk in retweeted
+    return posts
+
+
+def decorate_page(page_obj, viewer):
+    """Decorate a paginator page in place"""
+    page_obj.object_list = decorate(page_obj.object_list, viewer)
+    return page_obj
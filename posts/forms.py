@@ -4,8 +4,9 @@ from .models import Post
 class PostForm(forms.ModelForm):
     class Meta:
         model = Post
-        fields = ['content', 'image']
+        fields = ['content', 'image', 'reply_to']
         widgets = {
+            'reply_to': forms.HiddenInput(),
             'content': forms.Textarea(attrs={
                 'class': 'form-control',
                 'rows': 3,
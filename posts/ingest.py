@@ -0,0 +1,84 @@
+"""
+Hashtag and mention extraction for new and existing posts.
+
+``process_posts`` handles any number of posts with a fixed number of
+queries: one ``bulk_create(ignore_conflicts=True)`` for new hashtags, one
+lookup of their ids, one bulk insert into the hashtag/post through table,
+one username lookup for mentions and one bulk insert of ``mention``
+notifications (which also bumps the cached unread counts).  New posts also
+count towards trending hashtags.
+"""
+from django.contrib.auth import get_user_model
+from .models import Hashtag, HashtagPost, Notification
+from . import notifications, trending
+
+User = get_user_model()
+
+HASHTAG_MAX_LENGTH = Hashtag._meta.get_field('name').max_length
+
+
+def normalize_hashtag(name):
+    """Case-fold a hashtag, with or without its leading ``#``"""
+    return name.lstrip('#').casefold()[:HASHTAG_MAX_LENGTH]
+
+
+def hashtag_names(post):
+    """Return the post's normalized hashtags, deduplicated in order of appearance"""
+    return list(dict.fromkeys(filter(None, map(normalize_hashtag, post.get_hashtags()))))
+
+
+def mention_usernames(post):
+    return list(dict.fromkeys(mention[1:] for mention in post.get_mentions()))
+
+
+def link_hashtags(posts):
+    """Create missing hashtags and link each post to its tags"""
+    tags_by_post = {post.pk: hashtag_names(post) for post in posts}
+    names = {name for tags in tags_by_post.values() for name in tags}
+    if not names:
+        return {}
+
+    Hashtag.objects.bulk_create([Hashtag(name=name) for name in names], ignore_conflicts=True)
+    hashtag_ids = dict(Hashtag.objects.filter(name__in=names).values_list('name', 'id'))
+
+    HashtagPost.objects.bulk_create([
+        HashtagPost(hashtag_id=hashtag_ids[name], post_id=post.pk, created_at=post.created_at)
+        for post in posts
+        for name in tags_by_post[post.pk]
+    ], ignore_conflicts=True)
+    return {post_id: [hashtag_ids[name] for name in tags] for post_id, tags in tags_by_post.items()}
+
+
+def notify_mentions(posts, skip_existing=False):
+    """Create one ``mention`` notification per mentioned user per post"""
+    usernames_by_post = {post.pk: mention_usernames(post) for post in posts}
+    usernames = {name for names in usernames_by_post.values() for name in names}
+    if not usernames:
+        return []
+
+    user_ids = dict(User.objects.filter(username__in=usernames).values_list('username', 'id'))
+    pending = [
+        Notification(recipient_id=user_ids[name], sender_id=post.author_id, notification_type='mention', post=post)
+        for post in posts
+        for name in usernames_by_post[post.pk]
+        if name in user_ids and user_ids[name] != post.author_id
+    ]
+
+    if skip_existing and pending:
+        existing = set(
+            Notification.objects.filter(notification_type='mention', post__in=posts)
+            .values_list('post_id', 'recipient_id')
+        )
+        pending = [n for n in pending if (n.post_id, n.recipient_id) not in existing]
+
+    return notifications.bulk_notify(pending)
+
+
+def process_posts(posts, skip_existing_mentions=False):
+    """Link hashtags, count them as trending and notify mentioned users for a batch of new posts"""
+    posts = list(posts)
+    hashtag_ids = link_hashtags(posts)
+    trending.record(
+        (hashtag_id, post.created_at) for post in posts for hashtag_id in hashtag_ids.get(post.pk, [])
+    )
+    notify_mentions(posts, skip_existing=skip_existing_mentions)
@@ -0,0 +1,30 @@
+import time
+from django.core.management.base import BaseCommand
+from posts import engagement
+
+
+class Command(BaseCommand):
+    help = 'Apply logged likes/retweets (ENGAGEMENT_LOG) to the posts, counters and notifications'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--loop', action='store_true', help='Keep running, polling the log every --interval seconds')
+        parser.add_argument('--interval', type=float, default=1.0)
+
+    def handle(self, *args, **options):
+        if options['loop'] and not engagement.log_enabled():
+            # Nothing appends to the log; a single run still drains events left from before it was turned off
+            self.stdout.write('ENGAGEMENT_LOG is off; not starting the aggregator')
+            return
+        while True:
+            applied = 0
+            # Drain the log; a full batch means more may be waiting
+            while count := engagement.aggregate(options['batch_size']):
+                applied += count
+                if count < options['batch_size']:
+                    break
+            if applied or not options['loop']:
+                self.stdout.write(f'Applied {applied} event(s)')
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
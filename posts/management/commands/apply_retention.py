@@ -0,0 +1,20 @@
+from django.core.management.base import BaseCommand
+from posts import retention
+
+
+class Command(BaseCommand):
+    help = 'Delete old read notifications and archive old posts in throttled batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None)
+        parser.add_argument('--pause', type=float, default=None, help='Seconds to sleep between batches')
+        parser.add_argument('--dry-run', action='store_true', help='Only count what each policy would touch')
+
+    def handle(self, *args, **options):
+        result = retention.run(
+            dry_run=options['dry_run'], batch_size=options['batch_size'], pause=options['pause'],
+        )
+        action = 'Would remove' if options['dry_run'] else 'Removed'
+        self.stdout.write(f"{action} {result['notifications']} read notification(s)")
+        action = 'Would archive' if options['dry_run'] else 'Archived'
+        self.stdout.write(self.style.SUCCESS(f"{action} {result['posts']} post(s)"))
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from posts import ingest
+from posts.models import Hashtag, Post
+
+
+class Command(BaseCommand):
+    help = 'Reprocess existing posts: link normalized hashtags and optionally notify mentions'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument(
+            '--mentions', action='store_true',
+            help='Also create missing mention notifications',
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        processed = 0
+        last_pk = 0
+        while True:
+            posts = list(Post.objects.filter(pk__gt=last_pk).order_by('pk').only(
+                'id', 'author_id', 'content', 'created_at'
+            )[:chunk_size])
+            if not posts:
+                break
+            last_pk = posts[-1].pk
+
+            with transaction.atomic():
+                ingest.link_hashtags(posts)
+                if options['mentions']:
+                    ingest.notify_mentions(posts, skip_existing=True)
+            processed += len(posts)
+            self.stdout.write(f'Processed {processed} posts...')
+
+        # Every post is now linked to its case-folded tags, so tags stored
+        # before normalization only duplicate them
+        legacy = [
+            pk for pk, name in Hashtag.objects.values_list('pk', 'name').iterator()
+            if ingest.normalize_hashtag(name) != name
+        ]
+        Hashtag.objects.filter(pk__in=legacy).delete()
+
+        self.stdout.write(self.style.SUCCESS(
+            f'Processed {processed} posts, merged {len(legacy)} unnormalized hashtags'
+        ))
@@ -0,0 +1,34 @@
+import json
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from posts import benchmark
+
+User = get_user_model()
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Compare like throughput of direct writes and the engagement log plus aggregator, as JSON (rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--operations', type=int, default=500, help='Timed likes per mode')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Aggregator batch size')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--prefix', default='', help='Only act as users whose username starts with this')
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(is_active=True, username__startswith=options['prefix'])
+        report = {'commit': benchmark.current_commit()}
+        try:
+            with transaction.atomic():
+                report['results'] = benchmark.engagement_throughput(
+                    options['operations'], batch_size=options['batch_size'], seed=options['seed'], users=users,
+                )
+                raise Rollback
+        except Rollback:
+            pass
+        self.stdout.write(json.dumps(report, indent=2))
@@ -0,0 +1,65 @@
+import time
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from posts import ingest, trending
+from posts.models import Post
+
+User = get_user_model()
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Show that trending updates and lookups cost the same as the post table grows (rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 50000])
+        parser.add_argument('--hashtags', type=int, default=200)
+        parser.add_argument('--samples', type=int, default=20)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'posts':>10} {'record ms':>10} {'record q':>9} {'compute ms':>11} {'compute q':>10}")
+        try:
+            with transaction.atomic():
+                author = User.objects.create_user(username='trending-benchmark')
+                created = 0
+                for size in sorted(options['sizes']):
+                    self._grow(author, size - created, options['hashtags'])
+                    created = size
+                    self._measure(author, size, options['samples'])
+                raise Rollback
+        except Rollback:
+            pass
+
+    def _grow(self, author, count, hashtags):
+        # Old posts are outside the window, exactly like a mature post table
+        old = timezone.now() - trending.window() * 2
+        batch = 5000
+        for start in range(0, count, batch):
+            posts = Post.objects.bulk_create([
+                Post(author=author, content=f'#tag{(start + i) % hashtags} filler')
+                for i in range(min(batch, count - start))
+            ])
+            Post.objects.filter(pk__in=[post.pk for post in posts]).update(created_at=old)
+
+    def _measure(self, author, size, samples):
+        record_ms, record_queries = self._time(samples, lambda i: ingest.process_posts(
+            [Post.objects.create(author=author, content=f'#tag{i % 10} #live')]
+        ))
+        compute_ms, compute_queries = self._time(samples, lambda i: trending.compute())
+        self.stdout.write(
+            f'{size:>10} {record_ms:>10.2f} {record_queries:>9.1f} {compute_ms:>11.2f} {compute_queries:>10.1f}'
+        )
+
+    def _time(self, samples, func):
+        with CaptureQueriesContext(connection) as queries:
+            started = time.perf_counter()
+            for i in range(samples):
+                func(i)
+            elapsed = time.perf_counter() - started
+        return elapsed * 1000 / samples, len(queries) / samples
@@ -0,0 +1,53 @@
+import json
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from posts import benchmark
+from posts.models import Post
+
+User = get_user_model()
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = 'Time the hot views through the test client and report p50/p99 latency and queries as JSON (rolled back)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenarios', nargs='+', choices=benchmark.SCENARIOS, default=list(benchmark.SCENARIOS))
+        parser.add_argument('--requests', type=int, default=100, help='Timed requests per scenario')
+        parser.add_argument('--warmup', type=int, default=10)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--prefix', default='', help='Only act as users whose username starts with this')
+        parser.add_argument('--output', help='Also write the report to this file')
+        parser.add_argument('--baseline', help='Earlier report to compare against')
+
+    def handle(self, *args, **options):
+        users = User.objects.filter(is_active=True, username__startswith=options['prefix'])
+        report = {
+            'commit': benchmark.current_commit(),
+            'dataset': {'users': User.objects.count(), 'posts': Post.objects.count()},
+        }
+        # Likes and new posts would change the dataset for the next run
+        try:
+            with transaction.atomic():
+                report['results'] = benchmark.run(
+                    options['scenarios'], requests=options['requests'], warmup=options['warmup'],
+                    seed=options['seed'], users=users,
+                )
+                raise Rollback
+        except Rollback:
+            pass
+
+        if options['baseline']:
+            with open(options['baseline']) as f:
+                report['change'] = benchmark.compare(report['results'], json.load(f)['results'])
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                f.write(output + '\n')
+        self.stdout.write(output)
+
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+from xclone import assets
+
+
+class Command(BaseCommand):
+    help = 'Bundle and minify the site CSS/JS into static/dist/ (run before collectstatic)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fetch', action='store_true', help='Download missing pinned vendor files first')
+        parser.add_argument('--refetch', action='store_true', help='Download every vendor file again')
+
+    def handle(self, *args, **options):
+        if options['fetch'] or options['refetch']:
+            for path in assets.fetch(force=options['refetch']):
+                self.stdout.write(f'Fetched {path}')
+        try:
+            sizes = assets.build()
+        except assets.AssetError as e:
+            raise CommandError(str(e))
+        for bundle, size in sizes.items():
+            self.stdout.write(f'Wrote {bundle} ({size / 1024:.1f} KiB)')
+        self.stdout.write(self.style.SUCCESS('Done'))
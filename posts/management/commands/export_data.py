@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = 'Stream users, hashtags, posts, likes/retweets and follows to an NDJSON dump'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Output file; '-' for stdout, '.gz' to compress")
+        parser.add_argument('--gzip', action='store_true', default=None, help='Compress whatever the file name')
+        parser.add_argument('--chunk-size', type=int, default=2000)
+
+    def handle(self, *args, **options):
+        # Progress goes to stderr so the dump itself can be piped
+        def progress(section, rows):
+            self.stderr.write(f'Exported {rows} {section} row(s)...')
+
+        with transfer.open_dump(options['path'], 'w', compress=options['gzip']) as out:
+            totals = transfer.export(out, chunk_size=options['chunk_size'], progress=progress)
+        summary = ', '.join(f'{rows} {section}' for section, rows in totals.items())
+        self.stderr.write(self.style.SUCCESS(f'Exported {summary}'))
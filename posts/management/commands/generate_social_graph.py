@@ -0,0 +1,37 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from posts import synthetic
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Fill the database with a synthetic power-law social graph for load testing'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--follows', type=int, default=50, help='Average accounts followed per user')
+        parser.add_argument('--posts', type=int, default=10000)
+        parser.add_argument('--likes', type=int, default=50000)
+        parser.add_argument('--hashtags', type=int, default=200)
+        parser.add_argument('--days', type=int, default=30, help='Spread posts over this many days')
+        parser.add_argument('--skew', type=float, default=1.1, help='Zipf exponent for popularity')
+        parser.add_argument('--prefix', default='synth', help='Username prefix for the generated accounts')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        if User.objects.filter(username__startswith=options['prefix']).exists():
+            raise CommandError(f"Users named {options['prefix']}* already exist; pick another --prefix")
+
+        with transaction.atomic():
+            synthetic.generate(
+                users=options['users'], follows=options['follows'], posts=options['posts'],
+                likes=options['likes'], hashtags=options['hashtags'], days=options['days'],
+                prefix=options['prefix'], seed=options['seed'], skew=options['skew'],
+                batch_size=options['batch_size'], log=self.stdout.write,
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"Done; log in as any {options['prefix']}N user with password '{synthetic.PASSWORD}'"
+        ))
@@ -0,0 +1,37 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from posts import transfer
+
+
+class Command(BaseCommand):
+    help = 'Load an export_data dump with batched bulk inserts, then rebuild search and timelines'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="Dump file; '-' for stdin, '.gz' is decompressed")
+        parser.add_argument('--gzip', action='store_true', default=None, help='Decompress whatever the file name')
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--keep-indexes', action='store_true',
+                            help='Maintain secondary indexes row by row instead of building them at the end')
+        parser.add_argument('--skip-derived', action='store_true',
+                            help="Don't rebuild the search index and home timelines afterwards")
+
+    def handle(self, *args, **options):
+        def progress(section, rows):
+            self.stdout.write(f'Imported {rows} {section} row(s)...')
+
+        with transfer.open_dump(options['path'], 'r', compress=options['gzip']) as lines:
+            try:
+                if options['keep_indexes']:
+                    totals = transfer.load(lines, batch_size=options['batch_size'], progress=progress)
+                else:
+                    with transfer.deferred_indexes():
+                        totals = transfer.load(lines, batch_size=options['batch_size'], progress=progress)
+            except transfer.TransferError as e:
+                raise CommandError(str(e))
+
+        if not options['skip_derived']:
+            call_command('rebuild_search_index', batch_size=options['batch_size'], stdout=self.stdout)
+            call_command('rebuild_timelines', stdout=self.stdout)
+
+        summary = ', '.join(f'{rows} {section}' for section, rows in totals.items())
+        self.stdout.write(self.style.SUCCESS(f'Imported {summary}'))
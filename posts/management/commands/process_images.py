@@ -0,0 +1,33 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from posts.models import Post
+from xclone import images
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Generate missing image renditions for posts and users in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=200)
+        parser.add_argument('--force', action='store_true', help='Re-render images that already have renditions')
+
+    def handle(self, *args, **options):
+        for model in (Post, User):
+            for field in model.rendition_fields:
+                queryset = model.objects.exclude(**{field: ''}).exclude(**{f'{field}__isnull': True})
+                queryset = queryset.exclude(**{f'{field}__in': model.rendition_skip})
+                if not options['force']:
+                    queryset = queryset.filter(**{f'{field}_renditions': {}})
+
+                processed = 0
+                for pk in queryset.order_by('pk').values_list('pk', flat=True).iterator(chunk_size=options['batch_size']):
+                    # Runs inline; the task only writes its result if the file is unchanged
+                    images.process(model._meta.label, pk, field)
+                    processed += 1
+                    if processed % options['batch_size'] == 0:
+                        self.stdout.write(f'Processed {processed} {model._meta.verbose_name} {field} images...')
+                self.stdout.write(f'Processed {processed} {model._meta.verbose_name} {field} images')
+
+        self.stdout.write(self.style.SUCCESS('Image renditions up to date'))
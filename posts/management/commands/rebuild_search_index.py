@@ -0,0 +1,38 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from posts import search
+from posts.models import Post
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the full-text search index for posts and users in batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+
+    def handle(self, *args, **options):
+        backend = search.get_backend()
+        batch_size = options['batch_size']
+        self.stdout.write(f'Using {backend.__class__.__name__}')
+
+        backend.prune()
+        for label, queryset, index in (
+            ('posts', Post.objects.only('id', 'content'), backend.index_posts),
+            ('users', User.objects.only('id', *search.USER_SEARCH_FIELDS), backend.index_users),
+        ):
+            indexed = 0
+            batch = []
+            for obj in queryset.order_by('pk').iterator(chunk_size=batch_size):
+                batch.append(obj)
+                if len(batch) >= batch_size:
+                    index(batch)
+                    indexed += len(batch)
+                    batch = []
+                    self.stdout.write(f'Indexed {indexed} {label}...')
+            index(batch)
+            indexed += len(batch)
+            self.stdout.write(f'Indexed {indexed} {label}')
+
+        self.stdout.write(self.style.SUCCESS('Search index rebuilt'))
@@ -0,0 +1,27 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from posts import timeline
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = 'Rebuild materialized home timelines from the follow graph'
+
+    def add_arguments(self, parser):
+        parser.add_argument('usernames', nargs='*', help='Only rebuild these users (default: everyone)')
+        parser.add_argument('--chunk-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by('pk')
+        if options['usernames']:
+            users = users.filter(username__in=options['usernames'])
+
+        rebuilt = 0
+        for user in users.iterator(chunk_size=options['chunk_size']):
+            timeline.rebuild_timeline(user)
+            rebuilt += 1
+            if rebuilt % options['chunk_size'] == 0:
+                self.stdout.write(f'Rebuilt {rebuilt} timelines...')
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {rebuilt} timelines'))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from posts import counters
+
+
+class Command(BaseCommand):
+    help = 'Recompute denormalized like/retweet/reply and follower/following counters'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help='Report drift without fixing it')
+
+    def handle(self, *args, **options):
+        kwargs = {'batch_size': options['batch_size'], 'dry_run': options['dry_run']}
+        action = 'Found' if options['dry_run'] else 'Repaired'
+
+        posts = counters.repair_post_counters(**kwargs)
+        self.stdout.write(f'{action} {posts} post(s) with drifted counters')
+
+        users = counters.repair_user_counters(**kwargs)
+        self.stdout.write(f'{action} {users} user(s) with drifted counters')
+
+        self.stdout.write(self.style.SUCCESS('Done'))
@@ -0,0 +1,64 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:05
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import OuterRef, Subquery
+
+
+def copy_post_timestamps(apps, schema_editor):
+    HashtagPost = apps.get_model('posts', 'HashtagPost')
+    Post = apps.get_model('posts', 'Post')
+    HashtagPost.objects.update(
+        created_at=Subquery(Post.objects.filter(pk=OuterRef('post_id')).values('created_at')[:1])
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0003_post_counters'),
+    ]
+
+    operations = [
+        # Adopt the existing auto-created through table as an explicit model
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='HashtagPost',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('hashtag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='post_links', to='posts.hashtag')),
+                        ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='hashtag_links', to='posts.post')),
+                    ],
+                    options={
+                        'db_table': 'posts_hashtag_posts',
+                        'unique_together': {('hashtag', 'post')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='hashtag',
+                    name='posts',
+                    field=models.ManyToManyField(blank=True, related_name='hashtags', through='posts.HashtagPost', to='posts.post'),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='hashtagpost',
+            name='created_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(copy_post_timestamps, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='hashtagpost',
+            index=models.Index(fields=['hashtag', '-created_at', '-post'], name='hashtag_post_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-created_at', '-id'], name='post_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', '-created_at', '-id'], name='post_author_recent_idx'),
+        ),
+    ]
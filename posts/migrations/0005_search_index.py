@@ -0,0 +1,57 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:40
+
+from django.db import migrations
+
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE posts_post_search USING fts5(body, tokenize='unicode61 remove_diacritics 2')",
+    "CREATE VIRTUAL TABLE accounts_user_search USING fts5(body, tokenize='unicode61 remove_diacritics 2')",
+    "INSERT INTO posts_post_search (rowid, body) SELECT id, content FROM posts_post",
+    "INSERT INTO accounts_user_search (rowid, body) "
+    "SELECT id, username || ' ' || first_name || ' ' || last_name FROM accounts_user",
+]
+
+POSTGRES_FORWARD = [
+    "CREATE TABLE posts_post_search ("
+    "id bigint PRIMARY KEY REFERENCES posts_post (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+    "document tsvector NOT NULL)",
+    "CREATE INDEX posts_post_search_document_idx ON posts_post_search USING GIN (document)",
+    "CREATE TABLE accounts_user_search ("
+    "id bigint PRIMARY KEY REFERENCES accounts_user (id) ON DELETE CASCADE DEFERRABLE INITIALLY DEFERRED, "
+    "document tsvector NOT NULL)",
+    "CREATE INDEX accounts_user_search_document_idx ON accounts_user_search USING GIN (document)",
+    "INSERT INTO posts_post_search (id, document) SELECT id, to_tsvector('english', content) FROM posts_post",
+    "INSERT INTO accounts_user_search (id, document) "
+    "SELECT id, to_tsvector('english', concat_ws(' ', username, first_name, last_name)) FROM accounts_user",
+]
+
+BACKWARD = [
+    "DROP TABLE IF EXISTS posts_post_search",
+    "DROP TABLE IF EXISTS accounts_user_search",
+]
+
+
+def create_search_tables(apps, schema_editor):
+    statements = {
+        'sqlite': SQLITE_FORWARD,
+        'postgresql': POSTGRES_FORWARD,
+    }.get(schema_editor.connection.vendor, [])
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def drop_search_tables(apps, schema_editor):
+    if schema_editor.connection.vendor in ('sqlite', 'postgresql'):
+        for statement in BACKWARD:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('accounts', '0002_user_counters'),
+        ('posts', '0004_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_tables, drop_search_tables),
+    ]
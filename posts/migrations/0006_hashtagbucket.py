@@ -0,0 +1,27 @@
+# Generated by Django 5.2.5 on 2026-10-18 08:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0005_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HashtagBucket',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bucket_start', models.DateTimeField()),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('hashtag', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='buckets', to='posts.hashtag')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['bucket_start'], name='hashtag_bucket_start_idx')],
+                'constraints': [models.UniqueConstraint(fields=('hashtag', 'bucket_start'), name='unique_hashtag_bucket')],
+            },
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:41
+
+import django.db.models.deletion
+import xclone.images
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0009_engagementevent'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedPost',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('content', models.TextField(max_length=280)),
+                ('image', models.ImageField(blank=True, null=True, upload_to='post_images/')),
+                ('image_renditions', models.JSONField(blank=True, default=dict, editable=False)),
+                ('likes_count', models.PositiveIntegerField(default=0)),
+                ('retweets_count', models.PositiveIntegerField(default=0)),
+                ('replies_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField()),
+                ('updated_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('author', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_posts', to=settings.AUTH_USER_MODEL)),
+                ('reply_to', models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='posts.archivedpost')),
+            ],
+            options={
+                'abstract': False,
+            },
+            bases=(xclone.images.ImageRenditionsMixin, models.Model),
+        ),
+    ]
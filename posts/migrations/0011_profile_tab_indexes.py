@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-18 09:45
+
+from django.conf import settings
+from django.db import migrations, models
+
+# The auto-created like/retweet tables only index (post, user) and user alone;
+# the profile tabs page one user's rows newest first
+LINK_INDEXES = [
+    ('posts_post_likes', 'post_likes_user_recent_idx'),
+    ('posts_post_retweets', 'post_retweets_user_recent_idx'),
+]
+FORWARD = [f'CREATE INDEX {name} ON {table} (user_id, id)' for table, name in LINK_INDEXES]
+BACKWARD = [f'DROP INDEX IF EXISTS {name}' for table, name in LINK_INDEXES]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_archivedpost'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(('reply_to__isnull', True)), fields=['author', '-created_at', '-id'], name='post_author_toplevel_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(condition=models.Q(('reply_to__isnull', False)), fields=['author', '-created_at', '-id'], name='post_author_replies_idx'),
+        ),
+        migrations.RunSQL(FORWARD, BACKWARD),
+    ]
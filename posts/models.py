@@ -1,22 +1,30 @@
 from django.db import models
 from django.contrib.auth import get_user_model
 from django.urls import reverse
+from django.utils import timezone
+from xclone import images
 import re
 
 User = get_user_model()
 
-class Post(models.Model):
-    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='posts')
+class AbstractPost(images.ImageRenditionsMixin, models.Model):
+    """Columns shared by live posts and archived ones, so both render with the same templates"""
     content = models.TextField(max_length=280)
     image = models.ImageField(upload_to='post_images/', blank=True, null=True)
+    # Resized JPEG/WebP copies, written by the background image pipeline
+    image_renditions = models.JSONField(default=dict, blank=True, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
-    likes = models.ManyToManyField(User, related_name='liked_posts', blank=True)
-    retweets = models.ManyToManyField(User, related_name='retweeted_posts', blank=True)
-    reply_to = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='replies')
+    # Denormalized engagement counters, kept current with F() updates in the views
+    likes_count = models.PositiveIntegerField(default=0)
+    retweets_count = models.PositiveIntegerField(default=0)
+    replies_count = models.PositiveIntegerField(default=0)
+
+    rendition_fields = ('image',)
+    is_archived = False
 
     class Meta:
-        ordering = ['-created_at']
+        abstract = True
 
     def __str__(self):
         return f"{self.author.username}: {self.content[:50]}..."
@@ -24,18 +32,6 @@ class Post(models.Model):
     def get_absolute_url(self):
         return reverse('post_detail', kwargs={'pk': self.pk})
 
-    @property
-    def likes_count(self):
-        return self.likes.count()
-
-    @property
-    def retweets_count(self):
-        return self.retweets.count()
-
-    @property
-    def replies_count(self):
-        return self.replies.count()
-
     def get_hashtags(self):
         """Extract hashtags from post content"""
         hashtag_pattern = r'#\w+'
@@ -47,9 +43,50 @@ class Post(models.Model):
         return re.findall(mention_pattern, self.content)
 
 
+class Post(AbstractPost):
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='posts')
+    likes = models.ManyToManyField(User, related_name='liked_posts', blank=True)
+    retweets = models.ManyToManyField(User, related_name='retweeted_posts', blank=True)
+    reply_to = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='replies')
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['-created_at', '-id'], name='post_recent_idx'),
+            models.Index(fields=['author', '-created_at', '-id'], name='post_author_recent_idx'),
+            # Profile "Posts" and "Replies" tabs
+            models.Index(fields=['author', '-created_at', '-id'], condition=models.Q(reply_to__isnull=True),
+                         name='post_author_toplevel_idx'),
+            models.Index(fields=['author', '-created_at', '-id'], condition=models.Q(reply_to__isnull=False),
+                         name='post_author_replies_idx'),
+            # A post's first replies, for the thread walk (see threads.py)
+            models.Index(fields=['reply_to', 'id'], name='post_reply_order_idx'),
+        ]
+
+
+class ArchivedPost(AbstractPost):
+    """
+    A post moved out of the hot table by ``retention.archive_posts``.
+
+    Same primary key and columns as the ``Post`` it was, counters included;
+    its likes, retweets and hashtag links are not kept.  ``post_detail``
+    falls back to this table, and no feed reads it.
+    """
+    author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_posts')
+    # The parent may be live or archived, so no constraint
+    reply_to = models.ForeignKey('self', on_delete=models.DO_NOTHING, db_constraint=False, null=True,
+                                 blank=True, related_name='+')
+    # Copied from the post rather than set on insert
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    is_archived = True
+
+
 class Hashtag(models.Model):
     name = models.CharField(max_length=100, unique=True)
-    posts = models.ManyToManyField(Post, related_name='hashtags', blank=True)
+    posts = models.ManyToManyField(Post, related_name='hashtags', blank=True, through='HashtagPost')
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
@@ -60,6 +97,38 @@ class Hashtag(models.Model):
         return self.posts.count()
 
 
+class HashtagPost(models.Model):
+    """Hashtag/post link carrying the post's timestamp so hashtag feeds page over one index"""
+    hashtag = models.ForeignKey(Hashtag, on_delete=models.CASCADE, related_name='post_links')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='hashtag_links')
+    created_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        db_table = 'posts_hashtag_posts'
+        unique_together = [('hashtag', 'post')]
+        indexes = [
+            models.Index(fields=['hashtag', '-created_at', '-post'], name='hashtag_post_recent_idx'),
+        ]
+
+
+class HashtagBucket(models.Model):
+    """Number of posts linked to a hashtag within one trending time bucket"""
+    hashtag = models.ForeignKey(Hashtag, on_delete=models.CASCADE, related_name='buckets')
+    bucket_start = models.DateTimeField()
+    count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['hashtag', 'bucket_start'], name='unique_hashtag_bucket'),
+        ]
+        indexes = [
+            models.Index(fields=['bucket_start'], name='hashtag_bucket_start_idx'),
+        ]
+
+    def __str__(self):
+        return f"#{self.hashtag.name} @ {self.bucket_start}: {self.count}"
+
+
 class Notification(models.Model):
     NOTIFICATION_TYPES = (
         ('like', 'Like'),
@@ -78,6 +147,60 @@ class Notification(models.Model):
 
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['recipient', 'is_read', '-created_at'], name='notification_inbox_idx'),
+            models.Index(fields=['recipient', 'post', 'notification_type'], name='notification_group_idx'),
+        ]
 
     def __str__(self):
         return f"{self.sender.username} {self.notification_type} - {self.recipient.username}"
+
+
+class TimelineEntry(models.Model):
+    """Materialized home timeline row, pushed to each follower when a post is created"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='timeline_entries')
+    post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='timeline_entries')
+    # Copied from the post so a page is a single range scan over the index below
+    created_at = models.DateTimeField()
+
+    class Meta:
+        ordering = ['-created_at', '-post_id']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'], name='unique_timeline_entry'),
+        ]
+        indexes = [
+            models.Index(fields=['user', '-created_at', '-post'], name='timeline_user_recent_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} <- {self.post_id}"
+
+
+class EngagementEvent(models.Model):
+    """
+    Append-only like/retweet log, applied in batches by ``manage.py aggregate_engagement``.
+
+    Events carry the desired end state rather than a toggle, so applying the
+    latest event per (user, post, relation) is idempotent.
+    """
+    LIKE = 1
+    RETWEET = 2
+    RELATIONS = (
+        (LIKE, 'likes'),
+        (RETWEET, 'retweets'),
+    )
+
+    # No foreign key constraints: appends must not lock or wait on the post and user rows
+    post = models.ForeignKey(Post, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    user = models.ForeignKey(User, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+')
+    relation = models.PositiveSmallIntegerField(choices=RELATIONS)
+    active = models.BooleanField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'post', 'relation'], name='engagement_event_state_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} {'+' if self.active else '-'}{self.get_relation_display()} {self.post_id}"
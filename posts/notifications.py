@@ -0,0 +1,201 @@
+"""
+Notification inbox.
+
+Individual ``Notification`` rows are grouped per ``(post, notification_type)``
+when read, so fifty likes on one post show up as a single "alice and 49
+others liked your post" entry.  A page of groups costs three queries: the
+grouped aggregate, the latest few senders of each group (a ``ROW_NUMBER()``
+window) and the posts.
+
+Each user's unread count is cached and adjusted in place whenever
+notifications are created or marked read, so the navbar badge never counts
+rows.  New notifications are also pushed to the recipient's live event
+stream.
+
+Likes and retweets go through ``notify_once``, which drops a notification
+if the same sender already sent the same one about the same post within
+``NOTIFICATION_COALESCE_SECONDS`` -- so like/unlike/like bursts reach the
+recipient once.
+
+Unread counts and coalescing keys live in the ``NOTIFICATION_CACHE`` alias,
+which must be shared by every process that creates or reads notifications
+(web workers and the engagement worker alike).
+"""
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models import Count, F, Max, Q
+from django.db.models.expressions import Window
+from django.db.models.functions import RowNumber
+from xclone import events
+from .models import Notification, Post
+
+UNREAD_TIMEOUT = 24 * 60 * 60
+SAMPLE_ACTORS = 3
+
+
+def _cache():
+    return caches[getattr(settings, 'NOTIFICATION_CACHE', 'default')]
+
+
+def unread_key(user_id):
+    return f'notifications:unread:{user_id}'
+
+
+def _adjust_unread(counts):
+    """Apply ``{user_id: delta}`` to cached unread counts that are present"""
+    for user_id, delta in counts.items():
+        try:
+            _cache().incr(unread_key(user_id), delta)
+        except ValueError:
+            # Not cached; the next read counts from the database
+            pass
+
+
+def forget_unread(user_ids):
+    """Drop cached unread counts so the next read recounts, e.g. after notifications were deleted in bulk"""
+    _cache().delete_many([unread_key(user_id) for user_id in user_ids])
+
+
+def unread_count(user):
+    cache = _cache()
+    count = cache.get(unread_key(user.pk))
+    if count is None:
+        count = Notification.objects.filter(recipient=user, is_read=False).count()
+        cache.set(unread_key(user.pk), count, UNREAD_TIMEOUT)
+    return max(count, 0)
+
+
+def notify(recipient, sender, notification_type, post=None):
+    """Create a single notification and bump the recipient's unread count"""
+    notification = Notification.objects.create(
+        recipient=recipient, sender=sender, notification_type=notification_type, post=post
+    )
+    _adjust_unread({recipient.pk: 1})
+    _announce([notification])
+    return notification
+
+
+def coalesce_key(recipient_id, sender_id, notification_type, post_id):
+    return f'notifications:recent:{recipient_id}:{sender_id}:{notification_type}:{post_id}'
+
+
+def _first_in_window(recipient_id, sender_id, notification_type, post_id):
+    window = getattr(settings, 'NOTIFICATION_COALESCE_SECONDS', 10 * 60)
+    key = coalesce_key(recipient_id, sender_id, notification_type, post_id)
+    # cache.add is atomic, so only the first of several concurrent requests wins
+    return not window or _cache().add(key, True, window)
+
+
+def notify_once(recipient, sender, notification_type, post=None):
+    """``notify`` unless the same notification was sent within the coalescing window; return it or ``None``"""
+    if not _first_in_window(recipient.pk, sender.pk, notification_type, post.pk if post else None):
+        return None
+    return notify(recipient, sender, notification_type, post=post)
+
+
+def bulk_notify(notifications):
+    """``bulk_create`` unsaved notifications and bump each recipient's unread count"""
+    notifications = Notification.objects.bulk_create(notifications)
+    counts = {}
+    for notification in notifications:
+        counts[notification.recipient_id] = counts.get(notification.recipient_id, 0) + 1
+    _adjust_unread(counts)
+    _announce(notifications)
+    return notifications
+
+
+def bulk_notify_once(notifications):
+    """``bulk_notify`` the unsaved notifications not already sent within the coalescing window"""
+    return bulk_notify([
+        n for n in notifications
+        if _first_in_window(n.recipient_id, n.sender_id, n.notification_type, n.post_id)
+    ])
+
+
+def _announce(notifications):
+    for notification in notifications:
+        events.publish([events.user_channel(notification.recipient_id)], 'notification', {
+            'type': notification.notification_type,
+            'post_id': notification.post_id,
+            'sender_id': notification.sender_id,
+        })
+
+
+def mark_read(user, ids=None):
+    """Mark all (or the given) unread notifications read in a single UPDATE"""
+    unread = Notification.objects.filter(recipient=user, is_read=False)
+    if ids is not None:
+        unread = unread.filter(pk__in=ids)
+    updated = unread.update(is_read=True)
+    if ids is None:
+        _cache().set(unread_key(user.pk), 0, UNREAD_TIMEOUT)
+    elif updated:
+        _adjust_unread({user.pk: -updated})
+    return updated
+
+
+def grouped(user, before=None, limit=20):
+    """
+    Return up to ``limit`` notification groups for ``user``, newest first,
+    and the cursor for the next page (or ``None``).  ``before`` is the cursor
+    returned for the previous page.
+    """
+    groups = (
+        Notification.objects.filter(recipient=user)
+        .values('post_id', 'notification_type')
+        .annotate(
+            latest_id=Max('id'),
+            latest_at=Max('created_at'),
+            total=Count('id'),
+            actor_count=Count('sender', distinct=True),
+            unread=Count('id', filter=Q(is_read=False)),
+        )
+        .order_by('-latest_id')
+    )
+    if before is not None:
+        groups = groups.filter(latest_id__lt=before)
+    groups = list(groups[:limit + 1])
+    next_cursor = groups[limit - 1]['latest_id'] if len(groups) > limit else None
+    groups = groups[:limit]
+    if not groups:
+        return [], None
+
+    post_ids = {group['post_id'] for group in groups if group['post_id']}
+    types = {group['notification_type'] for group in groups}
+    matches = Q(post_id__in=post_ids) if post_ids else Q(pk__in=[])
+    if any(group['post_id'] is None for group in groups):
+        matches |= Q(post__isnull=True)
+    recent = (
+        Notification.objects.filter(matches, recipient=user, notification_type__in=types)
+        .annotate(rank=Window(
+            RowNumber(), partition_by=[F('post_id'), F('notification_type')], order_by=F('id').desc(),
+        ))
+        .filter(rank__lte=SAMPLE_ACTORS)
+        .select_related('sender')
+        .order_by('-id')
+    )
+    actors = {}
+    for notification in recent:
+        sample = actors.setdefault((notification.post_id, notification.notification_type), [])
+        if notification.sender not in sample:
+            sample.append(notification.sender)
+    posts = Post.objects.only('id', 'content').in_bulk(post_ids)
+
+    for group in groups:
+        group['actors'] = actors.get((group['post_id'], group['notification_type']), [])
+        group['post'] = posts.get(group['post_id'])
+    return groups, next_cursor
+
+
+def serialize(group):
+    post = group['post']
+    return {
+        'type': group['notification_type'],
+        'post_id': group['post_id'],
+        'post_excerpt': post.content[:80] if post else None,
+        'actors': [actor.username for actor in group['actors']],
+        'actor_count': group['actor_count'],
+        'count': group['total'],
+        'unread': group['unread'] > 0,
+        'latest_at': group['latest_at'].isoformat(),
+    }
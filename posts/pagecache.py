@@ -0,0 +1,107 @@
+"""
+Full-page caching and conditional GET for logged-out visitors.
+
+Views decorated with ``cache_anonymous`` store the rendered page for
+anonymous GET requests in the ``PAGE_CACHE`` cache for
+``PAGE_CACHE_SECONDS``, keyed by the full path and the feed *generation*:
+the timestamp of the newest post change.  Creating, editing or deleting a
+post moves the generation forward (see ``posts.signals``), so every cached
+page is dropped at once; like/retweet counters are allowed to lag by at
+most the TTL.
+
+Cached pages carry an ``ETag`` (a hash of the page, so it covers the
+counters) and a ``Last-Modified`` of the generation.  A request whose
+``If-None-Match`` matches the cached page gets a ``304`` without the view
+running, and ``Cache-Control: public, max-age`` lets a fronting proxy serve
+logged-out traffic on its own.
+"""
+import hashlib
+import time
+from functools import wraps
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.core.cache import caches
+from django.db.models import Max
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from .models import Post
+
+GENERATION_KEY = 'pagecache:generation'
+
+
+def _cache():
+    return caches[getattr(settings, 'PAGE_CACHE', 'default')]
+
+
+def timeout():
+    return getattr(settings, 'PAGE_CACHE_SECONDS', 30)
+
+
+def generation():
+    """Timestamp of the newest post change, loaded from the posts when not cached"""
+    cache = _cache()
+    value = cache.get(GENERATION_KEY)
+    if value is None:
+        newest = Post.objects.aggregate(newest=Max('created_at'))['newest']
+        cache.add(GENERATION_KEY, newest.timestamp() if newest else 0.0, None)
+        value = cache.get(GENERATION_KEY)
+    return value
+
+
+def invalidate():
+    """Start a new generation, dropping every cached page"""
+    _cache().set(GENERATION_KEY, time.time(), None)
+
+
+def page_key(request, generation):
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f'pagecache:{generation}:{path}'
+
+
+def _cacheable(request):
+    # Pending messages (e.g. "logged out") must be rendered for this visitor only
+    return (
+        request.method in ('GET', 'HEAD')
+        and not request.user.is_authenticated
+        and not len(get_messages(request))
+    )
+
+
+def _respond(request, entry):
+    response = HttpResponse(entry['content'], content_type=entry['content_type'])
+    response['ETag'] = entry['etag']
+    response['Last-Modified'] = http_date(entry['last_modified'])
+    patch_cache_control(response, public=True, max_age=timeout())
+    patch_vary_headers(response, ['Cookie'])
+    return response
+
+
+def cache_anonymous(view_func):
+    """Serve anonymous GETs of ``view_func`` from the page cache, honouring ``If-None-Match``"""
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if not _cacheable(request):
+            return view_func(request, *args, **kwargs)
+
+        current = generation()
+        cache = _cache()
+        key = page_key(request, current)
+        entry = cache.get(key)
+        if entry is None:
+            response = view_func(request, *args, **kwargs)
+            # Only plain successful pages that don't set cookies are shared
+            if response.status_code != 200 or response.streaming or response.cookies:
+                return response
+            entry = {
+                'content': response.content,
+                'content_type': response['Content-Type'],
+                'etag': quote_etag(hashlib.md5(response.content).hexdigest()),
+                'last_modified': int(current),
+            }
+            cache.set(key, entry, timeout())
+
+        return get_conditional_response(
+            request, etag=entry['etag'], last_modified=entry['last_modified'], response=_respond(request, entry)
+        )
+    return wrapper
@@ -0,0 +1,119 @@
+"""
+Keyset (cursor) pagination for feeds.
+
+Pages are addressed by an opaque ``?cursor=`` token that encodes the
+``(created_at, id)`` of the row at the page boundary, so every page is an
+index seek plus ``LIMIT per_page + 1`` -- no ``COUNT(*)`` and no ``OFFSET``.
+Rows without a timestamp (e.g. like/retweet links) page on their id alone.
+"""
+import base64
+import binascii
+import json
+from datetime import datetime
+from django.db.models import Q
+
+
+def encode_cursor(created_at, pk, reverse=False):
+    created_at = created_at.isoformat() if created_at is not None else None
+    payload = json.dumps([created_at, pk, int(reverse)], separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return ``(created_at, pk, reverse)`` or None for a missing or malformed cursor"""
+    if not cursor:
+        return None
+    try:
+        payload = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        created_at, pk, reverse = json.loads(payload)
+        if created_at is not None:
+            created_at = datetime.fromisoformat(created_at)
+        return created_at, int(pk), bool(reverse)
+    except (binascii.Error, ValueError, TypeError):
+        return None
+
+
+class CursorPage:
+    """
+    One page of rows plus the cursors of its neighbours.  The cursors are
+    computed up front, so ``object_list`` may be replaced (e.g. timeline
+    entries mapped to their posts) without affecting navigation.
+    """
+
+    def __init__(self, object_list, next_cursor=None, previous_cursor=None):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """
+    Paginate ``queryset`` newest first on the two ``keys`` -- a timestamp and
+    a unique tie-breaker -- which must be attributes of the paginated objects
+    and should be covered by a composite index.  A single unique key, e.g.
+    ``keys=('pk',)``, pages on that alone.
+    """
+
+    def __init__(self, queryset, per_page, keys=('created_at', 'pk')):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.keys = keys
+
+    def cursor_for(self, obj, reverse=False):
+        *created_at, pk = (getattr(obj, key) for key in self.keys)
+        return encode_cursor(created_at[0] if created_at else None, pk, reverse)
+
+    def get_page(self, cursor=None):
+        *time_key, id_key = self.keys
+        position = decode_cursor(cursor)
+        if position is not None and (position[0] is None) != (not time_key):
+            # A cursor from a differently keyed feed
+            position = None
+        reverse = position is not None and position[2]
+
+        queryset = self.queryset
+        if position is not None:
+            created_at, pk, _ = position
+            op = 'gt' if reverse else 'lt'
+            if time_key:
+                queryset = queryset.filter(
+                    Q(**{f'{time_key[0]}__{op}': created_at}) | Q(**{time_key[0]: created_at, f'{id_key}__{op}': pk})
+                )
+            else:
+                queryset = queryset.filter(**{f'{id_key}__{op}': pk})
+        if reverse:
+            queryset = queryset.order_by(*self.keys)
+        else:
+            queryset = queryset.order_by(*(f'-{key}' for key in self.keys))
+
+        rows = list(queryset[:self.per_page + 1])
+        has_more = len(rows) > self.per_page
+        rows = rows[:self.per_page]
+        if reverse:
+            rows.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, position is not None
+
+        if not rows:
+            return CursorPage(rows)
+        return CursorPage(
+            rows,
+            next_cursor=self.cursor_for(rows[-1]) if has_next else None,
+            previous_cursor=self.cursor_for(rows[0], reverse=True) if has_previous else None,
+        )
@@ -0,0 +1,131 @@
+"""
+Retention: trimming the hot tables in small, throttled batches.
+
+Two policies, each switched off by setting its age to 0 (or ``None``):
+
+* ``NOTIFICATION_RETENTION_DAYS`` -- read notifications older than this are
+  deleted; unread ones are kept however old.
+* ``POST_ARCHIVE_DAYS`` -- posts older than this move to ``ArchivedPost``,
+  which no feed reads and no feed index covers; ``post_detail`` falls back
+  to it.  The archived row keeps the post's primary key and counters; its
+  likes, retweets, hashtag links, timeline entries and notifications are
+  deleted with the live row, and the cached unread counts of anyone who
+  loses an unread notification are dropped once that commits.
+
+``manage.py apply_retention`` (daily, from cron or the scheduler) walks
+each table in primary-key order, ``RETENTION_BATCH_SIZE`` rows at a time.
+Each batch is its own short transaction, and the job sleeps
+``RETENTION_PAUSE_SECONDS`` between batches, so no lock is held for long
+and replicas keep up.
+
+A post is only archived once no live post replies to it, so conversations
+move to the archive from the leaves up -- one level per run -- and a live
+reply never points into the archive.  A post with recent replies stays
+live with them.
+"""
+import time
+from datetime import timedelta
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.utils import timezone
+from .models import ArchivedPost, Notification, Post
+from .notifications import forget_unread
+
+ARCHIVED_FIELDS = [field.attname for field in ArchivedPost._meta.concrete_fields if field.name != 'archived_at']
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _cutoff(days, now=None):
+    return (now or timezone.now()) - timedelta(days=days)
+
+
+def stale_notifications(days, now=None):
+    return Notification.objects.filter(is_read=True, created_at__lt=_cutoff(days, now)).order_by()
+
+
+def archivable_posts(days, now=None):
+    """Old posts without live replies"""
+    replies = Post.objects.filter(reply_to=OuterRef('pk'))
+    return Post.objects.filter(created_at__lt=_cutoff(days, now)).filter(~Exists(replies)).order_by()
+
+
+def _in_batches(queryset, apply, batch_size=None, pause=None):
+    """Call ``apply(pks)`` on keyset batches of ``queryset``; return the sum of its results"""
+    batch_size = batch_size or _setting('RETENTION_BATCH_SIZE', 500)
+    pause = _setting('RETENTION_PAUSE_SECONDS', 0.5) if pause is None else pause
+    done = 0
+    last_pk = 0
+    while True:
+        pks = list(queryset.filter(pk__gt=last_pk).order_by('pk').values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            break
+        last_pk = pks[-1]
+        done += apply(pks)
+        if len(pks) < batch_size:
+            break
+        time.sleep(pause)
+    return done
+
+
+def purge_notifications(days=None, now=None, **batching):
+    """Delete read notifications older than ``days``; return how many"""
+    days = _setting('NOTIFICATION_RETENTION_DAYS', 90) if days is None else days
+    if not days:
+        return 0
+
+    def apply(pks):
+        deleted, _ = Notification.objects.filter(pk__in=pks).delete()
+        return deleted
+
+    return _in_batches(stale_notifications(days, now), apply, **batching)
+
+
+def archive_posts(days=None, now=None, **batching):
+    """Move posts older than ``days`` without live replies to the archive; return how many"""
+    days = _setting('POST_ARCHIVE_DAYS', 365) if days is None else days
+    if not days:
+        return 0
+    candidates = archivable_posts(days, now)
+
+    def apply(pks):
+        with transaction.atomic():
+            # Re-checked inside the transaction: a reply may have arrived since the
+            # scan.  FOR UPDATE makes a reply insert referencing these rows wait for us
+            rows = list(candidates.filter(pk__in=pks).select_for_update().values(*ARCHIVED_FIELDS))
+            ArchivedPost.objects.bulk_create([ArchivedPost(**row) for row in rows], ignore_conflicts=True)
+            # Checked again now that this transaction writes (SQLite has no row locks,
+            # but a writer holds the database): the delete below would cascade to a reply
+            ids = {row['id'] for row in rows}
+            replied = set(Post.objects.filter(reply_to_id__in=ids).values_list('reply_to_id', flat=True))
+            if replied:
+                ArchivedPost.objects.filter(pk__in=replied).delete()
+                ids -= replied
+            # The delete cascades to notifications, unread ones included
+            recipients = set(
+                Notification.objects.filter(post_id__in=ids, is_read=False).values_list('recipient_id', flat=True)
+            )
+            Post.objects.filter(pk__in=ids).delete()
+            if recipients:
+                transaction.on_commit(lambda: forget_unread(recipients))
+        return len(ids)
+
+    return _in_batches(candidates, apply, **batching)
+
+
+def run(now=None, dry_run=False, **batching):
+    """Apply every policy; return ``{policy: rows}`` (rows that would be affected with ``dry_run``)"""
+    if dry_run:
+        notification_days = _setting('NOTIFICATION_RETENTION_DAYS', 90)
+        post_days = _setting('POST_ARCHIVE_DAYS', 365)
+        return {
+            'notifications': stale_notifications(notification_days, now).count() if notification_days else 0,
+            'posts': archivable_posts(post_days, now).count() if post_days else 0,
+        }
+    return {
+        'notifications': purge_notifications(now=now, **batching),
+        'posts': archive_posts(now=now, **batching),
+    }
@@ -0,0 +1,229 @@
+"""
+Pluggable full-text search for posts and users.
+
+``SEARCH_BACKEND`` names the backend class.  Each backend owns its index
+tables (created by migration ``0005_search_index`` for its database vendor),
+is kept current from the ``post_save``/``post_delete`` signals in
+``posts.signals`` and can be rebuilt in batches with
+``manage.py rebuild_search_index``.
+
+* ``SQLiteSearchBackend`` -- FTS5 virtual tables ranked by ``bm25()``
+* ``PostgresSearchBackend`` -- ``tsvector`` tables with GIN indexes ranked by ``ts_rank()``
+* ``DatabaseSearchBackend`` -- unindexed ``icontains`` fallback for anything else
+"""
+import re
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.db.models import Q
+from django.utils.module_loading import import_string
+from .models import Post
+
+User = get_user_model()
+
+USER_SEARCH_FIELDS = ('username', 'first_name', 'last_name')
+
+
+def search_terms(query):
+    """Split a raw query into word tokens safe to embed in a MATCH/tsquery expression"""
+    return re.findall(r'\w+', query.lower())[:16]
+
+
+class SearchResults:
+    """
+    Lazily ranked result list that ``django.core.paginator.Paginator`` can
+    page through: ``count()`` and each slice are single index queries.
+    """
+
+    def __init__(self, backend, query):
+        self.backend = backend
+        self.query = query
+        self._count = None
+
+    def count(self):
+        if self._count is None:
+            self._count = self.backend.count_posts(self.query)
+        return self._count
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index:index + 1][0]
+        offset = index.start or 0
+        limit = (index.stop if index.stop is not None else self.count()) - offset
+        ids = self.backend.rank_posts(self.query, offset, limit)
+        posts = Post.objects.select_related('author').in_bulk(ids)
+        return [posts[pk] for pk in ids if pk in posts]
+
+
+class DatabaseSearchBackend:
+    def search(self, query):
+        """Return relevance-ranked posts for ``query`` as a paginatable sequence"""
+        return SearchResults(self, query)
+
+    def count_posts(self, query):
+        return self._post_filter(query).count()
+
+    def rank_posts(self, query, offset, limit):
+        return list(self._post_filter(query).values_list('pk', flat=True)[offset:offset + limit])
+
+    def search_users(self, query, limit=10):
+        terms = search_terms(query)
+        if not terms:
+            return User.objects.none()
+        match = Q()
+        for term in terms:
+            match &= Q(username__icontains=term) | Q(first_name__icontains=term) | Q(last_name__icontains=term)
+        return User.objects.filter(match)[:limit]
+
+    def index_posts(self, posts):
+        pass
+
+    def remove_posts(self, post_ids):
+        pass
+
+    def index_users(self, users):
+        pass
+
+    def remove_users(self, user_ids):
+        pass
+
+    def prune(self):
+        pass
+
+    def _post_filter(self, query):
+        terms = search_terms(query)
+        if not terms:
+            return Post.objects.none()
+        match = Q()
+        for term in terms:
+            match &= Q(content__icontains=term)
+        return Post.objects.filter(match)
+
+
+class IndexedSearchBackend(DatabaseSearchBackend):
+    """Shared SQL plumbing for backends that keep a side index table per model"""
+    post_table = 'posts_post_search'
+    user_table = 'accounts_user_search'
+
+    def count_posts(self, query):
+        match = self.match_expression(query)
+        if match is None:
+            return 0
+        with connection.cursor() as cursor:
+            cursor.execute(*self.count_query(self.post_table, match))
+            return cursor.fetchone()[0]
+
+    def rank_posts(self, query, offset, limit):
+        match = self.match_expression(query)
+        if match is None or limit <= 0:
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(*self.rank_query(self.post_table, match, limit, offset))
+            return [row[0] for row in cursor.fetchall()]
+
+    def search_users(self, query, limit=10):
+        match = self.match_expression(query)
+        if match is None:
+            return []
+        with connection.cursor() as cursor:
+            cursor.execute(*self.rank_query(self.user_table, match, limit, 0))
+            ids = [row[0] for row in cursor.fetchall()]
+        users = User.objects.in_bulk(ids)
+        return [users[pk] for pk in ids if pk in users]
+
+    def index_posts(self, posts):
+        self._replace(self.post_table, [(post.pk, post.content) for post in posts])
+
+    def remove_posts(self, post_ids):
+        self._delete(self.post_table, post_ids)
+
+    def index_users(self, users):
+        self._replace(self.user_table, [
+            (user.pk, ' '.join(getattr(user, field) for field in USER_SEARCH_FIELDS)) for user in users
+        ])
+
+    def remove_users(self, user_ids):
+        self._delete(self.user_table, user_ids)
+
+    def prune(self):
+        """Drop index rows whose post or user no longer exists"""
+        with connection.cursor() as cursor:
+            for table, source in ((self.post_table, Post), (self.user_table, User)):
+                cursor.execute(
+                    f'DELETE FROM {table} WHERE {self.id_column} NOT IN (SELECT id FROM {source._meta.db_table})'
+                )
+
+    def _replace(self, table, rows):
+        if not rows:
+            return
+        self._delete(table, [pk for pk, _ in rows])
+        with connection.cursor() as cursor:
+            cursor.executemany(self.insert_sql(table), rows)
+
+    def _delete(self, table, ids):
+        ids = list(ids)
+        if not ids:
+            return
+        placeholders = ', '.join(['%s'] * len(ids))
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {table} WHERE {self.id_column} IN ({placeholders})', ids)
+
+
+class SQLiteSearchBackend(IndexedSearchBackend):
+    id_column = 'rowid'
+
+    def match_expression(self, query):
+        terms = search_terms(query)
+        if not terms:
+            return None
+        # Prefix-match every term so results update as the user types
+        return ' '.join(f'"{term}"*' for term in terms)
+
+    def count_query(self, table, match):
+        return f'SELECT COUNT(*) FROM {table} WHERE {table} MATCH %s', [match]
+
+    def rank_query(self, table, match, limit, offset):
+        # bm25() is lower for better matches
+        sql = f'SELECT rowid FROM {table} WHERE {table} MATCH %s ORDER BY bm25({table}), rowid DESC LIMIT %s OFFSET %s'
+        return sql, [match, limit, offset]
+
+    def insert_sql(self, table):
+        return f'INSERT INTO {table} (rowid, body) VALUES (%s, %s)'
+
+
+class PostgresSearchBackend(IndexedSearchBackend):
+    id_column = 'id'
+    config = 'english'
+
+    def match_expression(self, query):
+        terms = search_terms(query)
+        if not terms:
+            return None
+        return ' & '.join(f'{term}:*' for term in terms)
+
+    def count_query(self, table, match):
+        return f"SELECT COUNT(*) FROM {table} WHERE document @@ to_tsquery('{self.config}', %s)", [match]
+
+    def rank_query(self, table, match, limit, offset):
+        sql = (
+            f"SELECT id FROM {table}, to_tsquery('{self.config}', %s) query WHERE document @@ query "
+            f"ORDER BY ts_rank(document, query) DESC, id DESC LIMIT %s OFFSET %s"
+        )
+        return sql, [match, limit, offset]
+
+    def insert_sql(self, table):
+        return f"INSERT INTO {table} (id, document) VALUES (%s, to_tsvector('{self.config}', %s))"
+
+
+def get_backend():
+    backend = getattr(settings, 'SEARCH_BACKEND', None)
+    if backend:
+        return import_string(backend)()
+    if connection.vendor == 'sqlite':
+        return SQLiteSearchBackend()
+    if connection.vendor == 'postgresql':
+        return PostgresSearchBackend()
+    return DatabaseSearchBackend()
@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from . import pagecache, search
+from .models import Post
+
+USER_SEARCH_FIELDS = set(search.USER_SEARCH_FIELDS)
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or 'content' in update_fields:
+        search.get_backend().index_posts([instance])
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    search.get_backend().remove_posts([instance.pk])
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_pages(sender, **kwargs):
+    # New, edited and deleted posts show up on cached anonymous pages
+    pagecache.invalidate()
+
+
+@receiver(post_save, sender=settings.AUTH_USER_MODEL)
+def index_user(sender, instance, update_fields=None, **kwargs):
+    # Logins save last_login only; skip reindexing for those
+    if update_fields is None or USER_SEARCH_FIELDS & set(update_fields):
+        search.get_backend().index_users([instance])
+
+
+@receiver(post_delete, sender=settings.AUTH_USER_MODEL)
+def unindex_user(sender, instance, **kwargs):
+    search.get_backend().remove_users([instance.pk])
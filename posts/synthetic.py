@@ -0,0 +1,154 @@
+"""
+Synthetic social graphs for load testing.
+
+``generate`` fills the database with a realistically skewed dataset using
+bulk inserts only:
+
+* follows, authorship, likes and hashtag use are all Zipf-distributed
+  (weight of the ``k``-th ranked item ``1 / k ** skew``), so a few accounts
+  have most of the followers, a few posts most of the likes and a few
+  hashtags most of the uses -- the shape that makes fan-out, counters and
+  trending expensive;
+* posts are spread over the last ``days`` days, oldest first;
+* the derived data the views rely on is built afterwards in bulk: hashtag
+  links and trending buckets (``ingest.process_posts``), the search index,
+  the denormalized counters (``counters``) and home timelines.
+
+The random generator is seeded, so the same arguments give the same graph.
+"""
+import itertools
+import random
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.utils import timezone
+from . import counters, ingest, search, timeline
+from .models import Post
+
+User = get_user_model()
+
+PASSWORD = 'benchmark'
+WORDS = (
+    'launch ship deploy coffee weekend python django latency cache index query graph '
+    'timeline music football election weather movie climate startup design review'
+).split()
+
+
+def zipf_weights(count, skew):
+    """Cumulative weights for ``random.choices`` favouring low indexes"""
+    return list(itertools.accumulate(1 / (rank ** skew) for rank in range(1, count + 1)))
+
+
+def _batches(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(itertools.islice(iterator, size)):
+        yield batch
+
+
+class Generator:
+    def __init__(self, prefix='synth', seed=0, skew=1.1, batch_size=1000, log=None):
+        self.prefix = prefix
+        self.random = random.Random(seed)
+        self.skew = skew
+        self.batch_size = batch_size
+        self.log = log or (lambda message: None)
+
+    def users(self, count):
+        # Hashing is deliberately slow; every synthetic account shares one hash
+        password = make_password(PASSWORD)
+        users = User.objects.bulk_create(
+            (User(username=f'{self.prefix}{i}', email=f'{self.prefix}{i}@example.com', password=password,
+                  first_name=self.random.choice(WORDS).title())
+             for i in range(count)),
+            batch_size=self.batch_size,
+        )
+        search.get_backend().index_users(users)
+        self.log(f'Created {len(users)} users')
+        return [user.pk for user in users]
+
+    def follows(self, user_ids, per_user):
+        """Each user follows about ``per_user`` accounts, picked by popularity rank"""
+        weights = zipf_weights(len(user_ids), self.skew)
+        Follow = User.followers.through
+
+        def edges():
+            for follower_id in user_ids:
+                # Out-degrees are skewed too: most users follow a few, some follow many
+                degree = min(len(user_ids) - 1, int(self.random.paretovariate(2) * per_user / 2))
+                for followee_id in set(self.random.choices(user_ids, cum_weights=weights, k=degree)):
+                    if followee_id != follower_id:
+                        # A row (from_user=A, to_user=B) means B follows A
+                        yield Follow(from_user_id=followee_id, to_user_id=follower_id)
+
+        created = 0
+        for batch in _batches(edges(), self.batch_size):
+            Follow.objects.bulk_create(batch, ignore_conflicts=True)
+            created += len(batch)
+        self.log(f'Created {created} follows')
+
+    def posts(self, user_ids, count, hashtags, days):
+        """Posts from authors picked by rank, each with up to two hashtags, oldest first"""
+        author_weights = zipf_weights(len(user_ids), self.skew)
+        tag_weights = zipf_weights(hashtags, self.skew) if hashtags else None
+        start = timezone.now() - timedelta(days=days)
+        step = timedelta(days=days) / max(count, 1)
+
+        post_ids = []
+        for offset in range(0, count, self.batch_size):
+            size = min(self.batch_size, count - offset)
+            authors = self.random.choices(user_ids, cum_weights=author_weights, k=size)
+            posts = Post.objects.bulk_create([Post(author_id=author_id, content=self._content(tag_weights))
+                                              for author_id in authors])
+            # created_at is auto_now_add, so backdate each batch afterwards
+            created_at = start + step * offset
+            Post.objects.filter(pk__in=[post.pk for post in posts]).update(created_at=created_at)
+            for post in posts:
+                post.created_at = created_at
+            ingest.process_posts(posts)
+            search.get_backend().index_posts(posts)
+            post_ids.extend(post.pk for post in posts)
+        self.log(f'Created {len(post_ids)} posts')
+        return post_ids
+
+    def _content(self, tag_weights):
+        words = self.random.choices(WORDS, k=self.random.randint(4, 16))
+        if tag_weights:
+            for rank in set(self.random.choices(range(len(tag_weights)), cum_weights=tag_weights,
+                                                k=self.random.randint(0, 2))):
+                words.insert(self.random.randrange(len(words) + 1), f'#tag{rank}')
+        return ' '.join(words)[:280]
+
+    def likes(self, user_ids, post_ids, count):
+        """``count`` likes on posts picked by rank (older posts are not favoured)"""
+        ranked = post_ids[:]
+        self.random.shuffle(ranked)
+        weights = zipf_weights(len(ranked), self.skew)
+        Like = Post.likes.through
+
+        def rows():
+            for _ in range(count):
+                yield Like(post_id=self.random.choices(ranked, cum_weights=weights)[0],
+                           user_id=self.random.choice(user_ids))
+
+        for batch in _batches(rows(), self.batch_size):
+            Like.objects.bulk_create(batch, ignore_conflicts=True)
+        self.log(f'Created up to {count} likes')
+
+    def finish(self, user_ids):
+        counters.repair_post_counters(batch_size=self.batch_size)
+        counters.repair_user_counters(batch_size=self.batch_size)
+        for user in User.objects.filter(pk__in=user_ids).iterator(chunk_size=self.batch_size):
+            timeline.rebuild_timeline(user)
+        self.log('Repaired counters and rebuilt timelines')
+
+
+def generate(users=1000, follows=50, posts=10000, likes=50000, hashtags=200, days=30,
+             prefix='synth', seed=0, skew=1.1, batch_size=1000, log=None):
+    """Create a synthetic graph; return the new users' ids, most popular first"""
+    generator = Generator(prefix=prefix, seed=seed, skew=skew, batch_size=batch_size, log=log)
+    user_ids = generator.users(users)
+    generator.follows(user_ids, follows)
+    post_ids = generator.posts(user_ids, posts, hashtags, days)
+    generator.likes(user_ids, post_ids, likes)
+    generator.finish(user_ids)
+    return user_ids
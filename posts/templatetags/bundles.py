@@ -0,0 +1,18 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+from xclone import assets
+
+register = template.Library()
+
+
+@register.simple_tag
+def bundle(path):
+    """Usage: {% bundle 'dist/app.css' %}; the bundle's sources until it's built (DEBUG only)"""
+    if path.endswith('.css'):
+        html = '<link href="{}" rel="stylesheet"{}>'
+    else:
+        html = '<script src="{}"{}></script>'
+    return format_html_join('\n', html, (
+        (url, format_html(' integrity="{}" crossorigin="anonymous"', digest) if digest else '')
+        for url, digest in assets.source_tags(path)
+    ))
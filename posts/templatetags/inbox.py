@@ -0,0 +1,25 @@
+from django import template
+from django.urls import reverse
+from posts import notifications
+from xclone import events
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def unread_notification_count(context):
+    """Usage: {% unread_notification_count as unread %}"""
+    user = context.get('user')
+    if user is None or not user.is_authenticated:
+        return 0
+    return notifications.unread_count(user)
+
+
+@register.simple_tag(takes_context=True)
+def events_url(context):
+    """Usage: {% events_url as url %}; empty unless the viewer can hold a live stream open"""
+    user = context.get('user')
+    request = context.get('request')
+    if user is None or not user.is_authenticated or request is None or not events.streaming_available(request):
+        return ''
+    return reverse('event_stream')
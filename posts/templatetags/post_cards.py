@@ -0,0 +1,18 @@
+from django import template
+from posts import cards
+
+register = template.Library()
+
+
+@register.inclusion_tag('posts/_post_card.html', takes_context=True)
+def post_card(context, post, detail=False):
+    """Usage: {% post_card post %} or {% post_card post detail=True %}"""
+    fragments = cards.card_fragments(post)
+    return {
+        'post': post,
+        'user': context.get('user'),
+        'detail': detail,
+        'avatar_html': fragments['avatar'],
+        'author_name_html': fragments['name'],
+        'body_html': fragments['body'],
+    }
@@ -0,0 +1,35 @@
+from django import template
+from django.forms.utils import flatatt
+from django.utils.html import format_html
+from xclone import images
+
+register = template.Library()
+
+
+@register.simple_tag
+def picture(field_file, renditions, alt='', sizes='100vw', size='feed', **attrs):
+    """
+    Usage: {% picture post.image post.image_renditions alt="Post image" sizes="680px" class="img-fluid" %}
+
+    Renders a <picture> with WebP and JPEG srcsets once renditions exist, and
+    a plain <img> of the original upload until then.
+    """
+    if not field_file:
+        return ''
+    attrs.update({'alt': alt, 'loading': 'lazy', 'decoding': 'async'})
+    if not (renditions or {}).get('renditions'):
+        return format_html('<img src="{}"{}>', field_file.url, flatatt(attrs))
+
+    attrs.update({
+        'srcset': images.srcset(renditions, 'jpeg'),
+        'sizes': sizes,
+        'width': renditions['width'],
+        'height': renditions['height'],
+    })
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}" sizes="{}"><img src="{}"{}></picture>',
+        images.srcset(renditions, 'webp'),
+        sizes,
+        images.rendition_url(field_file, renditions, size),
+        flatatt(attrs),
+    )
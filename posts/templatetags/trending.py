@@ -0,0 +1,10 @@
+from django import template
+from posts import trending
+
+register = template.Library()
+
+
+@register.simple_tag
+def trending_hashtags():
+    """Usage: {% trending_hashtags as hashtags %}"""
+    return trending.top_hashtags()
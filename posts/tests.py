@@ -1,3 +1,1164 @@
-from django.test import TestCase
+import asyncio
+import json
+import shutil
+import threading
+import tempfile
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.urls import ResolverMatch, reverse
+from django.utils import timezone
+from .models import ArchivedPost, EngagementEvent, Hashtag, Notification, Post, TimelineEntry
+from . import (
+    benchmark, cards, checks, counters, engagement, feed, ingest, notifications, pagecache, search, synthetic, threads,
+    retention, timeline, trending, transfer, views,
+)
+from .pagination import CursorPaginator
+from PIL import Image
+from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
+from xclone import assets, concurrency, db_router, events, profiling, ratelimit
 
-# Create your tests here.
+User = get_user_model()
+
+
+class TimelineTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create_user(username='alice', password='testpass123')
+        self.bob = User.objects.create_user(username='bob', password='testpass123')
+        self.client.force_login(self.alice)
+        self.client.post(reverse('follow_user', args=['bob']))
+        self.bob.refresh_from_db()
+
+    def test_create_post_fans_out_to_followers(self):
+        self.client.force_login(self.bob)
+        self.client.post(reverse('create_post'), {'content': 'hello followers'})
+        post = Post.objects.get()
+        self.assertEqual(
+            set(TimelineEntry.objects.filter(post=post).values_list('user__username', flat=True)),
+            {'alice', 'bob'},
+        )
+
+        self.client.force_login(self.alice)
+        response = self.client.get(reverse('home'))
+        self.assertEqual(list(response.context['page_obj']), [post])
+
+    def test_follow_backfills_and_unfollow_removes(self):
+        carol = User.objects.create_user(username='carol', password='testpass123')
+        post = Post.objects.create(author=carol, content='before the follow')
+
+        self.client.force_login(self.alice)
+        self.client.post(reverse('follow_user', args=['carol']))
+        self.assertIn(post, [entry.post for entry in timeline.home_timeline(self.alice)])
+
+        self.client.post(reverse('follow_user', args=['carol']))
+        self.assertNotIn(post, [entry.post for entry in timeline.home_timeline(self.alice)])
+
+    @override_settings(TIMELINE_MAX_ENTRIES=3)
+    def test_timeline_is_capped(self):
+        for i in range(5):
+            Post.objects.create(author=self.bob, content=f'post {i}')
+        timeline.rebuild_timeline(self.alice)
+        self.assertEqual(TimelineEntry.objects.filter(user=self.alice).count(), 3)
+
+    @override_settings(TIMELINE_MAX_ENTRIES=3)
+    def test_fan_out_keeps_timelines_capped(self):
+        posts = []
+        for i in range(5):
+            post = Post.objects.create(author=self.bob, content=f'post {i}')
+            Post.objects.filter(pk=post.pk).update(created_at=timezone.now() + timedelta(seconds=i))
+            post.refresh_from_db()
+            timeline.fan_out_post(post)
+            posts.append(post)
+        for user in (self.alice, self.bob):
+            self.assertEqual(
+                list(TimelineEntry.objects.filter(user=user).values_list('post_id', flat=True)),
+                [post.pk for post in posts[:-4:-1]],
+            )
+
+    @override_settings(TIMELINE_FANOUT_FOLLOWER_LIMIT=0)
+    def test_large_accounts_are_pulled_on_read(self):
+        post = Post.objects.create(author=self.bob, content='too many followers')
+        timeline.fan_out_post(post)
+        self.assertFalse(TimelineEntry.objects.filter(user=self.alice).exists())
+
+        self.assertEqual([entry.post for entry in timeline.home_timeline(self.alice)], [post])
+
+
+class CounterTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create_user(username='alice', password='testpass123')
+        self.bob = User.objects.create_user(username='bob', password='testpass123')
+        self.post = Post.objects.create(author=self.bob, content='count me')
+        self.client.force_login(self.alice)
+
+    def test_like_and_retweet_update_counters(self):
+        response = self.client.post(reverse('like_post', args=[self.post.pk]))
+        self.assertEqual(response.json(), {'liked': True, 'likes_count': 1})
+        self.client.post(reverse('retweet_post', args=[self.post.pk]))
+
+        self.post.refresh_from_db()
+        self.assertEqual((self.post.likes_count, self.post.retweets_count), (1, 1))
+
+        response = self.client.post(reverse('like_post', args=[self.post.pk]))
+        self.assertEqual(response.json(), {'liked': False, 'likes_count': 0})
+
+    def test_follow_updates_counters(self):
+        response = self.client.post(reverse('follow_user', args=['bob']))
+        self.assertEqual(response.json(), {'is_following': True, 'followers_count': 1})
+        self.alice.refresh_from_db()
+        self.assertEqual(self.alice.following_count, 1)
+
+    def test_repair_fixes_drift(self):
+        self.post.likes.add(self.alice)
+        Post.objects.create(author=self.alice, content='a reply', reply_to=self.post)
+        self.bob.followers.add(self.alice)
+
+        self.assertEqual(counters.repair_post_counters(dry_run=True), 1)
+        self.assertEqual(counters.repair_post_counters(), 1)
+        self.assertEqual(counters.repair_user_counters(batch_size=1), 2)
+        self.assertEqual(counters.repair_post_counters(), 0)
+
+        self.post.refresh_from_db()
+        self.bob.refresh_from_db()
+        self.assertEqual((self.post.likes_count, self.post.replies_count), (1, 1))
+        self.assertEqual(self.bob.followers_count, 1)
+
+
+class FeedDecorationTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='testpass123')
+        self.posts = [Post.objects.create(author=self.alice, content=f'post {i}') for i in range(3)]
+        self.posts[0].likes.add(self.alice)
+        self.posts[1].retweets.add(self.alice)
+
+    def test_viewer_state_in_one_query(self):
+        with self.assertNumQueries(1):
+            posts = feed.decorate(self.posts, self.alice)
+        self.assertEqual([p.viewer_liked for p in posts], [True, False, False])
+        self.assertEqual([p.viewer_retweeted for p in posts], [False, True, False])
+
+    def test_anonymous_viewer_needs_no_query(self):
+        with self.assertNumQueries(0):
+            posts = feed.decorate(self.posts, AnonymousUser())
+        self.assertFalse(any(p.viewer_liked or p.viewer_retweeted for p in posts))
+
+    def test_post_detail_marks_liked(self):
+        self.client.force_login(self.alice)
+        response = self.client.get(reverse('post_detail', args=[self.posts[0].pk]))
+        self.assertContains(response, 'like-btn liked')
+
+
+class CursorPaginationTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='testpass123')
+        self.posts = [Post.objects.create(author=self.alice, content=f'#django post {i}') for i in range(25)]
+        self.posts.reverse()
+
+    def test_walks_forwards_and_backwards(self):
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        first = paginator.get_page()
+        self.assertEqual(list(first), self.posts[:10])
+        self.assertFalse(first.has_previous())
+
+        second = paginator.get_page(first.next_cursor)
+        self.assertEqual(list(second), self.posts[10:20])
+        third = paginator.get_page(second.next_cursor)
+        self.assertEqual(list(third), self.posts[20:])
+        self.assertFalse(third.has_next())
+
+        self.assertEqual(list(paginator.get_page(third.previous_cursor)), self.posts[10:20])
+        back_to_first = paginator.get_page(second.previous_cursor)
+        self.assertEqual(list(back_to_first), self.posts[:10])
+        self.assertFalse(back_to_first.has_previous())
+
+    def test_no_count_query(self):
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        cursor = paginator.get_page().next_cursor
+        with self.assertNumQueries(1):
+            paginator.get_page(cursor)
+
+    def test_malformed_cursor_falls_back_to_first_page(self):
+        self.assertEqual(list(CursorPaginator(Post.objects.all(), 10).get_page('not-a-cursor')), self.posts[:10])
+
+    def test_hashtag_view_pages_by_cursor(self):
+        hashtag = Hashtag.objects.create(name='django')
+        for post in self.posts:
+            hashtag.posts.add(post, through_defaults={'created_at': post.created_at})
+
+        response = self.client.get(reverse('hashtag', args=['django']))
+        self.assertEqual(list(response.context['page_obj']), self.posts[:10])
+        response = self.client.get(reverse('hashtag', args=['django']), {'cursor': response.context['page_obj'].next_cursor})
+        self.assertEqual(list(response.context['page_obj']), self.posts[10:20])
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='testpass123', first_name='Alice', last_name='Liddell')
+        self.exact = Post.objects.create(author=self.alice, content='django django django')
+        self.partial = Post.objects.create(author=self.alice, content='learning django with a lot of other words here')
+        self.other = Post.objects.create(author=self.alice, content='nothing relevant')
+
+    def test_posts_ranked_by_relevance(self):
+        results = search.get_backend().search('django')
+        self.assertEqual(results.count(), 2)
+        self.assertEqual(list(results[0:10]), [self.exact, self.partial])
+
+    def test_prefix_match_and_index_follows_edits_and_deletes(self):
+        backend = search.get_backend()
+        self.assertEqual(list(backend.search('relev')[0:10]), [self.other])
+
+        self.other.content = 'now about python'
+        self.other.save()
+        self.assertEqual(backend.search('relev').count(), 0)
+        self.assertEqual(list(backend.search('python')[0:10]), [self.other])
+
+        self.other.delete()
+        self.assertEqual(backend.search('python').count(), 0)
+
+    def test_search_view_finds_users_and_paginates(self):
+        for i in range(25):
+            Post.objects.create(author=self.alice, content=f'bulk post {i}')
+        response = self.client.get(reverse('search'), {'q': 'bulk'})
+        self.assertEqual(len(response.context['posts']), 20)
+        self.assertTrue(response.context['page_obj'].has_next())
+
+        response = self.client.get(reverse('search'), {'q': 'lidd'})
+        self.assertEqual(response.context['users'], [self.alice])
+
+    def test_bare_hash_matches_no_hashtags(self):
+        django = Hashtag.objects.create(name='django')
+        self.assertEqual(views._search_hashtags('#'), [])
+        self.assertEqual(views._search_hashtags('#dj'), [django])
+
+    def test_query_syntax_is_not_interpreted(self):
+        self.assertEqual(search.get_backend().search('"django*" (').count(), 2)
+
+
+class IngestTests(TestCase):
+    def setUp(self):
+        self.alice = User.objects.create_user(username='alice', password='testpass123')
+        self.bob = User.objects.create_user(username='bob', password='testpass123')
+
+    def test_create_post_links_tags_and_notifies_mentions(self):
+        self.client.force_login(self.alice)
+        self.client.post(reverse('create_post'), {'content': '#Django #django #Python hi @bob @alice @nobody'})
+        post = Post.objects.get()
+
+        self.assertEqual(sorted(post.hashtags.values_list('name', flat=True)), ['django', 'python'])
+        notification = Notification.objects.get()
+        self.assertEqual((notification.recipient, notification.notification_type), (self.bob, 'mention'))
+
+        response = self.client.get(reverse('hashtag', args=['DJANGO']))
+        self.assertEqual(list(response.context['page_obj']), [post])
+
+    def test_batch_uses_fixed_number_of_queries(self):
+        posts = [Post.objects.create(author=self.alice, content=f'#tag{i} #shared @bob') for i in range(20)]
+        # 3 for hashtags, 3 for trending buckets, 2 for mentions
+        with self.assertNumQueries(8):
+            ingest.process_posts(posts)
+        self.assertEqual(Hashtag.objects.get(name='shared').posts.count(), 20)
+
+    def test_backfill_merges_legacy_tags(self):
+        post = Post.objects.create(author=self.alice, content='#Legacy tag @bob')
+        Hashtag.objects.create(name='Legacy').posts.add(post)
+
+        call_command('backfill_hashtags', '--mentions', stdout=StringIO())
+        call_command('backfill_hashtags', '--mentions', stdout=StringIO())
+
+        self.assertEqual(list(Hashtag.objects.values_list('name', flat=True)), ['legacy'])
+        self.assertEqual(list(post.hashtags.all()), [Hashtag.objects.get()])
+        self.assertEqual(Notification.objects.filter(notification_type='mention').count(), 1)
+
+
+@override_settings(TRENDING_HALF_LIFE_SECONDS=3600)
+class TrendingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.now = timezone.now()
+        self.python, self.django = Hashtag.objects.bulk_create([Hashtag(name='python'), Hashtag(name='django')])
+
+    def test_recent_activity_outranks_older_activity(self):
+        trending.record([(self.python.pk, self.now - timedelta(hours=6))] * 10, now=self.now)
+        trending.record([(self.django.pk, self.now)] * 3, now=self.now)
+        trending.record([(self.django.pk, self.now - timedelta(days=2))] * 50, now=self.now)
+
+        top = trending.compute(now=self.now)
+        self.assertEqual([tag['name'] for tag in top], ['django', 'python'])
+        self.assertEqual([tag['posts'] for tag in top], [3, 10])
+
+    def test_create_post_counts_and_endpoint_serves_cached_list(self):
+        user = User.objects.create_user(username='alice', password='testpass123')
+        self.client.force_login(user)
+        self.client.post(reverse('create_post'), {'content': '#Django is trending'})
+
+        response = self.client.get(reverse('trending'))
+        self.assertEqual(response.json()['hashtags'][0]['name'], 'django')
+        with self.assertNumQueries(0):
+            trending.top_hashtags()
+
+    def test_compute_cost_is_independent_of_post_table(self):
+        user = User.objects.create_user(username='alice', password='testpass123')
+        Post.objects.bulk_create([Post(author=user, content='#python old') for _ in range(200)])
+        trending.record([(self.python.pk, self.now)], now=self.now)
+        with self.assertNumQueries(2):
+            trending.compute(now=self.now)
+
+
+class PostCardCacheTests(TestCase):
+    def setUp(self):
+        cards.fragment_cache().clear()
+        self.alice = User.objects.create_user(username='alice', password='testpass123', first_name='Alice')
+        self.post = Post.objects.create(author=self.alice, content='first draft')
+
+    def test_fragments_are_reused_until_edited(self):
+        self.client.get(reverse('home'))
+        self.assertIsNotNone(cards.fragment_cache().get(cards.body_key(self.post)))
+
+        with self.assertTemplateNotUsed('posts/_post_card_body.html'):
+            response = self.client.get(reverse('home'))
+        self.assertContains(response, 'first draft')
+
+        self.post.content = 'second draft'
+        self.post.save()
+        self.alice.first_name = 'Alicia'
+        self.alice.save()
+        response = self.client.get(reverse('home'))
+        self.assertContains(response, 'second draft')
+        self.assertContains(response, 'Alicia')
+
+    def test_viewer_state_is_not_cached(self):
+        self.client.force_login(self.alice)
+        self.client.get(reverse('post_detail', args=[self.post.pk]))
+        self.client.post(reverse('like_post', args=[self.post.pk]))
+
+        response = self.client.get(reverse('post_detail', args=[self.post.pk]))
+        self.assertContains(response, 'like-btn liked')
+        self.assertContains(response, '<span class="like-count" data-post-id="%d">1</span>' % self.post.pk, html=True)
+
+
+def jpeg_upload(name='photo.jpg', size=(1200, 600)):
+    """A JPEG with a camera make and a 90 degree EXIF rotation"""
+    exif = Image.Exif()
+    exif[0x010F] = 'TestCam'
+    exif[0x0112] = 6
+    buffer = BytesIO()
+    Image.new('RGB', size, 'red').save(buffer, 'JPEG', exif=exif.tobytes())
+    return SimpleUploadedFile(name, buffer.getvalue(), content_type='image/jpeg')
+
+
+@override_settings(TASKS_ALWAYS_EAGER=True)
+class ImagePipelineTests(TestCase):
+    def setUp(self):
+        self.media_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media_root, ignore_errors=True)
+        settings_override = override_settings(MEDIA_ROOT=self.media_root)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.alice = User.objects.create_user(username='alice', password='testpass123')
+
+    def test_post_image_renditions(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            post = Post.objects.create(author=self.alice, content='photo', image=jpeg_upload())
+        post.refresh_from_db()
+
+        # Rotated upright from the EXIF orientation
+        self.assertEqual((post.image_renditions['width'], post.image_renditions['height']), (600, 1200))
+        feed_rendition = post.image_renditions['renditions']['feed']
+        self.assertEqual((feed_rendition['width'], feed_rendition['height']), (340, 680))
+        for extension in ('jpeg', 'webp'):
+            with default_storage.open(feed_rendition[extension]) as f:
+                self.assertEqual(len(Image.open(f).getexif()), 0)
+
+        response = self.client.get(reverse('post_detail', args=[post.pk]))
+        self.assertContains(response, 'type="image/webp"')
+        self.assertContains(response, '340w')
+
+    def test_unchanged_image_is_not_reprocessed(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.alice.avatar = jpeg_upload('avatar.jpg', size=(400, 400))
+            self.alice.save()
+        self.alice.refresh_from_db()
+        self.assertIn('thumb', self.alice.avatar_renditions['renditions'])
+        self.assertIn('_thumb.jpeg', self.alice.get_avatar_url())
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.alice.bio = 'Hello'
+            self.alice.save()
+        self.assertEqual(callbacks, [])
+
+    def test_process_images_backfills_missing_renditions(self):
+        with self.captureOnCommitCallbacks():
+            post = Post.objects.create(author=self.alice, content='photo', image=jpeg_upload())
+        self.assertEqual(Post.objects.get(pk=post.pk).image_renditions, {})
+
+        call_command('process_images', stdout=StringIO())
+        self.assertIn('full', Post.objects.get(pk=post.pk).image_renditions['renditions'])
+
+
+class NotificationInboxTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create_user(username='alice', password='testpass123')
+        self.post = Post.objects.create(author=self.alice, content='popular post')
+        self.fans = [User.objects.create_user(username=f'fan{i}', password='testpass123') for i in range(4)]
+
+    def like(self, user, post=None):
+        self.client.force_login(user)
+        self.client.post(reverse('like_post', args=[(post or self.post).pk]))
+
+    def test_likes_are_grouped_per_post(self):
+        for fan in self.fans:
+            self.like(fan)
+        other = Post.objects.create(author=self.alice, content='quiet post')
+        self.like(self.fans[0], other)
+
+        with self.assertNumQueries(3):
+            groups, next_cursor = notifications.grouped(self.alice)
+        self.assertIsNone(next_cursor)
+        self.assertEqual([(g['post_id'], g['actor_count']) for g in groups], [(other.pk, 1), (self.post.pk, 4)])
+        self.assertEqual([a.username for a in groups[1]['actors']], ['fan3', 'fan2', 'fan1'])
+
+        groups, next_cursor = notifications.grouped(self.alice, limit=1)
+        self.assertEqual(groups[0]['post_id'], other.pk)
+        groups, _ = notifications.grouped(self.alice, before=next_cursor, limit=1)
+        self.assertEqual(groups[0]['post_id'], self.post.pk)
+
+        self.client.force_login(self.alice)
+        data = self.client.get(reverse('notifications_api')).json()
+        self.assertEqual(data['unread_count'], 5)
+        self.assertEqual(data['notifications'][1]['actor_count'], 4)
+        self.assertContains(self.client.get(reverse('notifications')), 'and 3 others')
+
+    def test_unread_count_is_cached_and_kept_current(self):
+        self.like(self.fans[0])
+        self.assertEqual(notifications.unread_count(self.alice), 1)
+        self.like(self.fans[1])
+        with self.assertNumQueries(0):
+            self.assertEqual(notifications.unread_count(self.alice), 2)
+
+        Post.objects.create(author=self.fans[2], content='hi @alice')
+        ingest.process_posts(Post.objects.filter(author=self.fans[2]))
+        self.assertEqual(notifications.unread_count(self.alice), 3)
+
+        self.client.force_login(self.alice)
+        self.client.post(reverse('mark_notifications_read'))
+        with self.assertNumQueries(0):
+            self.assertEqual(notifications.unread_count(self.alice), 0)
+        self.assertFalse(Notification.objects.filter(recipient=self.alice, is_read=False).exists())
+
+    def test_mark_read_with_only_invalid_ids_marks_nothing(self):
+        self.like(self.fans[0])
+        self.like(self.fans[1])
+        self.client.force_login(self.alice)
+        self.client.post(reverse('mark_notifications_read'), {'id': ['abc', '-1']})
+        self.assertEqual(Notification.objects.filter(recipient=self.alice, is_read=False).count(), 2)
+
+        first = Notification.objects.filter(recipient=self.alice).earliest('id')
+        self.client.post(reverse('mark_notifications_read'), {'id': [str(first.pk), 'abc']})
+        self.assertEqual(list(Notification.objects.filter(recipient=self.alice, is_read=True)), [first])
+        self.assertEqual(notifications.unread_count(self.alice), 1)
+
+
+class EventStreamTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create_user(username='alice', password='testpass123')
+        self.bob = User.objects.create_user(username='bob', password='testpass123')
+        self.client.force_login(self.alice)
+        self.client.post(reverse('follow_user', args=['bob']))
+        self.post = Post.objects.create(author=self.alice, content='live')
+
+    async def test_broker_delivers_across_threads_and_unsubscribes(self):
+        broker = events.InProcessBroker()
+        subscription = broker.subscribe(['user:1', 'post:2'])
+        thread = threading.Thread(target=broker.publish, args=('post:2', {'event': 'counter', 'data': {}}))
+        thread.start()
+        thread.join()
+        broker.publish('post:3', {'event': 'counter', 'data': {}})
+        self.assertEqual(await subscription.get(timeout=1), {'event': 'counter', 'data': {}})
+        self.assertIsNone(await subscription.get(timeout=0.01))
+        self.assertEqual(broker.subscriber_count(), 1)
+        broker.unsubscribe(subscription)
+        self.assertEqual(broker.subscriber_count(), 0)
+
+    def test_redis_listener_resubscribes_after_a_dropped_connection(self):
+        class Stop(Exception):
+            pass
+
+        dropped, connected = mock.Mock(), mock.Mock()
+        dropped.listen.side_effect = ConnectionError('connection reset')
+        connected.listen.return_value = iter([{'channel': b'xclone:events:user:1', 'data': '{"event": "timeline"}'}])
+        broker = events.RedisBroker.__new__(events.RedisBroker)
+        events.InProcessBroker.__init__(broker)
+        broker.redis = mock.Mock(**{'pubsub.side_effect': [dropped, connected]})
+        with mock.patch.object(broker, '_deliver') as deliver, \
+                mock.patch('xclone.events.time.sleep', side_effect=[None, Stop]) as sleep, \
+                self.assertLogs('xclone.events', 'WARNING'):
+            with self.assertRaises(Stop):
+                broker._listen()
+        deliver.assert_called_once_with(['user:1'], {'event': 'timeline'})
+        connected.psubscribe.assert_called_once_with('xclone:events:*')
+        # Backoff resets once a subscription succeeds
+        self.assertEqual([c.args[0] for c in sleep.call_args_list], [0.5, 0.5])
+
+    @override_settings(EVENTS_QUEUE_SIZE=1)
+    async def test_slow_subscribers_drop_events(self):
+        broker = events.InProcessBroker()
+        subscription = broker.subscribe(['user:1'])
+        for i in range(3):
+            broker.publish('user:1', {'event': 'timeline', 'data': {'post_id': i}})
+        await asyncio.sleep(0)
+        self.assertEqual(subscription.dropped, 2)
+
+    async def test_stream_pushes_counters_notifications_and_timeline_posts(self):
+        await self.async_client.aforce_login(self.alice)
+        response = await self.async_client.get(reverse('event_stream'), {'posts': f'{self.post.pk},x'})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = response.streaming_content
+        self.assertTrue((await anext(stream)).startswith(b'retry:'))
+
+        def like_and_post():
+            with self.captureOnCommitCallbacks(execute=True):
+                self.client.force_login(self.bob)
+                self.client.post(reverse('like_post', args=[self.post.pk]))
+                self.client.post(reverse('create_post'), {'content': 'from bob'})
+        await sync_to_async(like_and_post)()
+
+        received = {}
+        for _ in range(3):
+            chunk = (await asyncio.wait_for(anext(stream), 1)).decode()
+            event, data = chunk.strip().split('\n')
+            received[event.removeprefix('event: ')] = json.loads(data.removeprefix('data: '))
+        self.assertEqual(received['counter'], {'post_id': self.post.pk, 'field': 'likes_count', 'delta': 1, 'value': 1})
+        self.assertEqual(received['notification']['type'], 'like')
+        self.assertEqual(received['timeline']['author'], 'bob')
+        await stream.aclose()
+
+    def test_stream_is_refused_outside_asgi(self):
+        response = self.client.get(reverse('event_stream'))
+        self.assertEqual(response.status_code, 204)
+        self.assertNotContains(self.client.get(reverse('home')), 'data-events-url')
+
+    async def test_pages_served_over_asgi_link_the_stream(self):
+        await self.async_client.aforce_login(self.alice)
+        response = await self.async_client.get(reverse('home'))
+        self.assertContains(response, f'data-events-url="{reverse("event_stream")}"')
+
+
+class ThreadTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create_user(username='alice', password='testpass123')
+        self.bob = User.objects.create_user(username='bob', password='testpass123')
+        self.root = Post.objects.create(author=self.alice, content='root')
+
+    def reply(self, parent, content, author=None):
+        return Post.objects.create(author=author or self.bob, content=content, reply_to=parent)
+
+    @override_settings(THREAD_MAX_DEPTH=2, THREAD_MAX_REPLIES=2)
+    def test_load_thread_is_bounded(self):
+        first = self.reply(self.root, 'first')
+        second = self.reply(self.root, 'second')
+        self.reply(self.root, 'third')
+        nested = self.reply(first, 'nested')
+        too_deep = self.reply(nested, 'too deep')
+
+        with self.assertNumQueries(2):
+            thread = threads.load_thread(self.root.pk)
+            authors = [post.author.username for post in thread]
+        self.assertEqual(authors, ['alice', 'bob', 'bob', 'bob'])
+        self.assertEqual([post.content for post in thread.descendants], ['first', 'nested', 'second'])
+        self.assertEqual([post.thread_depth for post in thread.descendants], [1, 2, 1])
+
+        thread = threads.load_thread(too_deep.pk)
+        self.assertEqual([post.content for post in thread.ancestors], ['root', 'first', 'nested'])
+        self.assertEqual(thread.replies, [])
+        self.assertIsNone(threads.load_thread(too_deep.pk + 100))
+
+    @override_settings(THREAD_MAX_NODES=3)
+    def test_load_thread_stops_after_max_nodes_breadth_first(self):
+        replies = [self.reply(self.root, f'r{i}') for i in range(5)]
+        for reply in replies:
+            self.reply(reply, f'under {reply.content}')
+
+        thread = threads.load_thread(self.root.pk)
+        self.assertEqual([post.content for post in thread.descendants], ['r0', 'r1', 'r2'])
+
+    def test_reply_via_post_detail_form(self):
+        self.client.force_login(self.bob)
+        response = self.client.get(reverse('post_detail', args=[self.root.pk]))
+        self.assertContains(response, f'name="reply_to" value="{self.root.pk}"')
+
+        response = self.client.post(reverse('create_post'), {'content': 'a reply', 'reply_to': self.root.pk})
+        self.assertRedirects(response, reverse('post_detail', args=[self.root.pk]))
+        self.root.refresh_from_db()
+        self.assertEqual(self.root.replies_count, 1)
+        self.assertTrue(Notification.objects.filter(recipient=self.alice, notification_type='reply').exists())
+
+        reply = Post.objects.get(content='a reply')
+        self.reply(reply, 'a nested reply', author=self.alice)
+        response = self.client.get(reverse('post_detail', args=[self.root.pk]))
+        self.assertContains(response, 'a nested reply')
+        self.assertContains(response, 'margin-left: 32px;')
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTests(TestCase):
+    def setUp(self):
+        self.router = db_router.ReplicaRouter()
+        self.factory = RequestFactory()
+
+    def route(self, request, write=False):
+        seen = []
+
+        def view(request):
+            seen.append(self.router.db_for_read(Post))
+            if write:
+                self.router.db_for_write(Post)
+                seen.append(self.router.db_for_read(Post))
+            return HttpResponse()
+
+        response = db_router.ReplicaRoutingMiddleware(view)(request)
+        return seen, response
+
+    def test_reads_go_to_replicas_only_for_safe_requests(self):
+        self.assertEqual(self.route(self.factory.get('/'))[0], ['replica'])
+        self.assertEqual(self.router.db_for_read(Post), 'default')
+
+        # A write pins the rest of the request to the primary
+        self.assertEqual(self.route(self.factory.get('/'), write=True)[0], ['replica', 'default'])
+
+    def test_writes_pin_the_client_to_the_primary(self):
+        seen, response = self.route(self.factory.post('/like/1/'))
+        self.assertEqual(seen, ['default'])
+        self.assertIn(db_router.PIN_COOKIE, response.cookies)
+
+        request = self.factory.get('/')
+        request.COOKIES[db_router.PIN_COOKIE] = '1'
+        self.assertEqual(self.route(request)[0], ['default'])
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_replicas_configured(self):
+        seen, response = self.route(self.factory.post('/like/1/'))
+        self.assertEqual(seen, ['default'])
+        self.assertNotIn(db_router.PIN_COOKIE, response.cookies)
+
+
+class EngagementTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create_user(username='alice', password='testpass123')
+        self.bob = User.objects.create_user(username='bob', password='testpass123')
+        self.post = Post.objects.create(author=self.bob, content='like me')
+        self.client.force_login(self.alice)
+
+    def test_toggle_is_a_conditional_delete_or_insert(self):
+        self.assertEqual(engagement.toggle(self.post, self.alice, 'likes'), (True, True))
+        self.assertEqual(engagement.toggle(self.post, self.alice, 'likes'), (False, True))
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 0)
+        self.assertFalse(self.post.likes.exists())
+
+    def test_repeated_likes_notify_once(self):
+        for _ in range(3):
+            self.client.post(reverse('like_post', args=[self.post.pk]))
+            self.client.post(reverse('like_post', args=[self.post.pk]))
+        self.client.post(reverse('like_post', args=[self.post.pk]))
+
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 1)
+        self.assertEqual(Notification.objects.filter(recipient=self.bob, notification_type='like').count(), 1)
+        self.assertEqual(notifications.unread_count(self.bob), 1)
+
+    @override_settings(NOTIFICATION_COALESCE_SECONDS=0)
+    def test_coalescing_can_be_disabled(self):
+        for _ in range(2):
+            self.client.post(reverse('retweet_post', args=[self.post.pk]))
+            self.client.post(reverse('retweet_post', args=[self.post.pk]))
+        self.assertEqual(Notification.objects.filter(notification_type='retweet').count(), 2)
+
+
+
+@override_settings(ENGAGEMENT_LOG=True)
+class EngagementLogTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create_user(username='alice', password='testpass123')
+        self.bob = User.objects.create_user(username='bob', password='testpass123')
+        self.post = Post.objects.create(author=self.bob, content='like me')
+        self.client.force_login(self.alice)
+
+    def like(self):
+        return self.client.post(reverse('like_post', args=[self.post.pk])).json()
+
+    def test_views_append_and_aggregator_applies(self):
+        self.assertEqual(self.like(), {'liked': True, 'likes_count': 1})
+        self.assertEqual(self.like(), {'liked': False, 'likes_count': 0})
+        self.assertEqual(self.like(), {'liked': True, 'likes_count': 1})
+        self.assertFalse(self.post.likes.exists())
+        self.assertEqual(EngagementEvent.objects.count(), 3)
+
+        notifications.unread_count(self.bob)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.assertEqual(engagement.aggregate(), 3)
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 1)
+        self.assertTrue(self.post.likes.filter(pk=self.alice.pk).exists())
+        # Notifications and their cached unread counts follow the commit
+        self.assertFalse(Notification.objects.exists())
+        for callback in callbacks:
+            callback()
+        self.assertEqual(Notification.objects.filter(recipient=self.bob, notification_type='like').count(), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(notifications.unread_count(self.bob), 1)
+        self.assertFalse(EngagementEvent.objects.exists())
+        self.assertEqual(engagement.aggregate(), 0)
+
+    def test_unlike_is_applied_in_batch(self):
+        engagement.toggle(self.post, self.alice, 'likes')
+        self.post.refresh_from_db()
+        self.assertEqual(self.like(), {'liked': False, 'likes_count': 0})
+        call_command('aggregate_engagement', stdout=StringIO())
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.likes_count, 0)
+        self.assertFalse(self.post.likes.exists())
+
+    @override_settings(ENGAGEMENT_LOG=False)
+    def test_loop_exits_when_the_log_is_off(self):
+        out = StringIO()
+        with mock.patch('posts.engagement.aggregate') as aggregate:
+            call_command('aggregate_engagement', '--loop', stdout=out)
+        aggregate.assert_not_called()
+        self.assertIn('ENGAGEMENT_LOG is off', out.getvalue())
+
+    def test_events_for_deleted_posts_are_dropped(self):
+        self.client.post(reverse('retweet_post', args=[self.post.pk]))
+        self.post.delete()
+        self.assertEqual(engagement.aggregate(), 1)
+        self.assertFalse(EngagementEvent.objects.exists())
+
+    def test_system_checks_require_a_shared_notification_cache(self):
+        errors = checks.engagement_log_check(None)
+        self.assertEqual([error.id for error in errors], ['posts.E001', 'posts.W001'])
+        shared = {**settings.CACHES, 'shared': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}}
+        with self.settings(CACHES=shared, NOTIFICATION_CACHE='shared', EVENTS_BROKER='xclone.events.RedisBroker'):
+            self.assertEqual(checks.engagement_log_check(None), [])
+
+
+class TransferTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create_user(username='alice', password='testpass123')
+        self.bob = User.objects.create_user(username='bob', password='testpass123')
+        self.alice.followers.add(self.bob)
+        self.post = Post.objects.create(author=self.alice, content='hello #dump')
+        ingest.process_posts([self.post])
+        self.reply = Post.objects.create(author=self.bob, content='hi back', reply_to=self.post)
+        self.post.likes.add(self.bob)
+        self.post.retweets.add(self.bob)
+        Post.objects.filter(pk=self.post.pk).update(created_at=timezone.now() - timedelta(days=3))
+
+    def test_round_trip_keeps_keys_timestamps_and_graph(self):
+        dump = StringIO()
+        totals = transfer.export(dump, chunk_size=1)
+        self.assertEqual(totals['post'], 2)
+        self.assertEqual(totals['follow'], 1)
+        created_at = Post.objects.get(pk=self.post.pk).created_at
+        User.objects.all().delete()
+        Hashtag.objects.all().delete()
+
+        dump.seek(0)
+        transfer.load(dump, batch_size=1)
+        post = Post.objects.get(pk=self.post.pk)
+        self.assertEqual(post.created_at, created_at)
+        self.assertEqual(Post.objects.get(pk=self.reply.pk).reply_to_id, post.pk)
+        self.assertEqual(list(post.likes.all()), [self.bob])
+        self.assertEqual(list(post.retweets.all()), [self.bob])
+        self.assertEqual(list(post.hashtags.values_list('name', flat=True)), ['dump'])
+        self.assertTrue(User.objects.get(username='bob').is_following(User.objects.get(username='alice')))
+        self.assertTrue(User.objects.get(username='alice').check_password('testpass123'))
+
+        # Re-running an import skips the rows that are already there
+        dump.seek(0)
+        transfer.load(dump)
+        self.assertEqual(post.likes.count(), 1)
+
+    def test_commands_round_trip_gzip(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = f'{directory}/dump.ndjson.gz'
+        call_command('export_data', path, stderr=StringIO())
+        User.objects.all().delete()
+
+        call_command('import_data', path, '--keep-indexes', stdout=StringIO())
+        self.assertEqual(Post.objects.count(), 2)
+        self.assertTrue(TimelineEntry.objects.filter(user__username='bob', post=self.post).exists())
+        self.assertEqual([post.pk for post in search.get_backend().search('hello')], [self.post.pk])
+
+    def test_rejects_other_files(self):
+        with self.assertRaises(transfer.TransferError):
+            transfer.load(['{"model": "auth.user"}'])
+
+
+class TransferTransactionTests(TransactionTestCase):
+    def test_export_reads_every_section_in_one_transaction(self):
+        in_transaction = []
+        transfer.export(StringIO(), progress=lambda section, rows: in_transaction.append(connection.in_atomic_block))
+        self.assertTrue(in_transaction and all(in_transaction))
+        self.assertFalse(connection.in_atomic_block)
+
+    def index_names(self):
+        return set(transfer._existing_indexes(Post)) & {index.name for index in Post._meta.indexes}
+
+    def test_resumes_after_an_import_killed_with_indexes_dropped(self):
+        all_indexes = {index.name for index in Post._meta.indexes}
+        with connection.schema_editor() as editor:
+            editor.remove_index(Post, Post._meta.indexes[0])
+        self.assertEqual(self.index_names(), all_indexes - {Post._meta.indexes[0].name})
+
+        with transfer.deferred_indexes([Post]):
+            self.assertEqual(self.index_names(), set())
+        self.assertEqual(self.index_names(), all_indexes)
+
+
+@override_settings(NOTIFICATION_RETENTION_DAYS=30, POST_ARCHIVE_DAYS=30, RETENTION_BATCH_SIZE=1,
+                   RETENTION_PAUSE_SECONDS=0)
+class RetentionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create_user(username='alice', password='testpass123')
+        self.bob = User.objects.create_user(username='bob', password='testpass123')
+        self.old = timezone.now() - timedelta(days=60)
+
+    def age(self, *objects):
+        for obj in objects:
+            type(obj).objects.filter(pk=obj.pk).update(created_at=self.old)
+
+    def test_only_old_read_notifications_are_deleted(self):
+        old_read = Notification.objects.create(recipient=self.alice, sender=self.bob, notification_type='follow',
+                                               is_read=True)
+        old_unread = Notification.objects.create(recipient=self.alice, sender=self.bob, notification_type='follow')
+        recent_read = Notification.objects.create(recipient=self.alice, sender=self.bob, notification_type='follow',
+                                                  is_read=True)
+        self.age(old_read, old_unread)
+
+        self.assertEqual(retention.run(dry_run=True)['notifications'], 1)
+        self.assertEqual(retention.purge_notifications(), 1)
+        self.assertEqual(set(Notification.objects.values_list('pk', flat=True)), {old_unread.pk, recent_read.pk})
+
+    def test_threads_are_archived_from_the_leaves_up(self):
+        root = Post.objects.create(author=self.alice, content='old root')
+        reply = Post.objects.create(author=self.bob, content='old reply', reply_to=root)
+        root.likes.add(self.bob)
+        Post.objects.filter(pk=root.pk).update(likes_count=1)
+        self.age(root, reply)
+
+        self.assertEqual(retention.archive_posts(), 1)
+        self.assertFalse(Post.objects.filter(pk=reply.pk).exists())
+        self.assertTrue(Post.objects.filter(pk=root.pk).exists())
+
+        self.assertEqual(retention.archive_posts(), 1)
+        archived = ArchivedPost.objects.get(pk=root.pk)
+        self.assertEqual((archived.content, archived.likes_count), ('old root', 1))
+        self.assertEqual(archived.created_at, self.old)
+        self.assertEqual(ArchivedPost.objects.get(pk=reply.pk).reply_to_id, root.pk)
+        self.assertFalse(Post.likes.through.objects.exists())
+
+    def test_recent_replies_keep_the_parent_live(self):
+        root = Post.objects.create(author=self.alice, content='old root')
+        Post.objects.create(author=self.bob, content='new reply', reply_to=root)
+        self.age(root)
+        self.assertEqual(retention.archive_posts(), 0)
+
+    def test_a_late_reply_keeps_its_parent_live(self):
+        root = Post.objects.create(author=self.alice, content='old root')
+        self.age(root)
+        bulk_create = ArchivedPost.objects.bulk_create
+
+        def reply_meanwhile(*args, **kwargs):
+            # Lands after the re-check, before the delete
+            Post.objects.create(author=self.bob, content='late reply', reply_to=root)
+            return bulk_create(*args, **kwargs)
+
+        with mock.patch.object(ArchivedPost.objects, 'bulk_create', reply_meanwhile):
+            self.assertEqual(retention.archive_posts(), 0)
+        self.assertTrue(Post.objects.filter(pk=root.pk).exists())
+        self.assertTrue(Post.objects.filter(content='late reply', reply_to=root).exists())
+        self.assertFalse(ArchivedPost.objects.exists())
+
+    def test_archiving_drops_cached_unread_counts(self):
+        post = Post.objects.create(author=self.alice, content='old post')
+        notifications.notify(self.alice, self.bob, 'like', post)
+        self.age(post)
+        self.assertEqual(notifications.unread_count(self.alice), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(retention.archive_posts(), 1)
+        self.assertFalse(Notification.objects.exists())
+        self.assertEqual(notifications.unread_count(self.alice), 0)
+
+    def test_post_detail_falls_back_to_the_archive(self):
+        root = Post.objects.create(author=self.alice, content='archived root')
+        reply = Post.objects.create(author=self.bob, content='archived reply', reply_to=root)
+        self.age(root, reply)
+        call_command('apply_retention', stdout=StringIO())
+        call_command('apply_retention', stdout=StringIO())
+        self.assertFalse(Post.objects.exists())
+
+        self.client.force_login(self.bob)
+        response = self.client.get(reverse('post_detail', args=[root.pk]))
+        self.assertContains(response, 'archived root')
+        self.assertContains(response, 'archived reply')
+        self.assertIsNone(response.context['reply_form'])
+        self.assertNotContains(response, 'toggleLike(')
+
+@override_settings(RATE_LIMITS={'like_post': (2, 60)})
+class RateLimitTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create_user(username='alice', password='testpass123')
+        self.post = Post.objects.create(author=self.alice, content='rate me')
+        self.client.force_login(self.alice)
+
+    def like(self, **headers):
+        return self.client.post(reverse('like_post', args=[self.post.pk]), headers=headers)
+
+    def test_burst_then_429_with_retry_after(self):
+        self.assertEqual(self.like().status_code, 200)
+        self.assertEqual(self.like().status_code, 200)
+
+        response = self.like(x_requested_with='XMLHttpRequest')
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '30')
+        self.assertEqual(response.json()['retry_after'], 30)
+
+        # Page views and unlisted endpoints are never limited
+        self.assertEqual(self.client.get(reverse('home')).status_code, 200)
+        self.assertEqual(self.client.post(reverse('retweet_post', args=[self.post.pk])).status_code, 200)
+
+    def test_bucket_refills_over_time(self):
+        self.assertEqual(ratelimit.take('like_post', 'user:1', 2, 60, now=0), 0)
+        self.assertEqual(ratelimit.take('like_post', 'user:1', 2, 60, now=0), 0)
+        self.assertEqual(ratelimit.take('like_post', 'user:1', 2, 60, now=15), 15)
+        self.assertEqual(ratelimit.take('like_post', 'user:1', 2, 60, now=30), 0)
+        # Buckets are per client
+        self.assertEqual(ratelimit.take('like_post', 'ip:127.0.0.1', 2, 60, now=30), 0)
+
+
+class ProfilingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        profiling.reset_stats()
+        self.alice = User.objects.create_user(username='alice', password='testpass123')
+
+    def test_fingerprint_ignores_literals_and_in_list_length(self):
+        self.assertEqual(
+            profiling.fingerprint("SELECT * FROM t WHERE id IN (%s, %s, %s) AND name = 'x' LIMIT 21"),
+            profiling.fingerprint("SELECT * FROM t WHERE id IN (%s) AND name = 'y' LIMIT 5"),
+        )
+
+    @override_settings(SERVER_TIMING=True)
+    def test_home_query_count_does_not_grow_with_posts(self):
+        authors = [User.objects.create_user(username=f'author{i}', password='testpass123') for i in range(10)]
+        Post.objects.bulk_create(Post(author=author, content=f'post {i}') for i, author in enumerate(authors * 2))
+        for author in authors[:3]:
+            self.client.force_login(author)
+            self.client.post(reverse('like_post', args=[Post.objects.first().pk]))
+
+        self.client.force_login(self.alice)
+        response = self.client.get(reverse('home'))
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertEqual(profiling.stats()['home']['duplicate_queries'], 0)
+
+    def probe(self, budget):
+        @profiling.query_budget(budget)
+        def view(request):
+            list(User.objects.all())
+            list(User.objects.all())
+            return HttpResponse()
+
+        def resolve(request):
+            request.resolver_match = ResolverMatch(view, (), {}, url_name='probe')
+            return view(request)
+
+        return profiling.ProfilingMiddleware(resolve)(RequestFactory().get('/'))
+
+    def test_views_over_budget_fail(self):
+        self.probe(2)
+        with self.assertRaisesMessage(profiling.QueryBudgetExceeded, 'most repeated (2x)'):
+            self.probe(1)
+
+        with override_settings(QUERY_BUDGET_RAISE=False), self.assertLogs('xclone.profiling', 'WARNING'):
+            self.probe(1)
+        probe = profiling.stats()['probe']
+        self.assertEqual((probe['requests'], probe['budget_exceeded'], probe['duplicate_queries']), (3, 2, 3))
+
+    @override_settings(METRICS_TOKEN='s3cret')
+    def test_metrics_endpoint(self):
+        self.client.get(reverse('home'))
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        self.assertEqual(self.client.get(reverse('metrics'), headers={'authorization': 'Bearer s3cre'}).status_code, 403)
+
+        response = self.client.get(reverse('metrics'), headers={'authorization': 'Bearer s3cret'})
+        self.assertContains(response, 'xclone_view_requests_total{view="home"} 1')
+        self.assertContains(response, '# TYPE xclone_view_max_queries gauge')
+
+
+class BenchmarkTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_generate_and_benchmark(self):
+        user_ids = synthetic.generate(users=30, follows=5, posts=120, likes=300, hashtags=10,
+                                      batch_size=50, seed=1)
+        users = User.objects.filter(pk__in=user_ids)
+        # Popularity follows rank, and the counters match the bulk-inserted rows
+        self.assertEqual(users.order_by('-followers_count').first().pk, user_ids[0])
+        self.assertEqual(counters.repair_user_counters(), 0)
+        self.assertEqual(counters.repair_post_counters(), 0)
+        self.assertTrue(TimelineEntry.objects.filter(user_id=user_ids[-1]).exists())
+        self.assertEqual(search.get_backend().search('tag0').count(), Hashtag.objects.get(name='tag0').post_links.count())
+
+        report = benchmark.run(requests=3, warmup=1, users=users)
+        self.assertEqual(set(report), set(benchmark.SCENARIOS))
+        for result in report.values():
+            self.assertEqual(result['errors'], 0)
+            self.assertLessEqual(result['p50_ms'], result['p99_ms'])
+            self.assertGreater(result['queries_mean'], 0)
+
+        self.assertEqual(benchmark.compare({'home': report['home']}, {'home': report['home']})['home']['p50_ms'], 0)
+
+
+class PageCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.alice = User.objects.create_user(username='alice', password='testpass123')
+        self.post = Post.objects.create(author=self.alice, content='hello #world')
+        ingest.process_posts([self.post])
+
+    def test_anonymous_pages_are_cached_until_a_post_is_created(self):
+        for url in (reverse('home'), reverse('hashtag', args=['world']), self.post.get_absolute_url()):
+            first = self.client.get(url)
+            self.assertEqual(first['Cache-Control'], 'public, max-age=30')
+            with self.assertNumQueries(0):
+                second = self.client.get(url)
+            self.assertEqual(second.content, first.content)
+            self.assertEqual(second['ETag'], first['ETag'])
+
+        Post.objects.create(author=self.alice, content='fresh news')
+        self.assertContains(self.client.get(reverse('home')), 'fresh news')
+
+    def test_if_none_match_returns_304_without_rendering(self):
+        etag = self.client.get(reverse('home'))['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('home'), headers={'if-none-match': etag})
+        self.assertEqual(response.status_code, 304)
+
+        # Likes change the page, so the next render gets a new ETag
+        self.post.likes.add(self.alice)
+        Post.objects.filter(pk=self.post.pk).update(likes_count=1)
+        cache.clear()
+        response = self.client.get(reverse('home'), headers={'if-none-match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_logged_in_users_are_not_cached(self):
+        self.client.force_login(self.alice)
+        response = self.client.get(reverse('home'))
+        self.assertNotIn('ETag', response)
+        key = pagecache.page_key(RequestFactory().get(reverse('home')), pagecache.generation())
+        self.assertIsNone(cache.get(key))
+
+
+class StaticAssetTests(TestCase):
+    def test_minify_css_keeps_strings_and_selectors(self):
+        source = '/* note */\n[data-theme="dark"] .a :hover {\n    color: red;\n    content: "a  ;  b";\n}\n'
+        self.assertEqual(assets.minify_css(source), '[data-theme="dark"] .a :hover{color:red;content:"a  ;  b"}')
+
+    def test_minify_js_keeps_line_breaks(self):
+        self.assertEqual(assets.minify_js('// comment\n  const a = 1\n\n  f(a)\n'), 'const a = 1\nf(a)')
+
+    def test_pages_load_only_bundled_assets(self):
+        response = self.client.get(reverse('home'))
+        self.assertContains(response, '/static/dist/app.css')
+        self.assertContains(response, '/static/dist/app.js')
+        self.assertNotContains(response, '<style>')
+        self.assertNotContains(response, 'cdn.')
+
+    def test_fetch_refuses_files_that_do_not_match_their_pin(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        path = 'vendor/bootstrap.min.css'
+        vendor = {path: ('https://example.com/bootstrap.min.css', assets.integrity(b'pinned'))}
+        with override_settings(STATICFILES_DIRS=[root]), mock.patch.object(assets, 'VENDOR', vendor), \
+                mock.patch('urllib.request.urlopen') as urlopen:
+            urlopen.return_value.__enter__.return_value.read.return_value = b'tampered'
+            with self.assertRaises(assets.AssetError):
+                assets.fetch()
+            self.assertFalse((assets.static_dir() / path).exists())
+
+            urlopen.return_value.__enter__.return_value.read.return_value = b'pinned'
+            self.assertEqual(assets.fetch(), [path])
+            self.assertEqual((assets.static_dir() / path).read_bytes(), b'pinned')
+
+    @override_settings(DEBUG=True)
+    def test_unbuilt_bundles_load_their_sources_in_debug(self):
+        with mock.patch.object(assets.finders, 'find', return_value=None):
+            tags = assets.source_tags('dist/app.css')
+        self.assertEqual(tags, [assets.VENDOR['vendor/bootstrap.min.css'], ('/static/css/icons.css', None),
+                                ('/static/css/app.css', None)])
+
+
+class ConcurrentQueryTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        profiling.reset_stats()
+        self.alice = User.objects.create_user(username='alice', password='testpass123')
+        Post.objects.create(author=self.alice, content='hello concurrent world')
+
+    def test_gather_runs_on_worker_connections(self):
+        def probe():
+            return threading.current_thread().name, Post.objects.count()
+
+        results = async_to_sync(concurrency.gather)(probe, probe)
+        self.assertEqual([count for _, count in results], [1, 1])
+        self.assertTrue(all(name.startswith('xclone-db') for name, _ in results))
+
+    def test_async_search_and_profile_views(self):
+        self.client.force_login(self.alice)
+        self.assertContains(self.client.get(reverse('search'), {'q': 'concurrent'}), 'hello concurrent world')
+        self.assertContains(self.client.get(reverse('profile', args=['alice'])), 'hello concurrent world')
+        self.assertEqual(self.client.get(reverse('profile', args=['nobody'])).status_code, 404)
+
+        # Queries made on the worker threads still count against the view's budget
+        self.assertGreaterEqual(profiling.stats()['profile']['max_queries'], 5)
+
+    @override_settings(SERVER_TIMING=True)
+    async def test_async_views_over_asgi(self):
+        await self.async_client.aforce_login(self.alice)
+        response = await self.async_client.get(reverse('search'), {'q': 'concurrent'})
+        self.assertContains(response, 'hello concurrent world')
+        response = await self.async_client.get(reverse('profile', args=['alice']))
+        self.assertContains(response, 'hello concurrent world')
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertGreaterEqual(profiling.stats()['profile']['max_queries'], 5)
+
+    def test_custom_middleware_runs_async_under_asgi(self):
+        async def get_response(request):
+            return HttpResponse()
+
+        for middleware in (profiling.ProfilingMiddleware, db_router.ReplicaRoutingMiddleware,
+                           ratelimit.RateLimitMiddleware):
+            self.assertTrue(iscoroutinefunction(middleware(get_response)), middleware)
@@ -0,0 +1,140 @@
+"""
+Conversation threads for ``post_detail``.
+
+``load_thread`` walks up a post's ``reply_to`` chain and down its reply tree
+in a single ``WITH RECURSIVE`` query (supported by both SQLite and
+PostgreSQL), then loads the authors in one more.  The walk is bounded as it
+goes, so its cost depends on the bounds rather than on the thread's size:
+
+* at most ``THREAD_MAX_ANCESTORS`` ancestors,
+* descendants at most ``THREAD_MAX_DEPTH`` levels below the post,
+* at most ``THREAD_MAX_REPLIES`` replies shown per post (oldest first),
+* at most ``THREAD_MAX_NODES`` descendants in total.
+
+Replies cut off by a bound are still counted by ``replies_count``, so the
+template can link to the reply's own page for the rest of the conversation.
+"""
+from django.conf import settings
+from django.db import connection
+from django.db.models import prefetch_related_objects
+from .models import Post
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+# The recursive step takes only each post's first ``max_replies`` replies, read
+# off the (reply_to_id, id) index, so the walk never visits the rest.  Rows
+# come out breadth-first, so stopping after ``max_nodes`` keeps the top levels.
+REPLIES_STEP = {
+    # LATERAL reads each parent's first replies; the outer LIMIT without an
+    # ORDER BY stops the recursion once enough rows have been fetched
+    'postgresql': """
+    FROM descendants d CROSS JOIN LATERAL (
+        SELECT id, reply_to_id FROM {table} WHERE reply_to_id = d.id ORDER BY id LIMIT %(max_replies)s
+    ) p
+    WHERE d.depth < %(max_depth)s
+    """,
+    # No LATERAL: bound the index range by the id of the last reply shown.
+    # SQLite stops the recursion itself at the LIMIT (the root is one row)
+    'sqlite': """
+    FROM descendants d JOIN {table} p ON p.reply_to_id = d.id AND p.id <= COALESCE((
+        SELECT c.id FROM {table} c WHERE c.reply_to_id = d.id ORDER BY c.id LIMIT 1 OFFSET %(max_replies)s - 1
+    ), 9223372036854775807)
+    WHERE d.depth < %(max_depth)s
+    LIMIT %(max_nodes)s + 1
+    """,
+}
+
+THREAD_SQL = """
+WITH RECURSIVE
+ancestors(id, reply_to_id, depth) AS (
+    SELECT id, reply_to_id, 0 FROM {table} WHERE id = %(root)s
+    UNION ALL
+    SELECT p.id, p.reply_to_id, a.depth - 1
+    FROM {table} p JOIN ancestors a ON p.id = a.reply_to_id
+    WHERE a.depth > -%(max_ancestors)s
+),
+descendants(id, reply_to_id, depth) AS (
+    SELECT id, reply_to_id, 0 FROM {table} WHERE id = %(root)s
+    UNION ALL
+    SELECT p.id, p.reply_to_id, d.depth + 1
+    {replies_step}
+),
+thread(id, depth) AS (
+    SELECT id, depth FROM ancestors
+    UNION ALL
+    SELECT id, depth FROM (
+        SELECT id, depth FROM descendants WHERE depth > 0 LIMIT %(max_nodes)s
+    ) shown
+)
+SELECT {columns}, thread.depth AS thread_depth
+FROM thread JOIN {table} ON {table}.id = thread.id
+ORDER BY thread.depth, {table}.id
+"""
+
+
+class Thread:
+    """
+    A loaded conversation: ``ancestors`` (oldest first), the ``post`` itself
+    and its ``replies`` tree.  Every post in the tree has ``thread_depth`` and
+    ``thread_replies`` (its loaded children) set; ``descendants`` lists the
+    reply tree depth-first, in reading order.
+    """
+
+    def __init__(self, post, ancestors, replies):
+        self.post = post
+        self.ancestors = ancestors
+        self.replies = replies
+
+    @property
+    def descendants(self):
+        stack = list(reversed(self.replies))
+        while stack:
+            reply = stack.pop()
+            yield reply
+            stack.extend(reversed(reply.thread_replies))
+
+    def __iter__(self):
+        """Every loaded post: ancestors, the post, then its replies depth-first"""
+        yield from self.ancestors
+        yield self.post
+        yield from self.descendants
+
+
+def load_thread(post_id, max_depth=None, max_replies=None, model=Post):
+    """
+    Load the conversation around ``post_id`` from ``model``'s table (``Post``
+    or ``ArchivedPost``); return ``None`` if the post isn't there.
+    """
+    table = model._meta.db_table
+    columns = ', '.join(f'{table}.{field.column}' for field in model._meta.concrete_fields)
+    params = {
+        'root': post_id,
+        'max_ancestors': _setting('THREAD_MAX_ANCESTORS', 20),
+        'max_depth': max_depth or _setting('THREAD_MAX_DEPTH', 4),
+        'max_replies': max_replies or _setting('THREAD_MAX_REPLIES', 10),
+        'max_nodes': _setting('THREAD_MAX_NODES', 200),
+    }
+    replies_step = REPLIES_STEP['postgresql' if connection.vendor == 'postgresql' else 'sqlite']
+    sql = THREAD_SQL.format(replies_step=replies_step.format(table=table), table=table, columns=columns)
+    posts = list(model.objects.raw(sql, params))
+    prefetch_related_objects(posts, 'author')
+
+    by_id = {post.pk: post for post in posts}
+    if post_id not in by_id:
+        return None
+    for post in posts:
+        post.thread_replies = []
+
+    ancestors = []
+    for post in posts:
+        if post.thread_depth < 0:
+            ancestors.append(post)
+        elif post.thread_depth > 0 and post.reply_to_id in by_id:
+            # Rows come ordered by depth, so a parent is always placed before its replies;
+            # replies whose parent was cut off by a bound are left out
+            by_id[post.reply_to_id].thread_replies.append(post)
+    root = by_id[post_id]
+    return Thread(root, ancestors, root.thread_replies)
@@ -0,0 +1,163 @@
+"""
+Materialized home timelines.
+
+Posts are pushed into a per-user ``TimelineEntry`` table when they are
+created (fan-out-on-write), so reading a home feed page is one range scan over
+``(user, created_at, post)`` instead of a join across everyone the viewer
+follows.  Authors with more followers than ``TIMELINE_FANOUT_FOLLOWER_LIMIT``
+are not pushed; their posts are pulled into a follower's timeline when the
+follower reads it (fan-out-on-read).
+"""
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db.models import F, Window
+from django.db.models.functions import RowNumber
+from accounts import graph
+from xclone import events
+from .models import Post, TimelineEntry
+
+User = get_user_model()
+
+PULL_AUTHORS_CACHE_KEY = 'timeline:pull_authors'
+BATCH_SIZE = 1000
+
+
+def max_entries():
+    return getattr(settings, 'TIMELINE_MAX_ENTRIES', 800)
+
+
+def fanout_follower_limit():
+    return getattr(settings, 'TIMELINE_FANOUT_FOLLOWER_LIMIT', 10000)
+
+
+def pull_authors_timeout():
+    # Finite, so authors crossing the limit in another process are picked up here too
+    return getattr(settings, 'TIMELINE_PULL_AUTHORS_SECONDS', 5 * 60)
+
+
+def pull_author_ids():
+    """Return the ids of authors whose posts are fanned out on read"""
+    author_ids = cache.get(PULL_AUTHORS_CACHE_KEY)
+    if author_ids is None:
+        author_ids = set(
+            User.objects.filter(followers_count__gt=fanout_follower_limit()).values_list('id', flat=True)
+        )
+        cache.set(PULL_AUTHORS_CACHE_KEY, author_ids, pull_authors_timeout())
+    return author_ids
+
+
+def _mark_pull_author(author_id):
+    author_ids = pull_author_ids()
+    if author_id not in author_ids:
+        cache.set(PULL_AUTHORS_CACHE_KEY, author_ids | {author_id}, pull_authors_timeout())
+
+
+def _push(user_ids, posts):
+    entries = (
+        TimelineEntry(user_id=user_id, post_id=post.pk, created_at=post.created_at)
+        for user_id in user_ids
+        for post in posts
+    )
+    batch = []
+    for entry in entries:
+        batch.append(entry)
+        if len(batch) >= BATCH_SIZE:
+            TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        TimelineEntry.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def fan_out_post(post):
+    """Push a new post into its author's and followers' timelines and announce it to live clients"""
+    if post.author.followers_count > fanout_follower_limit():
+        _mark_pull_author(post.author_id)
+        follower_ids = []
+        # Followers of pull authors listen on the author's channel instead
+        channels = [events.author_channel(post.author_id)]
+    else:
+        follower_ids = list(
+            User.followers.through.objects.filter(from_user_id=post.author_id)
+            .values_list('to_user_id', flat=True)
+        )
+        channels = []
+    _push([post.author_id, *follower_ids], [post])
+    trim_timelines([post.author_id, *follower_ids])
+
+    channels += [events.user_channel(user_id) for user_id in [post.author_id, *follower_ids]]
+    events.publish(channels, 'timeline', {'post_id': post.pk, 'author': post.author.username})
+
+
+def followed_pull_authors(user):
+    """Ids of the pull authors ``user`` follows"""
+    author_ids = pull_author_ids()
+    if not author_ids:
+        return []
+    return sorted(graph.follow_states(user.pk, author_ids))
+
+
+def backfill_author(user, author):
+    """Copy ``author``'s recent posts into ``user``'s timeline after a follow"""
+    posts = list(author.posts.only('id', 'created_at')[:max_entries()])
+    _push([user.pk], posts)
+    trim_timeline(user.pk)
+
+
+def remove_author(user, author):
+    """Drop ``author``'s posts from ``user``'s timeline after an unfollow"""
+    TimelineEntry.objects.filter(user=user, post__author=author).delete()
+
+
+def pull_posts(user):
+    """Merge recent posts from followed pull authors into ``user``'s timeline"""
+    author_ids = followed_pull_authors(user)
+    if not author_ids:
+        return
+    newest = (
+        TimelineEntry.objects.filter(user=user, post__author_id__in=author_ids)
+        .values_list('created_at', flat=True)
+        .first()
+    )
+    posts = Post.objects.filter(author_id__in=author_ids).only('id', 'created_at')
+    if newest is not None:
+        posts = posts.filter(created_at__gt=newest)
+    posts = list(posts[:max_entries()])
+    if posts:
+        _push([user.pk], posts)
+        trim_timeline(user.pk)
+
+
+def trim_timeline(user_id):
+    """Delete entries beyond the newest ``TIMELINE_MAX_ENTRIES`` for a user"""
+    trim_timelines([user_id])
+
+
+def trim_timelines(user_ids):
+    """``trim_timeline`` for many users, two queries per ``BATCH_SIZE`` of them"""
+    user_ids = list(user_ids)
+    for start in range(0, len(user_ids), BATCH_SIZE):
+        ranked = TimelineEntry.objects.filter(user_id__in=user_ids[start:start + BATCH_SIZE]).annotate(
+            position=Window(RowNumber(), partition_by=F('user_id'), order_by=[F('created_at').desc(), F('post_id').desc()])
+        )
+        overflow = list(ranked.filter(position__gt=max_entries()).values_list('pk', flat=True))
+        if overflow:
+            TimelineEntry.objects.filter(pk__in=overflow).delete()
+
+
+def home_timeline(user):
+    """Return ``user``'s timeline entries, newest first, with posts and authors joined"""
+    pull_posts(user)
+    return TimelineEntry.objects.filter(user=user).select_related('post__author')
+
+
+def rebuild_timeline(user):
+    """Recompute ``user``'s timeline from the follow graph"""
+    TimelineEntry.objects.filter(user=user).delete()
+    pull_ids = pull_author_ids()
+    author_ids = [user.pk, *(author_id for author_id in graph.following(user.pk) if author_id not in pull_ids)]
+    posts = list(
+        Post.objects.filter(author_id__in=author_ids).only('id', 'created_at')[:max_entries()]
+    )
+    _push([user.pk], posts)
+    pull_posts(user)
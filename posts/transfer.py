@@ -0,0 +1,231 @@
+"""
+Streaming export and import of users, posts and the social graph.
+
+The dump is newline-delimited JSON, optionally gzipped (``.gz``).  A header
+line is followed by one block per section in ``SECTIONS``, in dependency
+order.  Each block starts with a line naming the section and its columns,
+and every row after it is a JSON array of values:
+
+    {"format": "xclone", "version": 1}
+    {"section": "user", "fields": ["id", "password", "username", ...]}
+    [1, "pbkdf2_sha256$...", "alice", ...]
+    {"section": "post", "fields": ["id", "author_id", "content", ...]}
+    ...
+
+``export`` reads each table as plain tuples through ``iterator(chunk_size)``,
+all in one transaction (``REPEATABLE READ`` on PostgreSQL), so a dump taken
+while the site is up is a consistent snapshot.
+``load`` inserts fixed-size batches with ``bulk_create``, committing one
+batch at a time.  Neither side ever holds more than a chunk in memory.
+
+Primary keys are kept, so rows can reference each other without lookups.
+Timestamps, counters and password hashes are copied as they are.  Posts
+are written in primary-key order, so a reply's parent always comes before
+it.  Conflicting rows are skipped, so an interrupted import can be re-run.
+
+Constraint and index work is deferred.  Django declares foreign keys
+``DEFERRABLE INITIALLY DEFERRED``, so they are checked once per batch at
+commit time.  ``deferred_indexes`` drops the models' secondary indexes
+during the load and builds each one once at the end.
+
+Derived data is not part of the dump and is rebuilt afterwards by
+``manage.py import_data``:
+
+* the search index;
+* home timelines;
+* trending buckets, which refill as new posts arrive.
+
+Media files are not included either; the dump only carries their paths.
+"""
+import datetime
+import gzip
+import io
+import json
+import sys
+from contextlib import contextmanager
+from django.contrib.auth import get_user_model
+from django.core.management.color import no_style
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connection, transaction
+from .models import ArchivedPost, Hashtag, HashtagPost, Post
+
+User = get_user_model()
+
+FORMAT = 'xclone'
+VERSION = 1
+
+# (section, model, whether its primary keys are kept); link tables get fresh ids
+SECTIONS = (
+    ('user', User, True),
+    ('hashtag', Hashtag, True),
+    ('post', Post, True),
+    ('archived_post', ArchivedPost, True),
+    ('hashtag_post', HashtagPost, False),
+    ('like', Post.likes.through, False),
+    ('retweet', Post.retweets.through, False),
+    # A row (from_user=A, to_user=B) means B follows A
+    ('follow', User.followers.through, False),
+)
+MODELS = {name: model for name, model, _ in SECTIONS}
+
+
+class TransferError(Exception):
+    pass
+
+
+def open_dump(path, mode, compress=None):
+    """Open ``path`` ('-' for stdin/stdout) as text, gzipped if it ends in ``.gz`` or ``compress`` says so"""
+    if compress is None:
+        compress = path.endswith('.gz')
+    if path == '-':
+        stream = sys.stdout.buffer if 'w' in mode else sys.stdin.buffer
+        if compress:
+            return gzip.open(stream, mode + 't', encoding='utf-8')
+        return io.TextIOWrapper(stream, encoding='utf-8', write_through=True)
+    if compress:
+        return gzip.open(path, mode + 't', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def _fields(model, keep_pk):
+    return [field.attname for field in model._meta.concrete_fields if keep_pk or not field.primary_key]
+
+
+class _Encoder(DjangoJSONEncoder):
+    def default(self, o):
+        # DjangoJSONEncoder rounds to milliseconds; feed cursors need the exact value
+        if isinstance(o, datetime.datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+def _dump(value):
+    return json.dumps(value, cls=_Encoder, separators=(',', ':')) + '\n'
+
+
+@contextmanager
+def _snapshot():
+    """One transaction for the whole export, so every section sees the same data"""
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            # Must come first; the default READ COMMITTED re-snapshots every query
+            with connection.cursor() as cursor:
+                cursor.execute('SET TRANSACTION ISOLATION LEVEL REPEATABLE READ READ ONLY')
+        yield
+
+
+def export(out, chunk_size=2000, progress=None):
+    """Write every section to the text stream ``out``; return ``{section: rows}``"""
+    progress = progress or (lambda section, rows: None)
+    with _snapshot():
+        return _export(out, chunk_size, progress)
+
+
+def _export(out, chunk_size, progress):
+    out.write(_dump({'format': FORMAT, 'version': VERSION}))
+    totals = {}
+    for name, model, keep_pk in SECTIONS:
+        fields = _fields(model, keep_pk)
+        out.write(_dump({'section': name, 'fields': fields}))
+        rows = 0
+        for row in model.objects.order_by('pk').values_list(*fields).iterator(chunk_size=chunk_size):
+            out.write(_dump(row))
+            rows += 1
+            if rows % chunk_size == 0:
+                progress(name, rows)
+        progress(name, rows)
+        totals[name] = rows
+    return totals
+
+
+@contextmanager
+def _stored_timestamps():
+    """Let ``bulk_create`` write the dumped ``created_at``/``updated_at`` instead of now"""
+    fields = [
+        field for model in MODELS.values() for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def _existing_indexes(model):
+    with connection.cursor() as cursor:
+        return set(connection.introspection.get_constraints(cursor, model._meta.db_table))
+
+
+@contextmanager
+def deferred_indexes(models=None):
+    """
+    Drop the ``Meta.indexes`` of ``models`` for the duration, then build each
+    once.  Both steps skip what is already done, so an import that was
+    killed with its indexes dropped can simply be run again.
+    """
+    deferred = [(model, index) for model in (models or MODELS.values()) for index in model._meta.indexes]
+    with connection.schema_editor() as editor:
+        for model, index in deferred:
+            if index.name in _existing_indexes(model):
+                editor.remove_index(model, index)
+    try:
+        yield
+    finally:
+        with connection.schema_editor() as editor:
+            for model, index in deferred:
+                if index.name not in _existing_indexes(model):
+                    editor.add_index(model, index)
+
+
+def load(lines, batch_size=2000, progress=None):
+    """Import a dump from an iterable of lines; return ``{section: rows read}``"""
+    progress = progress or (lambda section, rows: None)
+    lines = iter(lines)
+    try:
+        header = json.loads(next(lines))
+    except (StopIteration, ValueError):
+        raise TransferError('Not an export: missing header')
+    if header.get('format') != FORMAT or header.get('version') != VERSION:
+        raise TransferError(f'Unsupported dump format {header!r}')
+
+    totals = {}
+    section = model = fields = None
+    batch = []
+
+    def flush():
+        if batch:
+            with transaction.atomic():
+                model.objects.bulk_create(batch, ignore_conflicts=True)
+            batch.clear()
+        progress(section, totals[section])
+
+    with _stored_timestamps():
+        for line in lines:
+            item = json.loads(line)
+            if isinstance(item, dict):
+                if section:
+                    flush()
+                section, fields = item['section'], item['fields']
+                if section not in MODELS:
+                    raise TransferError(f'Unknown section {section!r}')
+                model = MODELS[section]
+                totals[section] = 0
+                continue
+            if section is None:
+                raise TransferError('Row before the first section')
+            batch.append(model(**dict(zip(fields, item))))
+            totals[section] += 1
+            if len(batch) >= batch_size:
+                flush()
+        if section:
+            flush()
+
+    # Explicit primary keys leave PostgreSQL's sequences behind
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), list(MODELS.values())):
+            cursor.execute(sql)
+    return totals
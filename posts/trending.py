@@ -0,0 +1,100 @@
+"""
+Trending hashtags.
+
+Each time a post is linked to a hashtag, the count for that hashtag in the
+current ``TRENDING_BUCKET_SECONDS`` bucket is incremented.  A hashtag's score
+is the sum of its bucket counts over the last ``TRENDING_WINDOW_SECONDS``,
+each halved every ``TRENDING_HALF_LIFE_SECONDS`` of age.  The top list is
+recomputed from the buckets at most once per ``TRENDING_CACHE_SECONDS`` and
+served from the cache, so neither path touches the post table.
+"""
+import heapq
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.utils import timezone
+from .models import Hashtag, HashtagBucket
+
+CACHE_KEY = 'trending:top'
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def bucket_seconds():
+    return _setting('TRENDING_BUCKET_SECONDS', 300)
+
+
+def window():
+    return timedelta(seconds=_setting('TRENDING_WINDOW_SECONDS', 24 * 60 * 60))
+
+
+def bucket_start(moment):
+    """Floor ``moment`` to the start of its bucket"""
+    timestamp = int(moment.timestamp())
+    return datetime.fromtimestamp(timestamp - timestamp % bucket_seconds(), tz=dt_timezone.utc)
+
+
+def record(events, now=None):
+    """Count ``(hashtag_id, created_at)`` link events into their buckets"""
+    oldest = (now or timezone.now()) - window()
+    counts = Counter(
+        (hashtag_id, bucket_start(created_at)) for hashtag_id, created_at in events if created_at >= oldest
+    )
+    if not counts:
+        return
+
+    HashtagBucket.objects.bulk_create(
+        [HashtagBucket(hashtag_id=hashtag_id, bucket_start=start) for hashtag_id, start in counts],
+        ignore_conflicts=True,
+    )
+    # One UPDATE per distinct (bucket, increment) instead of one per hashtag
+    groups = defaultdict(list)
+    for (hashtag_id, start), n in counts.items():
+        groups[start, n].append(hashtag_id)
+    for (start, n), hashtag_ids in groups.items():
+        HashtagBucket.objects.filter(bucket_start=start, hashtag_id__in=hashtag_ids).update(count=F('count') + n)
+
+
+def compute(now=None, size=None):
+    """Score every hashtag with activity in the window and return the top ``size``"""
+    now = now or timezone.now()
+    size = size or _setting('TRENDING_SIZE', 10)
+    half_life = _setting('TRENDING_HALF_LIFE_SECONDS', 2 * 60 * 60)
+    midpoint = timedelta(seconds=bucket_seconds() / 2)
+
+    scores = defaultdict(float)
+    posts = Counter()
+    buckets = HashtagBucket.objects.filter(bucket_start__gte=now - window()).values_list(
+        'hashtag_id', 'bucket_start', 'count'
+    )
+    for hashtag_id, start, count in buckets.iterator():
+        age = max((now - start - midpoint).total_seconds(), 0)
+        scores[hashtag_id] += count * 0.5 ** (age / half_life)
+        posts[hashtag_id] += count
+
+    top = heapq.nlargest(size, scores.items(), key=lambda item: item[1])
+    names = dict(Hashtag.objects.filter(pk__in=[pk for pk, _ in top]).values_list('pk', 'name'))
+    return [
+        {'name': names[pk], 'score': round(score, 3), 'posts': posts[pk]}
+        for pk, score in top
+        if pk in names
+    ]
+
+
+def prune(now=None):
+    """Delete buckets that have aged out of the window"""
+    HashtagBucket.objects.filter(bucket_start__lt=(now or timezone.now()) - window()).delete()
+
+
+def top_hashtags():
+    """Return the cached trending list, recomputing it when it has expired"""
+    trending = cache.get(CACHE_KEY)
+    if trending is None:
+        prune()
+        trending = compute()
+        cache.set(CACHE_KEY, trending, _setting('TRENDING_CACHE_SECONDS', 60))
+    return trending
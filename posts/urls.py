@@ -9,4 +9,9 @@ urlpatterns = [
     path('retweet/<int:pk>/', views.retweet_post, name='retweet_post'),
     path('search/', views.search_view, name='search'),
     path('hashtag/<str:hashtag_name>/', views.hashtag_view, name='hashtag'),
+    path('trending/', views.trending_view, name='trending'),
+    path('notifications/', views.notifications_view, name='notifications'),
+    path('notifications/api/', views.notifications_api, name='notifications_api'),
+    path('notifications/read/', views.mark_notifications_read, name='mark_notifications_read'),
+    path('events/', views.event_stream, name='event_stream'),
 ]
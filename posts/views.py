@@ -1,30 +1,37 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth import get_user_model
-from django.http import JsonResponse
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
 from django.views.decorators.http import require_POST
+from xclone.profiling import query_budget
 from django.core.paginator import Paginator
-from django.db.models import Q
-from .models import Post, Hashtag, Notification
+from django.db.models import F
+from django.conf import settings
+from asgiref.sync import sync_to_async
+from xclone import concurrency, events
+from .models import ArchivedPost, Post, Hashtag, HashtagPost
+from .pagination import CursorPaginator
 from .forms import PostForm
+from . import engagement, feed, ingest, notifications, pagecache, search, threads, timeline, trending
 import re
+from functools import partial
 
 User = get_user_model()
 
+@query_budget(12)
+@pagecache.cache_anonymous
 def home_view(request):
+    cursor = request.GET.get('cursor')
     if request.user.is_authenticated:
         # Show posts from followed users and own posts
-        following_users = request.user.following.all()
-        posts = Post.objects.filter(
-            Q(author__in=following_users) | Q(author=request.user)
-        ).select_related('author').prefetch_related('likes', 'retweets')
+        entries = timeline.home_timeline(request.user)
+        page_obj = CursorPaginator(entries, 10, keys=('created_at', 'post_id')).get_page(cursor)
+        page_obj.object_list = [entry.post for entry in page_obj]
     else:
         # Show all posts for anonymous users
-        posts = Post.objects.all().select_related('author').prefetch_related('likes', 'retweets')
-
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+        posts = Post.objects.all().select_related('author')
+        page_obj = CursorPaginator(posts, 10).get_page(cursor)
+    feed.decorate_page(page_obj, request.user)
 
     form = PostForm() if request.user.is_authenticated else None
 
@@ -34,6 +41,7 @@ def home_view(request):
     }
     return render(request, 'posts/home.html', context)
 
+@query_budget(16)
 @login_required
 def create_post(request):
     if request.method == 'POST':
@@ -42,119 +50,221 @@ def create_post(request):
             post = form.save(commit=False)
             post.author = request.user
             post.save()
+            if post.reply_to_id:
+                Post.objects.filter(pk=post.reply_to_id).update(replies_count=F('replies_count') + 1)
+                engagement.publish_counter(post.reply_to_id, 'replies_count', 1)
+                if post.reply_to.author_id != request.user.pk:
+                    notifications.notify(post.reply_to.author, request.user, 'reply', post=post.reply_to)
+            timeline.fan_out_post(post)
 
-            # Process hashtags
-            hashtags = post.get_hashtags()
-            for hashtag_text in hashtags:
-                hashtag_name = hashtag_text[1:]  # Remove the # symbol
-                hashtag, created = Hashtag.objects.get_or_create(name=hashtag_name)
-                hashtag.posts.add(post)
+            # Process hashtags and mentions
+            ingest.process_posts([post])
 
+            if post.reply_to_id:
+                return redirect('post_detail', pk=post.reply_to_id)
             return redirect('home')
     else:
         form = PostForm()
     return render(request, 'posts/create_post.html', {'form': form})
 
+@query_budget(12)
+@pagecache.cache_anonymous
 def post_detail(request, pk):
-    post = get_object_or_404(Post, pk=pk)
-    replies = post.replies.all().select_related('author')
+    # Ancestors and a bounded reply tree in one recursive query
+    thread = threads.load_thread(pk)
+    if thread is None:
+        # Old posts are moved out of the hot table (see posts/retention.py)
+        thread = threads.load_thread(pk, model=ArchivedPost)
+    if thread is None:
+        raise Http404('No Post matches the given query.')
+    feed.decorate(thread, request.user)
+
+    reply_form = None
+    if request.user.is_authenticated and not thread.post.is_archived:
+        reply_form = PostForm(initial={'reply_to': pk})
+        reply_form.fields['content'].widget.attrs['placeholder'] = 'Post your reply'
 
     context = {
-        'post': post,
-        'replies': replies,
+        'post': thread.post,
+        'thread': thread,
+        'replies': list(thread.descendants),
+        'reply_form': reply_form,
     }
     return render(request, 'posts/post_detail.html', context)
 
+def _engage(request, pk, relation):
+    """Flip the user's like/retweet of post ``pk``; return ``(active, counter value)``"""
+    post = get_object_or_404(Post, pk=pk)
+    counter = engagement.COUNTERS[relation]
+    if engagement.log_enabled():
+        # Applied, notified and broadcast later by manage.py aggregate_engagement
+        return engagement.record(post, request.user, relation)
+
+    active, changed = engagement.toggle(post, request.user, relation)
+
+    # Create notification if not own post; repeats within the window are coalesced
+    if active and changed and post.author_id != request.user.pk:
+        notifications.notify_once(post.author, request.user, engagement.NOTIFICATION_TYPES[relation], post=post)
+
+    post.refresh_from_db(fields=[counter])
+    if changed:
+        engagement.publish_counter(post.pk, counter, 1 if active else -1, getattr(post, counter))
+    return active, getattr(post, counter)
+
+@query_budget(15)
 @login_required
 @require_POST
 def like_post(request, pk):
-    post = get_object_or_404(Post, pk=pk)
-    if request.user in post.likes.all():
-        post.likes.remove(request.user)
-        liked = False
-    else:
-        post.likes.add(request.user)
-        liked = True
-
-        # Create notification if not own post
-        if post.author != request.user:
-            Notification.objects.create(
-                recipient=post.author,
-                sender=request.user,
-                notification_type='like',
-                post=post
-            )
-
+    liked, likes_count = _engage(request, pk, 'likes')
     return JsonResponse({
         'liked': liked,
-        'likes_count': post.likes_count
+        'likes_count': likes_count
     })
 
+@query_budget(15)
 @login_required
 @require_POST
 def retweet_post(request, pk):
-    post = get_object_or_404(Post, pk=pk)
-    if request.user in post.retweets.all():
-        post.retweets.remove(request.user)
-        retweeted = False
-    else:
-        post.retweets.add(request.user)
-        retweeted = True
-
-        # Create notification if not own post
-        if post.author != request.user:
-            Notification.objects.create(
-                recipient=post.author,
-                sender=request.user,
-                notification_type='retweet',
-                post=post
-            )
-
+    retweeted, retweets_count = _engage(request, pk, 'retweets')
     return JsonResponse({
         'retweeted': retweeted,
-        'retweets_count': post.retweets_count
+        'retweets_count': retweets_count
     })
 
-def search_view(request):
+def _search_posts(query, page, viewer):
+    paginator = Paginator(search.get_backend().search(query), 20)
+    return feed.decorate_page(paginator.get_page(page), viewer)
+
+def _search_users(query):
+    return list(search.get_backend().search_users(query, limit=10))
+
+def _search_hashtags(query):
+    if not query.startswith('#'):
+        return []
+    hashtag_name = ingest.normalize_hashtag(query)
+    if not hashtag_name:
+        # A bare '#' would prefix-match every hashtag
+        return []
+    return list(Hashtag.objects.filter(name__startswith=hashtag_name)[:10])
+
+@query_budget(12)
+async def search_view(request):
     query = request.GET.get('q', '')
-    posts = []
+    page_obj = None
     users = []
     hashtags = []
 
     if query:
-        # Search posts
-        posts = Post.objects.filter(content__icontains=query).select_related('author')[:20]
-
-        # Search users
-        users = User.objects.filter(
-            Q(username__icontains=query) |
-            Q(first_name__icontains=query) |
-            Q(last_name__icontains=query)
-        )[:10]
-
-        # Search hashtags
-        if query.startswith('#'):
-            hashtag_name = query[1:]
-            hashtags = Hashtag.objects.filter(name__icontains=hashtag_name)[:10]
+        # Posts (ranked by relevance), users and hashtags are independent; query them concurrently
+        viewer = await request.auser()
+        page_obj, users, hashtags = await concurrency.gather(
+            partial(_search_posts, query, request.GET.get('page'), viewer),
+            partial(_search_users, query),
+            partial(_search_hashtags, query),
+        )
 
     context = {
         'query': query,
-        'posts': posts,
+        'page_obj': page_obj,
+        'posts': page_obj.object_list if page_obj else [],
         'users': users,
         'hashtags': hashtags,
     }
-    return render(request, 'posts/search.html', context)
+    return await sync_to_async(render)(request, 'posts/search.html', context)
 
+@query_budget(12)
+@pagecache.cache_anonymous
 def hashtag_view(request, hashtag_name):
-    hashtag = get_object_or_404(Hashtag, name=hashtag_name)
-    posts = hashtag.posts.all().select_related('author')
+    hashtag = get_object_or_404(Hashtag, name=ingest.normalize_hashtag(hashtag_name))
+    links = HashtagPost.objects.filter(hashtag=hashtag).select_related('post__author')
 
-    paginator = Paginator(posts, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    page_obj = CursorPaginator(links, 10, keys=('created_at', 'post_id')).get_page(request.GET.get('cursor'))
+    page_obj.object_list = [link.post for link in page_obj]
+    feed.decorate_page(page_obj, request.user)
 
     context = {
         'hashtag': hashtag,
         'page_obj': page_obj,
     }
     return render(request, 'posts/hashtag.html', context)
+
+@query_budget(5)
+def trending_view(request):
+    return JsonResponse({'hashtags': trending.top_hashtags()})
+
+def _notification_cursor(request):
+    try:
+        return int(request.GET['before'])
+    except (KeyError, ValueError):
+        return None
+
+@query_budget(11)
+@login_required
+def notifications_view(request):
+    groups, next_cursor = notifications.grouped(request.user, before=_notification_cursor(request))
+    context = {
+        'groups': groups,
+        'next_cursor': next_cursor,
+        'unread_count': notifications.unread_count(request.user),
+    }
+    return render(request, 'posts/notifications.html', context)
+
+@query_budget(8)
+@login_required
+def notifications_api(request):
+    groups, next_cursor = notifications.grouped(request.user, before=_notification_cursor(request))
+    return JsonResponse({
+        'notifications': [notifications.serialize(group) for group in groups],
+        'next_cursor': next_cursor,
+        'unread_count': notifications.unread_count(request.user),
+    })
+
+@query_budget(5)
+@login_required
+@require_POST
+def mark_notifications_read(request):
+    # Mark everything read, or only the ids posted as ?id=1&id=2 (none if all are invalid)
+    ids = None
+    if 'id' in request.POST:
+        ids = [int(pk) for pk in request.POST.getlist('id') if pk.isdigit()]
+    notifications.mark_read(request.user, ids)
+    if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+        return JsonResponse({'unread_count': notifications.unread_count(request.user)})
+    return redirect('notifications')
+
+def _stream_post_ids(request, limit=100):
+    ids = (pk for pk in request.GET.get('posts', '').split(',') if pk.isdigit())
+    return list(dict.fromkeys(int(pk) for pk in ids))[:limit]
+
+@login_required
+async def event_stream(request):
+    """Server-sent events: new timeline posts, counter deltas for ?posts=1,2,3 and notifications"""
+    if not events.streaming_available(request):
+        # 204 tells EventSource not to reconnect
+        return HttpResponse(status=204)
+    user = await request.auser()
+    author_ids = await sync_to_async(timeline.followed_pull_authors)(user)
+    channels = [
+        events.user_channel(user.pk),
+        *(events.author_channel(author_id) for author_id in author_ids),
+        *(events.post_channel(post_id) for post_id in _stream_post_ids(request)),
+    ]
+    heartbeat = getattr(settings, 'EVENTS_HEARTBEAT_SECONDS', 15)
+
+    async def stream():
+        broker = events.get_broker()
+        subscription = broker.subscribe(channels)
+        try:
+            yield f'retry: {heartbeat * 1000}\n\n'
+            while True:
+                event = await subscription.get(timeout=heartbeat)
+                # Comment lines keep proxies from closing an idle connection
+                yield events.format_sse(event) if event else ': keepalive\n\n'
+        finally:
+            # Runs when the client disconnects and the response is closed
+            broker.unsubscribe(subscription)
+
+    response = StreamingHttpResponse(stream(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
@@ -0,0 +1,128 @@
+// Dark Mode Functionality
+function toggleDarkMode() {
+    const body = document.body;
+    const icon = document.getElementById('dark-mode-icon');
+
+    if (body.getAttribute('data-theme') === 'dark') {
+        body.removeAttribute('data-theme');
+        icon.className = 'fas fa-moon';
+        localStorage.setItem('theme', 'light');
+    } else {
+        body.setAttribute('data-theme', 'dark');
+        icon.className = 'fas fa-sun';
+        localStorage.setItem('theme', 'dark');
+    }
+}
+
+// Initialize theme on page load
+function initializeTheme() {
+    const savedTheme = localStorage.getItem('theme');
+    const prefersDark = window.matchMedia('(prefers-color-scheme: dark)').matches;
+    const icon = document.getElementById('dark-mode-icon');
+
+    if (savedTheme === 'dark' || (!savedTheme && prefersDark)) {
+        document.body.setAttribute('data-theme', 'dark');
+        if (icon) icon.className = 'fas fa-sun';
+    } else {
+        document.body.removeAttribute('data-theme');
+        if (icon) icon.className = 'fas fa-moon';
+    }
+}
+
+// Initialize theme immediately
+initializeTheme();
+
+// Character counter for post content
+$(document).ready(function() {
+    // Re-initialize theme after jQuery is loaded
+    initializeTheme();
+
+    $('textarea[name="content"]').on('input', function() {
+        const maxLength = 280;
+        const currentLength = $(this).val().length;
+        const remaining = maxLength - currentLength;
+
+        let counterClass = 'character-count';
+        if (remaining < 20) counterClass += ' warning';
+        if (remaining < 0) counterClass += ' danger';
+
+        $('.character-count').removeClass('character-count warning danger').addClass(counterClass);
+        $('.character-count').text(remaining + ' characters remaining');
+    });
+});
+
+// AJAX for like/retweet functionality
+function toggleLike(postId) {
+    $.post(`/like/${postId}/`, {
+        'csrfmiddlewaretoken': $('[name=csrfmiddlewaretoken]').val()
+    }, function(data) {
+        const likeBtn = $(`.like-btn[data-post-id="${postId}"]`);
+        const likeCount = $(`.like-count[data-post-id="${postId}"]`);
+
+        if (data.liked) {
+            likeBtn.addClass('liked');
+            likeBtn.find('i').removeClass('far').addClass('fas');
+        } else {
+            likeBtn.removeClass('liked');
+            likeBtn.find('i').removeClass('fas').addClass('far');
+        }
+        likeCount.text(data.likes_count);
+    });
+}
+
+function toggleRetweet(postId) {
+    $.post(`/retweet/${postId}/`, {
+        'csrfmiddlewaretoken': $('[name=csrfmiddlewaretoken]').val()
+    }, function(data) {
+        const retweetBtn = $(`.retweet-btn[data-post-id="${postId}"]`);
+        const retweetCount = $(`.retweet-count[data-post-id="${postId}"]`);
+
+        if (data.retweeted) {
+            retweetBtn.addClass('retweeted');
+        } else {
+            retweetBtn.removeClass('retweeted');
+        }
+        retweetCount.text(data.retweets_count);
+    });
+}
+
+function toggleFollow(username) {
+    $.post(`/accounts/follow/${username}/`, {
+        'csrfmiddlewaretoken': $('[name=csrfmiddlewaretoken]').val()
+    }, function(data) {
+        const followBtn = $(`.follow-btn[data-username="${username}"]`);
+        const followersCount = $(`.followers-count[data-username="${username}"]`);
+
+        if (data.is_following) {
+            followBtn.text('Unfollow').removeClass('btn-primary').addClass('btn-outline-primary');
+        } else {
+            followBtn.text('Follow').removeClass('btn-outline-primary').addClass('btn-primary');
+        }
+        followersCount.text(data.followers_count);
+    });
+}
+
+// Live updates over server-sent events (logged-in pages carry data-events-url)
+(function() {
+    const url = document.body.dataset.eventsUrl;
+    if (!url || !window.EventSource) return;
+
+    const postIds = [...new Set($('[data-post-id]').map(function() { return $(this).data('post-id'); }).get())];
+    const source = new EventSource(`${url}?posts=${postIds.slice(0, 100).join(',')}`);
+    const counterClasses = {likes_count: 'like-count', retweets_count: 'retweet-count', replies_count: 'reply-count'};
+
+    source.addEventListener('counter', function(e) {
+        const data = JSON.parse(e.data);
+        const count = $(`.${counterClasses[data.field]}[data-post-id="${data.post_id}"]`);
+        count.text(data.value !== undefined ? data.value : (parseInt(count.text(), 10) || 0) + data.delta);
+    });
+
+    source.addEventListener('notification', function() {
+        const badge = $('#notification-badge');
+        badge.text((parseInt(badge.text(), 10) || 0) + 1).removeClass('d-none');
+    });
+
+    source.addEventListener('timeline', function() {
+        $('#new-posts-banner').removeClass('d-none');
+    });
+})();
@@ -0,0 +1,149 @@
+"""
+Static asset bundles.
+
+The site ships one stylesheet and one script.  ``build`` concatenates the
+sources of each bundle in ``BUNDLES`` -- vendored libraries, the icon subset
+and the site's own CSS/JS from ``static/`` -- minifies the parts that are
+not minified already, and writes the result to ``static/dist/``.
+``collectstatic`` then gives every file a content hash through the manifest
+storage, and WhiteNoise serves hashed files with a far-future ``immutable``
+``Cache-Control``, so repeat page views only fetch the HTML.
+
+Bootstrap is pinned in ``VENDOR`` by URL and SHA-384 digest and downloaded
+into ``static/vendor/`` by ``manage.py build_assets --fetch``, which refuses
+a download that doesn't match its digest; ``build`` checks the digest of
+the copy it bundles too.  jQuery comes from the copy Django's admin already
+ships.
+
+Until the bundles are built, ``DEBUG`` pages load their sources one by one
+(see ``source_tags``), with vendor files that aren't fetched yet coming from
+the pinned URL under the same digest as a Subresource Integrity check.
+"""
+import base64
+import hashlib
+import re
+import urllib.request
+from pathlib import Path
+from django.conf import settings
+from django.contrib.staticfiles import finders
+
+BOOTSTRAP = 'https://cdn.jsdelivr.net/npm/bootstrap@5.1.3/dist'
+
+# path: (url, base64 SHA-384 of the file, as in an ``integrity`` attribute)
+VENDOR = {
+    'vendor/bootstrap.min.css': (
+        f'{BOOTSTRAP}/css/bootstrap.min.css',
+        'sha384-1BmE4kWBq78iYhFldvKuhfTAU6auU8tT94WrHftjDbrCEXSU1oBoqyl2QvZ6jIW3',
+    ),
+    'vendor/bootstrap.bundle.min.js': (
+        f'{BOOTSTRAP}/js/bootstrap.bundle.min.js',
+        'sha384-ka7Sk0Gln4gmtz2MlQnikT1wXgYsOg+OMhuP+IlRH9sENBO0LRn5q+8nbTov4+1p',
+    ),
+}
+
+BUNDLES = {
+    'dist/app.css': ['vendor/bootstrap.min.css', 'css/icons.css', 'css/app.css'],
+    'dist/app.js': ['admin/js/vendor/jquery/jquery.min.js', 'vendor/bootstrap.bundle.min.js', 'js/app.js'],
+}
+
+_STRINGS = re.compile(r'''("(?:\\.|[^"\\])*"|'(?:\\.|[^'\\])*')''')
+_CSS_COMMENTS = re.compile(r'/\*.*?\*/', re.DOTALL)
+
+
+class AssetError(Exception):
+    pass
+
+
+def static_dir():
+    return Path(settings.STATICFILES_DIRS[0])
+
+
+def minify_css(source):
+    """Drop comments and insignificant whitespace, leaving quoted strings alone"""
+    parts = _STRINGS.split(_CSS_COMMENTS.sub('', source))
+    for i in range(0, len(parts), 2):
+        code = re.sub(r'\s+', ' ', parts[i])
+        code = re.sub(r'\s*([{};,>])\s*', r'\1', code)
+        # Only after a colon: a space before one can be a descendant selector (".a :hover")
+        parts[i] = re.sub(r':\s+', ':', code).replace(';}', '}')
+    return ''.join(parts).strip()
+
+
+def minify_js(source):
+    """
+    Conservative: drop indentation, blank lines and whole-line ``//`` comments.
+    Line breaks are kept so automatic semicolon insertion behaves as before.
+    """
+    lines = (line.strip() for line in source.splitlines())
+    return '\n'.join(line for line in lines if line and not line.startswith('//'))
+
+
+def integrity(data):
+    return 'sha384-' + base64.b64encode(hashlib.sha384(data).digest()).decode()
+
+
+def _verify(path, data):
+    expected = VENDOR[path][1]
+    if integrity(data) != expected:
+        raise AssetError(f'{path} does not match its pinned digest {expected}')
+
+
+def fetch(force=False):
+    """Download the pinned vendor files that are missing; return the paths written"""
+    written = []
+    for path, (url, _) in VENDOR.items():
+        target = static_dir() / path
+        if target.exists() and not force:
+            continue
+        with urllib.request.urlopen(url, timeout=30) as response:
+            data = response.read()
+        _verify(path, data)
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_bytes(data)
+        written.append(path)
+    return written
+
+
+def _read(path):
+    found = finders.find(path)
+    if found is None:
+        hint = ' (run manage.py build_assets --fetch)' if path in VENDOR else ''
+        raise AssetError(f'Missing static source {path}{hint}')
+    data = Path(found).read_bytes()
+    if path in VENDOR:
+        _verify(path, data)
+    source = data.decode('utf-8')
+    if '.min.' in path:
+        return source
+    return minify_css(source) if path.endswith('.css') else minify_js(source)
+
+
+def build():
+    """Write every bundle to ``static/``; return ``{bundle path: size in bytes}``"""
+    sizes = {}
+    for bundle, sources in BUNDLES.items():
+        separator = '\n' if bundle.endswith('.css') else ';\n'
+        content = separator.join(_read(path) for path in sources) + '\n'
+        target = static_dir() / bundle
+        target.parent.mkdir(parents=True, exist_ok=True)
+        target.write_text(content, encoding='utf-8')
+        sizes[bundle] = len(content.encode())
+    return sizes
+
+
+def source_tags(bundle):
+    """
+    ``[(url, integrity or None)]`` to load in place of ``bundle``: the built
+    bundle once it exists, its sources otherwise.
+    """
+    from django.templatetags.static import static
+
+    if not settings.DEBUG or finders.find(bundle):
+        return [(static(bundle), None)]
+    tags = []
+    for path in BUNDLES[bundle]:
+        if path in VENDOR and not finders.find(path):
+            tags.append(VENDOR[path])
+        else:
+            tags.append((static(path), None))
+    return tags
@@ -0,0 +1,75 @@
+"""
+Concurrent database work for async views.
+
+Django's async ORM runs every query of a request on one thread, one after
+another.  ``gather`` runs independent blocking functions -- typically a few
+ORM queries each -- at the same time on a small pool of ``DB_CONCURRENCY``
+threads, each holding its own database connection(s):
+
+    page, users = await concurrency.gather(
+        partial(search_posts, query), partial(search_users, query),
+    )
+
+The functions see the caller's context variables (read-replica routing,
+request profiling) and the caller's connection execute wrappers, so query
+counts still include them.  Worker connections follow ``CONN_MAX_AGE`` like
+request connections do.
+
+Work started inside a transaction must see its uncommitted rows, so in that
+case the functions run one after another on the caller's connection instead.
+"""
+import asyncio
+import contextvars
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import connections
+from asgiref.sync import sync_to_async
+
+_executor = None
+_executor_lock = threading.Lock()
+_worker = threading.local()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(getattr(settings, 'DB_CONCURRENCY', 4), thread_name_prefix='xclone-db')
+    return _executor
+
+
+def _in_transaction():
+    return any(connections[alias].in_atomic_block for alias in connections)
+
+
+def _call(func):
+    """Run ``func`` in a copy of the caller's context, on this worker thread's own connections"""
+    own = _worker.__dict__.setdefault('connections', {})
+    for alias in connections:
+        caller = connections[alias]
+        if alias not in own:
+            own[alias] = connections.create_connection(alias)
+        connection = own[alias]
+        connection.execute_wrappers = list(caller.execute_wrappers)
+        # Only this (copied) context sees the swap; the caller keeps its connection
+        connections[alias] = connection
+        connection.close_if_unusable_or_obsolete()
+    try:
+        return func()
+    finally:
+        for connection in own.values():
+            connection.execute_wrappers = []
+            connection.close_if_unusable_or_obsolete()
+
+
+async def gather(*funcs):
+    """Run the zero-argument blocking ``funcs`` concurrently; return their results in order"""
+    if len(funcs) < 2 or await sync_to_async(_in_transaction)():
+        return [await sync_to_async(func)() for func in funcs]
+
+    loop = asyncio.get_running_loop()
+    executor = _get_executor()
+    return await asyncio.gather(*(
+        loop.run_in_executor(executor, contextvars.copy_context().run, _call, func) for func in funcs
+    ))
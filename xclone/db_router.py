@@ -0,0 +1,91 @@
+"""
+Read-replica routing.
+
+``ReplicaRouter`` sends reads to one of the ``DATABASE_REPLICAS`` aliases,
+but only while ``ReplicaRoutingMiddleware`` has marked the current request
+as replica-safe.  Everything else -- writes, migrations, management
+commands, background tasks -- uses ``default``.
+
+Read-your-writes:
+
+* requests with an unsafe method (POST likes, posts, follows, ...) read
+  from the primary;
+* after such a request the client carries a short-lived cookie that keeps
+  its next ``REPLICA_PIN_SECONDS`` of requests on the primary, covering
+  replication lag;
+* any write during a replica-safe request pins the rest of that request to
+  the primary.
+"""
+import random
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+PIN_COOKIE = 'pin_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_use_replica = ContextVar('use_replica', default=False)
+
+
+def replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        aliases = replicas()
+        if aliases and _use_replica.get():
+            return random.choice(aliases)
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        _use_replica.set(False)
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas mirror the primary, so objects from any of them may be related
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == 'default'
+
+
+class ReplicaRoutingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        token = _use_replica.set(self.replica_safe(request))
+        try:
+            response = self.get_response(request)
+        finally:
+            _use_replica.reset(token)
+        return self.pin(request, response)
+
+    async def __acall__(self, request):
+        # Context variables follow the request into sync_to_async threads
+        token = _use_replica.set(self.replica_safe(request))
+        try:
+            response = await self.get_response(request)
+        finally:
+            _use_replica.reset(token)
+        return self.pin(request, response)
+
+    def replica_safe(self, request):
+        return request.method in SAFE_METHODS and PIN_COOKIE not in request.COOKIES
+
+    def pin(self, request, response):
+        if request.method not in SAFE_METHODS and replicas():
+            response.set_cookie(
+                PIN_COOKIE, '1', max_age=getattr(settings, 'REPLICA_PIN_SECONDS', 5),
+                httponly=True, samesite='Lax',
+            )
+        return response
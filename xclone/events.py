@@ -0,0 +1,198 @@
+"""
+Publish/subscribe for live updates streamed to browsers.
+
+Views and services ``publish`` small JSON events to named channels
+(``user:<id>``, ``post:<id>``, ``author:<id>``); the server-sent events
+endpoint (``posts.views.event_stream``) subscribes to the channels a viewer
+cares about and forwards whatever arrives.
+
+``EVENTS_BROKER`` names the broker class:
+
+* ``InProcessBroker`` -- delivers only to subscribers in the same process;
+  enough for a single ASGI worker.
+* ``RedisBroker`` -- publishes through Redis (``EVENTS_REDIS_URL``) so every
+  worker on every node sees every event.  Each process holds one pattern
+  subscription and fans events out to its local subscribers.
+
+A subscription is an ``asyncio.Queue`` and a set entry per channel, so an
+idle connection costs a few hundred bytes and no database connection.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import defaultdict
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.utils.module_loading import import_string
+
+logger = logging.getLogger(__name__)
+
+
+def streaming_available(request):
+    """
+    Whether ``request`` is served under ASGI.  A WSGI worker (runserver,
+    gthread) would tie up a thread per open stream for good.
+    """
+    return isinstance(request, ASGIRequest)
+
+
+def user_channel(user_id):
+    return f'user:{user_id}'
+
+
+def post_channel(post_id):
+    return f'post:{post_id}'
+
+
+def author_channel(author_id):
+    return f'author:{author_id}'
+
+
+class Subscription:
+    """Bounded per-connection queue; events published from any thread are handed to its event loop"""
+
+    def __init__(self, channels, maxsize):
+        self.channels = tuple(channels)
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize)
+        self.dropped = 0
+
+    def deliver(self, event):
+        try:
+            self.loop.call_soon_threadsafe(self._put, event)
+        except RuntimeError:
+            # Event loop already closed; the subscription is going away
+            pass
+
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # A slow client loses events rather than growing without bound
+            self.dropped += 1
+
+    async def get(self, timeout=None):
+        """Return the next event, or ``None`` if nothing arrives within ``timeout`` seconds"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+
+class InProcessBroker:
+    def __init__(self):
+        self._subscribers = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def publish(self, channel, event):
+        self.publish_many([channel], event)
+
+    def publish_many(self, channels, event):
+        self._deliver(channels, event)
+
+    def _deliver(self, channels, event):
+        with self._lock:
+            subscriptions = {sub for channel in channels for sub in self._subscribers.get(channel, ())}
+        for subscription in subscriptions:
+            subscription.deliver(event)
+
+    def subscribe(self, channels):
+        """Register a subscription on the running event loop; pair with ``unsubscribe``"""
+        subscription = Subscription(channels, getattr(settings, 'EVENTS_QUEUE_SIZE', 100))
+        with self._lock:
+            for channel in subscription.channels:
+                self._subscribers[channel].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            for channel in subscription.channels:
+                subscribers = self._subscribers.get(channel)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscribers[channel]
+
+    def subscriber_count(self):
+        with self._lock:
+            return len({sub for subscribers in self._subscribers.values() for sub in subscribers})
+
+
+class RedisBroker(InProcessBroker):
+    """Relay events between processes through Redis pub/sub (requires the ``redis`` package)"""
+    prefix = 'xclone:events:'
+    reconnect_delay = 0.5
+    max_reconnect_delay = 30
+
+    def __init__(self, url=None):
+        super().__init__()
+        import redis
+
+        self.redis = redis.Redis.from_url(url or settings.EVENTS_REDIS_URL)
+        self._listener = None
+
+    def publish_many(self, channels, event):
+        payload = json.dumps(event)
+        with self.redis.pipeline(transaction=False) as pipe:
+            for channel in channels:
+                pipe.publish(self.prefix + channel, payload)
+            pipe.execute()
+
+    def subscribe(self, channels):
+        self._start_listener()
+        return super().subscribe(channels)
+
+    def _start_listener(self):
+        with self._lock:
+            if self._listener is None:
+                self._listener = threading.Thread(target=self._listen, name='xclone-events', daemon=True)
+                self._listener.start()
+
+    def _listen(self):
+        # Lives as long as the process: a dropped connection is retried with
+        # capped exponential backoff and the pattern subscription re-made, so
+        # subscribers resume receiving (events published meanwhile are lost)
+        delay = self.reconnect_delay
+        while True:
+            try:
+                pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.psubscribe(self.prefix + '*')
+                delay = self.reconnect_delay
+                for message in pubsub.listen():
+                    try:
+                        channel = message['channel'].decode()[len(self.prefix):]
+                        self._deliver([channel], json.loads(message['data']))
+                    except Exception:
+                        logger.exception('Dropped malformed event %r', message)
+            except Exception:
+                logger.warning('Event listener lost its Redis connection; resubscribing in %ss', delay, exc_info=True)
+            time.sleep(delay)
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+_broker = None
+_broker_lock = threading.Lock()
+
+
+def get_broker():
+    global _broker
+    with _broker_lock:
+        if _broker is None:
+            _broker = import_string(getattr(settings, 'EVENTS_BROKER', 'xclone.events.InProcessBroker'))()
+    return _broker
+
+
+def publish(channels, event_type, data):
+    """Publish ``data`` as an ``event_type`` event to ``channels`` once the current transaction commits"""
+    channels = list(channels)
+    if channels:
+        event = {'event': event_type, 'data': data}
+        # robust: a broker outage is logged instead of failing the request that published
+        transaction.on_commit(lambda: get_broker().publish_many(channels, event), robust=True)
+
+
+def format_sse(event):
+    """Encode an event in the ``text/event-stream`` wire format"""
+    return f"event: {event['event']}\ndata: {json.dumps(event['data'])}\n\n"
@@ -0,0 +1,145 @@
+"""
+Image renditions for avatars, cover photos and post images.
+
+Uploads are stored as-is and processed in the background
+(``xclone.tasks``): the image is rotated upright, stripped of EXIF and other
+metadata, and saved as JPEG and WebP at every size in ``IMAGE_RENDITIONS``.
+The result is written to the model's ``<field>_renditions`` JSON field::
+
+    {"width": 3024, "height": 4032, "renditions": {
+        "thumb": {"width": 113, "height": 150, "jpeg": "renditions/...jpg", "webp": "renditions/...webp"},
+        ...}}
+"""
+import logging
+import os
+from io import BytesIO
+from django.apps import apps
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from PIL import Image, ImageOps, UnidentifiedImageError
+from . import tasks
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_RENDITIONS = {'thumb': 150, 'feed': 680, 'full': 1600}
+FORMATS = {
+    'jpeg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+}
+
+
+def rendition_sizes():
+    return getattr(settings, 'IMAGE_RENDITIONS', DEFAULT_RENDITIONS)
+
+
+def rendition_name(original, size_name, extension):
+    stem, _ = os.path.splitext(original)
+    return f'renditions/{stem}_{size_name}.{extension}'
+
+
+def render(field_file):
+    """Generate every rendition of ``field_file`` and return the metadata dict"""
+    with field_file.open('rb') as source:
+        image = Image.open(source)
+        image = ImageOps.exif_transpose(image)
+        image = image.convert('RGB')
+
+    result = {'width': image.width, 'height': image.height, 'renditions': {}}
+    for size_name, max_edge in rendition_sizes().items():
+        copy = image.copy()
+        copy.thumbnail((max_edge, max_edge), Image.LANCZOS)
+        rendition = {'width': copy.width, 'height': copy.height}
+        for extension, (image_format, options) in FORMATS.items():
+            buffer = BytesIO()
+            # Saving without exif= drops EXIF, GPS and other metadata
+            copy.save(buffer, image_format, **options)
+            name = rendition_name(field_file.name, size_name, extension)
+            default_storage.delete(name)
+            rendition[extension] = default_storage.save(name, ContentFile(buffer.getvalue()))
+        result['renditions'][size_name] = rendition
+    return result
+
+
+def process(model_label, pk, field_name):
+    """Background task: render an image field and store the renditions on its row"""
+    model = apps.get_model(model_label)
+    instance = model.objects.filter(pk=pk).only(field_name).first()
+    if instance is None:
+        return
+    field_file = getattr(instance, field_name)
+    if not field_file:
+        return
+    try:
+        renditions = render(field_file)
+    except (OSError, UnidentifiedImageError):
+        logger.warning('Could not process %s %s.%s (%s)', model_label, pk, field_name, field_file.name)
+        return
+
+    # Only store the result if the upload hasn't been replaced meanwhile; bump
+    # updated_at so cached fragments keyed on it pick up the new markup
+    model.objects.filter(pk=pk, **{field_name: field_file.name}).update(**{
+        f'{field_name}_renditions': renditions,
+        'updated_at': timezone.now(),
+    })
+
+
+def schedule(instance, field_name):
+    """Queue rendition processing for ``instance.<field_name>`` after commit"""
+    tasks.enqueue(process, instance._meta.label, instance.pk, field_name)
+
+
+def rendition_url(field_file, renditions, size_name, extension='jpeg'):
+    """URL of a rendition, falling back to the original while it is being processed"""
+    rendition = (renditions or {}).get('renditions', {}).get(size_name)
+    if rendition:
+        return default_storage.url(rendition[extension])
+    return field_file.url if field_file else ''
+
+
+def srcset(renditions, extension):
+    return ', '.join(
+        f"{default_storage.url(rendition[extension])} {rendition['width']}w"
+        for rendition in (renditions or {}).get('renditions', {}).values()
+    )
+
+
+class ImageRenditionsMixin:
+    """
+    Model mixin that queues rendition processing whenever one of the
+    ``rendition_fields`` image fields is given a new file.  Each field needs a
+    companion ``<field>_renditions`` JSONField.
+    """
+    rendition_fields = ()
+    rendition_skip = ()
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._saved_image_names = self._image_names()
+
+    def _image_names(self):
+        # Read the raw attribute so deferred fields aren't loaded just to compare
+        names = {}
+        for field in self.rendition_fields:
+            if field in self.__dict__:
+                value = self.__dict__[field]
+                names[field] = getattr(value, 'name', value) or ''
+        return names
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        saved = self._saved_image_names
+        changed = [
+            field for field, name in self._image_names().items()
+            if adding or (field in saved and name != saved[field])
+        ]
+        for field in changed:
+            setattr(self, f'{field}_renditions', {})
+        super().save(*args, **kwargs)
+        self._saved_image_names = self._image_names()
+
+        for field in changed:
+            name = self._saved_image_names.get(field)
+            if name and name not in self.rendition_skip:
+                schedule(self, field)
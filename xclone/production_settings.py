@@ -15,8 +15,12 @@ if config('USE_SQLITE', default=False, cast=bool):
             'NAME': BASE_DIR / 'db.sqlite3',
         }
     }
+    SEARCH_BACKEND = 'posts.search.SQLiteSearchBackend'
 else:
-    # Use PostgreSQL for production
+    # Use PostgreSQL for production (psycopg 3).  Under ASGI, sync database work
+    # runs on short-lived threads whose persistent connections are never reused,
+    # so ASGI deployments pool connections by default (DB_POOL=False opts out)
+    WEB_SERVER_MODE = config('WEB_SERVER_MODE', default='asgi')
     DATABASES = {
         'default': {
             'ENGINE': 'django.db.backends.postgresql',
@@ -25,8 +29,99 @@ else:
             'PASSWORD': config('DB_PASSWORD'),
             'HOST': config('DB_HOST'),
             'PORT': config('DB_PORT', default='5432'),
+            # WSGI: keep connections open between requests and check them before reuse
+            'CONN_MAX_AGE': config('DB_CONN_MAX_AGE', default=0 if WEB_SERVER_MODE == 'asgi' else 60, cast=int),
+            'CONN_HEALTH_CHECKS': True,
+            'OPTIONS': {
+                'connect_timeout': config('DB_CONNECT_TIMEOUT', default=5, cast=int),
+            },
         }
     }
+    if config('DB_POOL', default=WEB_SERVER_MODE == 'asgi', cast=bool):
+        # psycopg 3 connection pool; replaces CONN_MAX_AGE, and the way to reuse connections under ASGI
+        from psycopg_pool import ConnectionPool
+
+        DATABASES['default']['CONN_MAX_AGE'] = 0
+        DATABASES['default']['OPTIONS']['pool'] = {
+            'min_size': config('DB_POOL_MIN_SIZE', default=2, cast=int),
+            'max_size': config('DB_POOL_MAX_SIZE', default=10, cast=int),
+            'check': ConnectionPool.check_connection,
+        }
+
+    # Read replicas share the primary's credentials; DB_REPLICA_HOSTS=replica1,replica2
+    DATABASE_REPLICAS = []
+    for index, host in enumerate(filter(None, config('DB_REPLICA_HOSTS', default='').split(',')), start=1):
+        alias = f'replica_{index}'
+        DATABASES[alias] = {
+            **DATABASES['default'],
+            'OPTIONS': dict(DATABASES['default']['OPTIONS']),
+            'HOST': host.strip(),
+            'TEST': {'MIRROR': 'default'},
+        }
+        DATABASE_REPLICAS.append(alias)
+    REPLICA_PIN_SECONDS = config('REPLICA_PIN_SECONDS', default=5, cast=int)
+    SEARCH_BACKEND = 'posts.search.PostgresSearchBackend'
+
+# Post-card fragment cache; point it at a shared LRU cache (e.g. Redis with
+# maxmemory-policy allkeys-lru) when running more than one process
+FRAGMENT_CACHE_BACKEND = config('FRAGMENT_CACHE_BACKEND', default='django.core.cache.backends.locmem.LocMemCache')
+CACHES['fragments'] = {
+    'BACKEND': FRAGMENT_CACHE_BACKEND,
+    'LOCATION': config('FRAGMENT_CACHE_LOCATION', default='post-card-fragments'),
+    'TIMEOUT': config('FRAGMENT_CACHE_TIMEOUT', default=24 * 60 * 60, cast=int),
+}
+if FRAGMENT_CACHE_BACKEND.endswith('LocMemCache'):
+    CACHES['fragments']['OPTIONS'] = {'MAX_ENTRIES': config('FRAGMENT_CACHE_MAX_ENTRIES', default=10000, cast=int)}
+
+# Background image processing
+TASK_WORKERS = config('TASK_WORKERS', default=2, cast=int)
+
+# Live updates; RedisBroker is needed once more than one process serves /events/
+EVENTS_BROKER = config('EVENTS_BROKER', default='xclone.events.InProcessBroker')
+EVENTS_REDIS_URL = config('EVENTS_REDIS_URL', default='redis://localhost:6379/2')
+
+# Each of these threads may hold a connection per database alias, on top of
+# one per in-flight request; size the database's connection limit accordingly
+DB_CONCURRENCY = config('DB_CONCURRENCY', default=4, cast=int)
+
+# Write-endpoint rate limits need a cache shared by all workers to hold across them
+RATE_LIMIT_CACHE = config('RATE_LIMIT_CACHE', default='default')
+NOTIFICATION_COALESCE_SECONDS = config('NOTIFICATION_COALESCE_SECONDS', default=10 * 60, cast=int)
+
+# Run manage.py apply_retention daily; 0 disables a policy
+NOTIFICATION_RETENTION_DAYS = config('NOTIFICATION_RETENTION_DAYS', default=90, cast=int)
+POST_ARCHIVE_DAYS = config('POST_ARCHIVE_DAYS', default=365, cast=int)
+RETENTION_BATCH_SIZE = config('RETENTION_BATCH_SIZE', default=500, cast=int)
+RETENTION_PAUSE_SECONDS = config('RETENTION_PAUSE_SECONDS', default=0.5, cast=float)
+
+# Shared cache (e.g. Redis) for state every process must agree on: notification
+# unread counts and coalescing, profile summaries
+if config('SHARED_CACHE_LOCATION', default=''):
+    CACHES['shared'] = {
+        'BACKEND': config('SHARED_CACHE_BACKEND', default='django.core.cache.backends.redis.RedisCache'),
+        'LOCATION': config('SHARED_CACHE_LOCATION'),
+    }
+NOTIFICATION_CACHE = config('NOTIFICATION_CACHE', default='shared' if 'shared' in CACHES else 'default')
+
+# Cached profile headers: an hour on the shared cache, where edits invalidate
+# every worker's copy; seconds on a per-process one
+PROFILE_SUMMARY_CACHE = config('PROFILE_SUMMARY_CACHE', default='shared' if 'shared' in CACHES else 'default')
+PROFILE_SUMMARY_SECONDS = config(
+    'PROFILE_SUMMARY_SECONDS', default=60 * 60 if PROFILE_SUMMARY_CACHE == 'shared' else 30, cast=int,
+)
+
+# Requires the aggregate_engagement worker to be running, or likes never land,
+# and a shared NOTIFICATION_CACHE (the system checks refuse a local-memory one)
+ENGAGEMENT_LOG = config('ENGAGEMENT_LOG', default=False, cast=bool)
+
+# Request profiling; /metrics/ is open to staff sessions and this bearer token
+SERVER_TIMING = config('SERVER_TIMING', default=False, cast=bool)
+METRICS_TOKEN = config('METRICS_TOKEN', default='')
+
+# Anonymous page cache; use a shared cache so one invalidation reaches every worker
+PAGE_CACHE = config('PAGE_CACHE', default='default')
+PAGE_CACHE_SECONDS = config('PAGE_CACHE_SECONDS', default=30, cast=int)
+
 
 # Security settings
 SECRET_KEY = config('SECRET_KEY')
@@ -35,7 +130,12 @@ SECURE_PROXY_SSL_HEADER = ('HTTP_X_FORWARDED_PROTO', 'https')
 
 # Static files
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
-STATICFILES_STORAGE = 'whitenoise.storage.CompressedStaticFilesStorage'
+# Content-hashed names (manifest) let WhiteNoise serve bundles as immutable;
+# build them first with manage.py build_assets (see xclone/assets.py)
+STORAGES = {
+    'default': {'BACKEND': 'django.core.files.storage.FileSystemStorage'},
+    'staticfiles': {'BACKEND': 'whitenoise.storage.CompressedManifestStaticFilesStorage'},
+}
 
 # Create staticfiles directory if it doesn't exist
 os.makedirs(STATIC_ROOT, exist_ok=True)
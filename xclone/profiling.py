@@ -0,0 +1,277 @@
+"""
+Per-view query budgets and request profiling.
+
+``ProfilingMiddleware`` records, for every request, the number of SQL
+queries (on every database alias), how many of them repeat the shape of an
+earlier query in the same request -- the signature of an N+1 loop -- the
+time spent in the database and in template rendering, and the total time.
+
+* The numbers are added to the response as a ``Server-Timing`` header when
+  ``SERVER_TIMING`` is on, so they show up in the browser's network panel.
+* They are aggregated per URL name in this process and served in the
+  Prometheus text format by ``metrics_view`` (``/metrics/``).
+* A view decorated with ``@query_budget(n)`` declares that it runs at most
+  ``n`` queries.  Going over is logged with the most repeated query, and
+  raises ``QueryBudgetExceeded`` when ``QUERY_BUDGET_RAISE`` is set, which
+  ``QueryBudgetTestRunner`` does for the whole test suite.
+
+Template time needs ``ProfilingTemplates`` as the template backend.
+
+The middleware (like ``ReplicaRoutingMiddleware`` and
+``RateLimitMiddleware``) handles both sync and async requests, so under
+ASGI an async view is awaited directly rather than run through a thread.
+"""
+import hmac
+import logging
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack
+from contextvars import ContextVar
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction, sync_to_async
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse, HttpResponseForbidden
+from django.template.backends.django import DjangoTemplates
+from django.test.runner import DiscoverRunner
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar('request_profile', default=None)
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+_IN_LISTS = re.compile(r'\bIN \((?:\s*(?:%s|\?)\s*,?)+\)', re.IGNORECASE)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+def fingerprint(sql):
+    """Reduce a query to its shape: literals and ``IN`` lists of any length compare equal"""
+    sql = _LITERALS.sub('?', sql)
+    return _IN_LISTS.sub('IN (...)', sql)
+
+
+def query_budget(max_queries):
+    """
+    Declare the most queries a view may run, middleware and session lookups included.
+
+    Usage: ``@query_budget(10)`` above the view's other decorators.
+    """
+    def decorator(view_func):
+        view_func.query_budget = max_queries
+        return view_func
+    return decorator
+
+
+class Profile:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.shapes = Counter()
+        # concurrency.gather records from several threads at once
+        self.lock = threading.Lock()
+
+    def record_query(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            elapsed = time.perf_counter() - start
+            shape = fingerprint(sql)
+            with self.lock:
+                self.db_time += elapsed
+                self.queries += 1
+                self.shapes[shape] += 1
+
+    @property
+    def duplicates(self):
+        return sum(count - 1 for count in self.shapes.values())
+
+    @property
+    def total_time(self):
+        return time.perf_counter() - self.started
+
+    def server_timing(self):
+        return ', '.join([
+            f'db;dur={self.db_time * 1000:.1f};desc="{self.queries} queries, {self.duplicates} repeated"',
+            f'tpl;dur={self.template_time * 1000:.1f}',
+            f'total;dur={self.total_time * 1000:.1f}',
+        ])
+
+
+class ViewStats:
+    """Running totals for one URL name"""
+    fields = ('requests', 'queries', 'duplicate_queries', 'db_seconds', 'template_seconds',
+              'seconds', 'budget_exceeded')
+
+    def __init__(self):
+        for field in self.fields:
+            setattr(self, field, 0)
+        self.max_queries = 0
+
+    def add(self, profile, over_budget):
+        self.requests += 1
+        self.queries += profile.queries
+        self.duplicate_queries += profile.duplicates
+        self.db_seconds += profile.db_time
+        self.template_seconds += profile.template_time
+        self.seconds += profile.total_time
+        self.budget_exceeded += over_budget
+        self.max_queries = max(self.max_queries, profile.queries)
+
+
+_stats = defaultdict(ViewStats)
+_stats_lock = threading.Lock()
+
+
+def stats():
+    """A snapshot of ``{url_name: ViewStats}`` for this process"""
+    with _stats_lock:
+        return {name: vars(view_stats).copy() for name, view_stats in _stats.items()}
+
+
+def reset_stats():
+    with _stats_lock:
+        _stats.clear()
+
+
+def _wrap_connections(profile):
+    """Record this thread's queries into ``profile`` until the returned stack is closed"""
+    stack = ExitStack()
+    for connection in connections.all():
+        stack.enter_context(connection.execute_wrapper(profile.record_query))
+    return stack
+
+
+class ProfilingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+        profile = Profile()
+        token = _current.set(profile)
+        try:
+            with _wrap_connections(profile):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, profile)
+
+    async def __acall__(self, request):
+        profile = Profile()
+        token = _current.set(profile)
+        try:
+            # On the thread the request's sync ORM work runs on, not the event loop's
+            stack = await sync_to_async(_wrap_connections)(profile)
+            try:
+                response = await self.get_response(request)
+            finally:
+                await sync_to_async(stack.close)()
+        finally:
+            _current.reset(token)
+        return self.finish(request, response, profile)
+
+    def finish(self, request, response, profile):
+        match = request.resolver_match
+        if match is not None and match.url_name:
+            self.check_budget(match, profile)
+        if getattr(settings, 'SERVER_TIMING', False):
+            response['Server-Timing'] = profile.server_timing()
+        return response
+
+    def check_budget(self, match, profile):
+        budget = getattr(match.func, 'query_budget', None)
+        over_budget = budget is not None and profile.queries > budget
+        with _stats_lock:
+            _stats[match.url_name].add(profile, over_budget)
+        if not over_budget:
+            return
+
+        shape, count = profile.shapes.most_common(1)[0]
+        message = (f'{match.url_name} ran {profile.queries} queries (budget {budget}); '
+                   f'most repeated ({count}x): {shape}')
+        if getattr(settings, 'QUERY_BUDGET_RAISE', False):
+            raise QueryBudgetExceeded(message)
+        logger.warning(message)
+
+
+class ProfilingTemplates(DjangoTemplates):
+    """The Django template backend, timing each top-level render into the request's profile"""
+
+    def from_string(self, template_code):
+        return ProfiledTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return ProfiledTemplate(super().get_template(template_name))
+
+
+class ProfiledTemplate:
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        profile = _current.get()
+        if profile is None:
+            return self.template.render(context, request)
+        start = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            profile.template_time += time.perf_counter() - start
+
+
+class QueryBudgetTestRunner(DiscoverRunner):
+    """Fail any test whose requests take a view over its ``@query_budget``"""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        settings.QUERY_BUDGET_RAISE = True
+
+
+METRICS = (
+    ('requests', 'counter', 'Requests served'),
+    ('queries', 'counter', 'SQL queries run'),
+    ('duplicate_queries', 'counter', 'Queries repeating the shape of an earlier one in the same request'),
+    ('max_queries', 'gauge', 'Most queries run by a single request'),
+    ('db_seconds', 'counter', 'Time spent in the database'),
+    ('template_seconds', 'counter', 'Time spent rendering templates'),
+    ('seconds', 'counter', 'Time spent handling requests'),
+    ('budget_exceeded', 'counter', 'Requests that went over the view\'s query budget'),
+)
+
+
+def metrics_view(request):
+    """Per-view profiling totals for this process, in the Prometheus text format"""
+    token = getattr(settings, 'METRICS_TOKEN', '')
+    authorized = request.user.is_staff or (
+        # Constant-time, so response timing doesn't leak the token
+        token and hmac.compare_digest(request.headers.get('Authorization', '').encode(), f'Bearer {token}'.encode())
+    )
+    if not authorized:
+        return HttpResponseForbidden()
+
+    snapshot = stats()
+    lines = []
+    for field, kind, help_text in METRICS:
+        name = f'xclone_view_{field}' + ('_total' if kind == 'counter' else '')
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} {kind}')
+        for view, values in sorted(snapshot.items()):
+            lines.append(f'{name}{{view="{view}"}} {values[field]}')
+    return HttpResponse('\n'.join(lines) + '\n', content_type='text/plain; version=0.0.4')
@@ -0,0 +1,77 @@
+"""
+Token-bucket rate limiting for write endpoints.
+
+``RATE_LIMITS`` maps URL names to ``(burst, seconds)``: a client may make
+``burst`` requests back to back, and its bucket refills at ``burst / seconds``
+tokens per second after that.  Buckets are kept per authenticated user (per
+IP address for anonymous clients) in the ``RATE_LIMIT_CACHE`` cache as a
+``(tokens, timestamp)`` pair, so limits are shared by every worker using the
+same cache.  Only unsafe methods are limited; page views are never counted.
+
+A request over the limit gets a ``429 Too Many Requests`` with a
+``Retry-After`` header instead of reaching the view.
+
+The read-modify-write of a bucket is not atomic, so a client racing many
+requests at exactly the same moment can occasionally get one or two more
+through than its burst.  Duplicate effects of such races are handled where
+they matter (``posts.engagement.toggle``, ``notifications.notify_once``).
+"""
+import math
+import time
+from django.conf import settings
+from django.core.cache import caches
+from django.http import HttpResponse, JsonResponse
+from django.utils.deprecation import MiddlewareMixin
+from .db_router import SAFE_METHODS
+
+
+def _cache():
+    return caches[getattr(settings, 'RATE_LIMIT_CACHE', 'default')]
+
+
+def bucket_key(scope, client):
+    return f'ratelimit:{scope}:{client}'
+
+
+def client_id(request):
+    if request.user.is_authenticated:
+        return f'user:{request.user.pk}'
+    return f"ip:{request.META.get('REMOTE_ADDR', '')}"
+
+
+def take(scope, client, burst, seconds, now=None):
+    """Take a token from ``client``'s ``scope`` bucket; return 0 if allowed, else seconds until one is free"""
+    now = time.time() if now is None else now
+    rate = burst / seconds
+    cache = _cache()
+    key = bucket_key(scope, client)
+
+    tokens, updated_at = cache.get(key) or (burst, now)
+    tokens = min(burst, tokens + (now - updated_at) * rate)
+    if tokens < 1:
+        return (1 - tokens) / rate
+    # Expire once the bucket would be full again anyway
+    cache.set(key, (tokens - 1, now), math.ceil(seconds))
+    return 0
+
+
+class RateLimitMiddleware(MiddlewareMixin):
+    # The mixin passes requests straight through, sync or async; the handler calls process_view
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if request.method in SAFE_METHODS:
+            return None
+        limit = getattr(settings, 'RATE_LIMITS', {}).get(request.resolver_match.url_name)
+        if limit is None:
+            return None
+
+        retry_after = take(request.resolver_match.url_name, client_id(request), *limit)
+        if not retry_after:
+            return None
+
+        retry_after = math.ceil(retry_after)
+        if request.headers.get('x-requested-with') == 'XMLHttpRequest':
+            response = JsonResponse({'error': 'Too many requests', 'retry_after': retry_after}, status=429)
+        else:
+            response = HttpResponse('Too many requests, try again shortly.', status=429, content_type='text/plain')
+        response['Retry-After'] = str(retry_after)
+        return response
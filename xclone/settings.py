@@ -43,10 +43,13 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'xclone.profiling.ProfilingMiddleware',
+    'xclone.db_router.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'xclone.ratelimit.RateLimitMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -55,7 +58,7 @@ ROOT_URLCONF = 'xclone.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'xclone.profiling.ProfilingTemplates',
         'DIRS': [BASE_DIR / 'templates'],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -81,6 +84,35 @@ DATABASES = {
     }
 }
 
+# Read replicas (see xclone/db_router.py)
+# Aliases in DATABASES that serve reads for GET requests; after a write the
+# client reads from the primary for REPLICA_PIN_SECONDS
+DATABASE_ROUTERS = ['xclone.db_router.ReplicaRouter']
+DATABASE_REPLICAS = []
+REPLICA_PIN_SECONDS = 5
+
+
+# Caches
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# The "fragments" alias holds rendered post-card fragments (see posts/cards.py);
+# LocMemCache evicts least-recently-used entries beyond MAX_ENTRIES
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'post-card-fragments',
+        'TIMEOUT': 24 * 60 * 60,
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+}
+
+POST_CARD_CACHE = 'fragments'
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -123,6 +155,20 @@ STATICFILES_DIRS = [BASE_DIR / 'static']
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Image renditions (see xclone/images.py)
+# Longest edge in pixels for each resized copy of an uploaded image
+IMAGE_RENDITIONS = {
+    'thumb': 150,
+    'feed': 680,
+    'full': 1600,
+}
+
+# Background tasks (see xclone/tasks.py)
+# Worker threads for tasks queued after commit; set TASKS_ALWAYS_EAGER to run
+# them inline instead
+TASK_WORKERS = 2
+TASKS_ALWAYS_EAGER = False
+
 # Login/Logout URLs
 LOGIN_URL = 'login'
 LOGIN_REDIRECT_URL = 'home'
@@ -131,6 +177,104 @@ LOGOUT_REDIRECT_URL = 'home'
 # Custom User Model
 AUTH_USER_MODEL = 'accounts.User'
 
+# Home timeline
+# Entries kept per user, and the follower count above which an author's
+# posts are pulled into timelines on read instead of pushed on write
+TIMELINE_MAX_ENTRIES = 800
+TIMELINE_FANOUT_FOLLOWER_LIMIT = 10000
+# How long a process trusts its cached set of pull authors
+TIMELINE_PULL_AUTHORS_SECONDS = 5 * 60
+
+# Follow graph cache (see accounts/graph.py)
+FOLLOW_GRAPH_CACHE = 'default'
+FOLLOW_GRAPH_CACHE_SECONDS = 24 * 60 * 60
+
+# Profile header and latest post ids (see accounts/summary.py)
+# Other processes only see an edit once their copy expires, so the timeout
+# stays short while the cache is per-process
+PROFILE_SUMMARY_CACHE = 'default'
+PROFILE_SUMMARY_SECONDS = 30
+
+# "Who to follow" suggestions (see accounts/recommendations.py)
+FOLLOW_SUGGESTIONS_SIZE = 20
+FOLLOW_SUGGESTIONS_ACTIVITY_DAYS = 14
+FOLLOW_SUGGESTIONS_ACTIVITY_WEIGHT = 0.5
+FOLLOW_SUGGESTIONS_MAX_AGE_HOURS = 24
+
+# Conversation threads on the post page (see posts/threads.py)
+THREAD_MAX_ANCESTORS = 20
+THREAD_MAX_DEPTH = 4
+THREAD_MAX_REPLIES = 10
+THREAD_MAX_NODES = 200
+
+# Full-text search backend (see posts/search.py)
+SEARCH_BACKEND = 'posts.search.SQLiteSearchBackend'
+
+# Trending hashtags (see posts/trending.py)
+TRENDING_BUCKET_SECONDS = 5 * 60
+TRENDING_WINDOW_SECONDS = 24 * 60 * 60
+TRENDING_HALF_LIFE_SECONDS = 2 * 60 * 60
+TRENDING_CACHE_SECONDS = 60
+TRENDING_SIZE = 10
+
+# Request profiling (see xclone/profiling.py)
+# Server-Timing headers expose query counts and timings to the browser;
+# views over their @query_budget fail the test suite and are logged otherwise
+SERVER_TIMING = DEBUG
+QUERY_BUDGET_RAISE = False
+TEST_RUNNER = 'xclone.profiling.QueryBudgetTestRunner'
+# Bearer token for scraping /metrics/ without a staff session
+METRICS_TOKEN = ''
+
+# Anonymous page cache (see posts/pagecache.py)
+# Logged-out home, hashtag and post pages; new posts invalidate them at once,
+# counters may lag by up to PAGE_CACHE_SECONDS
+PAGE_CACHE = 'default'
+PAGE_CACHE_SECONDS = 30
+
+# Notifications (see posts/notifications.py)
+# Repeated like/retweet notifications from the same sender about the same
+# post within this window are dropped
+NOTIFICATION_COALESCE_SECONDS = 10 * 60
+# Unread counts and coalescing keys; must be shared once several processes run
+NOTIFICATION_CACHE = 'default'
+
+# Retention (see posts/retention.py), applied by manage.py apply_retention
+# Read notifications older than this many days are deleted; 0 keeps them
+NOTIFICATION_RETENTION_DAYS = 90
+# Posts older than this many days move to the archive table; 0 keeps them live
+POST_ARCHIVE_DAYS = 365
+RETENTION_BATCH_SIZE = 500
+# Sleep between batches so concurrent writers and replicas keep up
+RETENTION_PAUSE_SECONDS = 0.5
+
+# Like/retweet writes (see posts/engagement.py)
+# When on, the views only append to the event log and
+# manage.py aggregate_engagement (the Procfile worker) applies it in batches;
+# needs a shared NOTIFICATION_CACHE (checked at startup, see posts/checks.py)
+ENGAGEMENT_LOG = False
+
+# Rate limits for write endpoints (see xclone/ratelimit.py)
+# URL name -> (burst, seconds to refill a full bucket), per user (or IP)
+RATE_LIMITS = {
+    'create_post': (10, 60),
+    'like_post': (60, 60),
+    'retweet_post': (30, 60),
+    'follow_user': (30, 60),
+}
+RATE_LIMIT_CACHE = 'default'
+
+# Concurrent queries in async views (see xclone/concurrency.py)
+# Threads, each with its own database connection(s), per process
+DB_CONCURRENCY = 4
+
+# Live updates (see xclone/events.py)
+# InProcessBroker only reaches clients connected to the same process; use
+# xclone.events.RedisBroker with EVENTS_REDIS_URL when running several
+EVENTS_BROKER = 'xclone.events.InProcessBroker'
+EVENTS_HEARTBEAT_SECONDS = 15
+EVENTS_QUEUE_SIZE = 100
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
 
@@ -0,0 +1,47 @@
+"""
+Minimal in-process background task runner.
+
+``enqueue`` schedules a function to run in a shared thread pool once the
+current database transaction commits, so the request that triggered it can
+return immediately.  Set ``TASKS_ALWAYS_EAGER = True`` to run tasks inline
+(on commit) instead, e.g. in tests or management commands.
+"""
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import connections, transaction
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'TASK_WORKERS', 2),
+                thread_name_prefix='xclone-task',
+            )
+    return _executor
+
+
+def _run(func, args, kwargs):
+    try:
+        func(*args, **kwargs)
+    except Exception:
+        logger.exception('Background task %s failed', getattr(func, '__name__', func))
+    finally:
+        # Worker threads open their own connections; don't leak them
+        connections.close_all()
+
+
+def enqueue(func, *args, **kwargs):
+    """Run ``func(*args, **kwargs)`` in the background after the current transaction commits"""
+    if getattr(settings, 'TASKS_ALWAYS_EAGER', False):
+        transaction.on_commit(lambda: func(*args, **kwargs))
+    else:
+        transaction.on_commit(lambda: _get_executor().submit(_run, func, args, kwargs))
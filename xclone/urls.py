@@ -18,11 +18,13 @@ from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
+from xclone import profiling
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('', include('posts.urls')),
     path('accounts/', include('accounts.urls')),
+    path('metrics/', profiling.metrics_view, name='metrics'),
 ]
 
 # Serve media files during development